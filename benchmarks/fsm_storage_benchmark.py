@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark of FSM storage latency per dialog turn.
+
+Every respondent turn reads the FSM data and writes it back (state.get_data() +
+state.update_data()). This replays that pattern for many users with data shaped
+like an interview in progress and reports get/update latency per backend.
+
+Usage:
+    python benchmarks/fsm_storage_benchmark.py --users 50 --turns 20
+    python benchmarks/fsm_storage_benchmark.py --redis-url redis://localhost:6379/0
+"""
+
+import argparse
+import asyncio
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from src.bot.storage import SQLiteStorage, compact_dumps
+
+
+async def _measure(storage, users: int, turns: int) -> tuple:
+    get_timings, update_timings = [], []
+    for turn in range(turns):
+        for user_id in range(users):
+            key = StorageKey(bot_id=1, chat_id=user_id, user_id=user_id)
+
+            started = time.perf_counter()
+            data = await storage.get_data(key)
+            get_timings.append((time.perf_counter() - started) * 1000)
+
+            answers = data.get("answers", {})
+            answers[f"Вопрос {turn}"] = f"Ответ {turn} " + "x" * 200
+            started = time.perf_counter()
+            await storage.update_data(key, {
+                "answers": answers,
+                "turn_index": turn + 1,
+                "last_question": f"Вопрос {turn + 1}",
+            })
+            update_timings.append((time.perf_counter() - started) * 1000)
+    return get_timings, update_timings
+
+
+def _report(name: str, kind: str, timings: list) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(
+        f"{name:<8} {kind:<7} mean={statistics.mean(timings):7.3f} ms  "
+        f"p50={statistics.median(timings):7.3f} ms  p95={p95:7.3f} ms"
+    )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=20)
+    parser.add_argument("--redis-url", default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [
+            ("memory", MemoryStorage()),
+            ("sqlite", SQLiteStorage(path=str(Path(tmp) / "fsm.sqlite3"), ttl=3600)),
+        ]
+        if args.redis_url:
+            from aiogram.fsm.storage.redis import RedisStorage
+            backends.append(("redis", RedisStorage.from_url(
+                args.redis_url, state_ttl=3600, data_ttl=3600, json_dumps=compact_dumps
+            )))
+
+        print(f"{args.users} users x {args.turns} turns\n")
+        for name, storage in backends:
+            try:
+                get_timings, update_timings = await _measure(storage, args.users, args.turns)
+                _report(name, "get", get_timings)
+                _report(name, "update", update_timings)
+            finally:
+                await storage.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Benchmark of per-answer session write latency against a real Supabase project.
+
+Compares the legacy read-modify-write update (SELECT + UPDATE) with the atomic
+merge_session_state() RPC from migration 003. Each iteration writes one answer
+delta, like BaseRespondentAgent does after every respondent message.
+
+Usage:
+    python benchmarks/session_update_benchmark.py --iterations 50
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.services.supabase_service import SupabaseService
+
+
+def _measure(update, session_id: str, iterations: int) -> list:
+    timings = []
+    answers = {}
+    for i in range(iterations):
+        answers[f"Вопрос {i}"] = f"Ответ {i} " + "x" * 200
+        started = time.perf_counter()
+        update(session_id, {"answers": dict(answers)})
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _report(name: str, timings: list) -> None:
+    ordered = sorted(timings)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(
+        f"{name:<22} mean={statistics.mean(timings):7.1f} ms  "
+        f"p50={statistics.median(timings):7.1f} ms  p95={p95:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=30)
+    args = parser.parse_args()
+
+    load_dotenv()
+    service = SupabaseService()
+
+    session = service.create_session(user_id=0, session_type="benchmark")
+    session_id = session["id"]
+    print(f"Benchmark session: {session_id}, {args.iterations} writes per method\n")
+
+    try:
+        legacy = _measure(service._update_session_read_modify_write, session_id, args.iterations)
+        _report("read-modify-write", legacy)
+
+        rpc = _measure(service.update_session, session_id, args.iterations)
+        if not service.session_merge_rpc:
+            print("merge_session_state() is not installed - apply migration 003 first")
+            return
+        _report("merge_session_state", rpc)
+
+        print(f"\nSpeedup (mean): {statistics.mean(legacy) / statistics.mean(rpc):.2f}x")
+    finally:
+        service.client.table("user_sessions").delete().eq("id", session_id).execute()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,16 @@
+-- Атомарное слияние state сессии за один запрос
+-- Заменяет SELECT + UPDATE в SupabaseService.update_session: дельта применяется
+-- на стороне сервера оператором ||, поэтому параллельные обновления не теряются.
+
+CREATE OR REPLACE FUNCTION merge_session_state(p_session_id UUID, p_delta JSONB)
+RETURNS SETOF user_sessions
+LANGUAGE sql
+AS $$
+    UPDATE user_sessions
+    SET state = COALESCE(state, '{}'::jsonb) || p_delta,
+        updated_at = NOW()
+    WHERE id = p_session_id
+    RETURNING *;
+$$;
+
+COMMENT ON FUNCTION merge_session_state(UUID, JSONB) IS 'Атомарно объединяет state сессии с переданной дельтой (shallow merge)';
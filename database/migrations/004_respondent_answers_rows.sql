@@ -0,0 +1,27 @@
+-- Нормализованное append-only хранение ответов респондентов
+-- Каждый ответ - отдельная строка respondent_answers (сессия, номер хода, вопрос, ответ),
+-- вставляется пакетами из write-behind буфера. Ответы больше не дописываются в
+-- user_sessions.state; функция merge_session_answers(), если она осталась в базе, удаляется.
+
+ALTER TABLE respondent_answers
+ADD COLUMN IF NOT EXISTS session_id UUID REFERENCES user_sessions(id) ON DELETE CASCADE,
+ADD COLUMN IF NOT EXISTS turn_index INTEGER,
+ADD COLUMN IF NOT EXISTS asked_at TIMESTAMPTZ,
+ADD COLUMN IF NOT EXISTS answered_at TIMESTAMPTZ DEFAULT NOW(),
+ADD COLUMN IF NOT EXISTS is_transcribed BOOLEAN NOT NULL DEFAULT FALSE;
+
+-- Идемпотентная повторная вставка пакета: (session_id, turn_index) уникальны
+CREATE UNIQUE INDEX IF NOT EXISTS idx_respondent_answers_session_turn
+ON respondent_answers(session_id, turn_index);
+
+-- Keyset-пагинация ответов интервью: WHERE interview_id = ? AND (created_at, id) > (?, ?)
+CREATE INDEX IF NOT EXISTS idx_respondent_answers_interview_keyset
+ON respondent_answers(interview_id, created_at, id);
+
+DROP FUNCTION IF EXISTS merge_session_answers(UUID, JSONB);
+
+COMMENT ON COLUMN respondent_answers.session_id IS 'Сессия респондента (user_sessions.id)';
+COMMENT ON COLUMN respondent_answers.turn_index IS 'Порядковый номер ответа в сессии, начиная с 0';
+COMMENT ON COLUMN respondent_answers.asked_at IS 'Когда был задан вопрос';
+COMMENT ON COLUMN respondent_answers.answered_at IS 'Когда получен ответ';
+COMMENT ON COLUMN respondent_answers.is_transcribed IS 'Ответ получен из голосового сообщения';
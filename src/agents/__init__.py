@@ -1,7 +1,13 @@
 # Agents module
 
 # Import factory functions
-from .factory import create_researcher_agent, create_respondent_agent, create_agents
+from .factory import (
+    create_researcher_agent,
+    create_respondent_agent,
+    create_agents,
+    get_researcher_agent,
+    get_respondent_agent
+)
 
 # For backward compatibility - keep the original imports
 # This way existing code that imports the classes directly will still work
@@ -13,5 +19,7 @@ __all__ = [
     'RespondentAgent',
     'create_researcher_agent',
     'create_respondent_agent',
-    'create_agents'
+    'create_agents',
+    'get_researcher_agent',
+    'get_respondent_agent'
 ]
\ No newline at end of file
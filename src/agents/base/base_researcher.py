@@ -3,19 +3,21 @@ from typing import Dict, Optional, List
 from aiogram import types
 from aiogram.fsm.context import FSMContext
 from loguru import logger
+import asyncio
 import os
 
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import AsyncSupabaseService
 from src.services.zep_service import ZepService
 from src.services.voice_handler import VoiceMessageHandler
 from src.utils.keyboards import get_cancel_keyboard
 from src.state.user_states import ResearcherStates
+from src.utils.config import get_config
 
 
 class BaseResearcherAgent(ABC):
     """Базовый класс для агента исследователя с абстрактными методами для LLM операций"""
     
-    def __init__(self, supabase: SupabaseService, zep: ZepService):
+    def __init__(self, supabase: AsyncSupabaseService, zep: ZepService):
         self.supabase = supabase
         self.zep = zep
         # Initialize voice handler with bot token
@@ -69,7 +71,7 @@ class BaseResearcherAgent(ABC):
         user_id = message.from_user.id
         
         # Create new interview
-        interview = self.supabase.create_interview({"researcher_telegram_id": user_id})
+        interview = await self.supabase.create_interview({"researcher_telegram_id": user_id})
         if not interview:
             await message.answer("❌ Ошибка создания интервью")
             return
@@ -115,9 +117,10 @@ class BaseResearcherAgent(ABC):
         await self.zep.add_message(zep_session_id, "assistant", welcome_text)
         await self.zep.add_message(zep_session_id, "assistant", first_question)
     
-    async def process_text_message(self, message: types.Message, state: FSMContext):
-        """Обрабатывает текстовое сообщение"""
-        await self._process_message(message.text, message, state)
+    async def process_text_message(self, message: types.Message, state: FSMContext,
+                                   text: Optional[str] = None):
+        """Обрабатывает текстовое сообщение (text - объединённые сообщения, если были)"""
+        await self._process_message(text or message.text, message, state)
     
     async def process_voice_message(self, message: types.Message, state: FSMContext, bot):
         """Обрабатывает голосовое сообщение"""
@@ -127,7 +130,8 @@ class BaseResearcherAgent(ABC):
         # Process voice message
         result = await self.voice_handler.process_voice_message(
             file_id=message.voice.file_id,
-            duration=message.voice.duration
+            duration=message.voice.duration,
+            file_unique_id=message.voice.file_unique_id
         )
         
         # Delete processing message
@@ -350,8 +354,21 @@ class BaseResearcherAgent(ABC):
                 # Также сохраняем в fields для обратной совместимости
                 update_data["fields"]["instruction"] = instruction
             
+            # Opening questions depend only on the instruction: generate them once here,
+            # so respondents get the first question without waiting for the LLM.
+            # The question plan is compiled at the same time and replaces the full
+            # instruction in every next-question prompt
+            opening_questions, question_plan = await asyncio.gather(
+                self._generate_opening_questions(instruction),
+                self._compile_question_plan(instruction, collected_fields)
+            )
+            if opening_questions:
+                update_data["fields"]["opening_questions"] = opening_questions
+            if question_plan:
+                update_data["fields"]["question_plan"] = question_plan
+            
             try:
-                self.supabase.update_interview(interview_id, update_data)
+                await self.supabase.update_interview(interview_id, update_data)
             except Exception as e:
                 logger.error(f"Error updating interview: {e}")
                 await message.answer(
@@ -383,6 +400,9 @@ class BaseResearcherAgent(ABC):
             # Send the interview brief
             await message.answer(interview_brief, parse_mode="Markdown")
             
+            # Send the rest of the dialog log to Zep
+            await self.zep.flush(data.get("zep_session_id"))
+            
             await state.clear()
             
         except Exception as e:
@@ -391,4 +411,44 @@ class BaseResearcherAgent(ABC):
                 "❌ Произошла ошибка при создании исследования.\n"
                 "Пожалуйста, попробуйте позже или обратитесь к администратору."
             )
-            await state.clear()
\ No newline at end of file
+            await state.clear()
+    
+    async def _generate_opening_questions(self, instruction: str) -> List[str]:
+        """Генерирует несколько вариантов первого вопроса для респондентов"""
+        variants = get_config().opening_question_variants
+        if not instruction or variants <= 0:
+            return []
+        
+        # Lazy import: the factory imports this module
+        from src.agents.factory import get_respondent_agent
+        agent = get_respondent_agent(self.supabase, self.zep)
+        
+        results = await asyncio.gather(
+            *(agent.generate_first_question(instruction) for _ in range(variants)),
+            return_exceptions=True
+        )
+        questions = []
+        for result in results:
+            if isinstance(result, Exception):
+                logger.error(f"Failed to pre-generate opening question: {result}")
+            elif result and result.strip() not in questions:
+                questions.append(result.strip())
+        logger.info(f"Pre-generated {len(questions)} opening questions")
+        return questions
+    
+    async def _compile_question_plan(self, instruction: str, fields: Dict) -> Optional[Dict]:
+        """Компилирует план вопросов для интервью"""
+        if not instruction or not get_config().question_plan_enabled:
+            return None
+        
+        from src.agents.factory import get_respondent_agent
+        agent = get_respondent_agent(self.supabase, self.zep)
+        
+        try:
+            plan = await agent.compile_question_plan(instruction, fields)
+        except Exception as e:
+            logger.error(f"Failed to compile question plan: {e}")
+            return None
+        if plan:
+            logger.info(f"Question plan compiled: {len(plan['topics'])} topics")
+        return plan
@@ -1,27 +1,41 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Optional, List
+from typing import Dict, Optional, List, Tuple
 from aiogram import types, Bot
 from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import BaseStorage, StorageKey
 from loguru import logger
 import os
+import random
 import asyncio
-from datetime import datetime
+from datetime import datetime, timezone
 
-from src.services.supabase_service import SupabaseService
+from src.bot.send_scheduler import SendPriority, send_priority
+from src.services.digest_service import digest_mode_enabled, get_digest_service
+from src.services.reminder_scheduler import get_reminder_scheduler
+from src.services.supabase_service import AsyncSupabaseService
 from src.services.zep_service import ZepService
 from src.services.voice_handler import VoiceMessageHandler
 from src.state.user_states import RespondentStates
+from src.utils.config import get_config
+
+
+FIRST_REMINDER_DELAY = 120  # 2 минуты без ответа
+SECOND_REMINDER_DELAY = 3600  # ещё 1 час после первого напоминания
+INCREMENTAL_SUMMARY_MIN_ANSWERS = 3  # меньше ответов - резюме целиком по транскрипту
+SUMMARY_PENDING_MAX_ANSWERS = 30  # больше - следующее резюме строится заново по транскрипту
 
 
 class BaseRespondentAgent(ABC):
     """Базовый класс для агента респондента с абстрактными методами для LLM операций"""
     
-    def __init__(self, supabase: SupabaseService, zep: ZepService):
+    def __init__(self, supabase: AsyncSupabaseService, zep: ZepService):
         self.supabase = supabase
         self.zep = zep
         # Initialize voice handler with bot token
         bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
         self.voice_handler = VoiceMessageHandler(bot_token=bot_token)
+        # Inactivity reminders are delivered by the shared scheduler, not per-user tasks
+        self.reminders = get_reminder_scheduler()
     
     @abstractmethod
     async def generate_first_question(self, instruction: str) -> str:
@@ -38,6 +52,110 @@ class BaseRespondentAgent(ABC):
         """Генерирует резюме интервью - должен быть реализован в наследниках"""
         pass
     
+    async def compile_question_plan(self, instruction: str, fields: Dict) -> Optional[Dict]:
+        """
+        Компилирует бриф и инструкцию в компактный план интервью (один раз на интервью).
+        
+        Returns:
+            Plan {"style": str, "topics": [{"topic", "goal", "probes", "hypotheses"}]},
+            or None if the agent does not support plans
+        """
+        return None
+    
+    async def generate_planned_question(self, plan: Dict, position: int, last_question: str,
+                                        last_answer: str, questions_count: int) -> Optional[str]:
+        """
+        Генерирует следующий вопрос по плану интервью.
+        
+        Returns:
+            Question text, or None to fall back to generate_next_question
+        """
+        return None
+    
+    async def update_summary(self, running_summary: str, new_answers: List[Tuple[str, str]],
+                             answers_count: int) -> Optional[str]:
+        """
+        Дополняет текущее резюме новыми ответами (инкрементальное резюме).
+        
+        Returns:
+            Updated summary, or None if the agent has no incremental summarizer;
+            then the summary is regenerated from all answers
+        """
+        return None
+    
+    def _incremental_summary_enabled(self) -> bool:
+        return (
+            get_config().summary_mode.lower() == "incremental"
+            and type(self).update_summary is not BaseRespondentAgent.update_summary
+        )
+    
+    def _summary_pending_update(self, data: Dict, turn_index: int, question: str, answer: str) -> Dict:
+        """FSM update that queues an answer for the next incremental summary"""
+        if not self._incremental_summary_enabled():
+            return {}
+        pending = data.get("summary_pending", [])
+        if pending is not None:
+            # Past the cap the next summary is regenerated from the transcript instead
+            if len(pending) < SUMMARY_PENDING_MAX_ANSWERS:
+                pending = pending + [[turn_index, question, answer]]
+            else:
+                pending = None
+        return {"summary_pending": pending}
+    
+    async def _get_summary(self, state: FSMContext, full: bool = False) -> str:
+        """
+        Резюме интервью с учетом только новых ответов.
+        
+        The running summary is kept in FSM data together with summary_pending, an
+        append-only list of (turn_index, question, answer) not yet folded into it,
+        so each call sends only the answers given since the previous one (repeated
+        questions included). When the incremental update is not possible the
+        summary is regenerated from the whole transcript and becomes the new
+        running summary. full=True always regenerates from the transcript.
+        """
+        data = await state.get_data()
+        answers = data.get("answers", {})
+        answers_count = data.get("turn_index", len(answers))
+        running_summary = data.get("running_summary")
+        # None: the list outgrew SUMMARY_PENDING_MAX_ANSWERS
+        pending = data.get("summary_pending", [])
+        
+        if full or not self._incremental_summary_enabled():
+            return await self.generate_summary(answers)
+        if running_summary is not None and pending == []:
+            return running_summary
+        
+        summary = None
+        if pending and answers_count >= INCREMENTAL_SUMMARY_MIN_ANSWERS:
+            new_answers = [(question, answer) for _, question, answer in pending]
+            try:
+                summary = await self.update_summary(running_summary or "", new_answers, answers_count)
+            except Exception as e:
+                logger.error(f"Incremental summary failed, regenerating from all answers: {e}")
+        if summary is None:
+            summary = await self.generate_summary(answers)
+            covered_turn = answers_count - 1
+        else:
+            covered_turn = pending[-1][0]
+        
+        # May run in a background task: don't write into a session that has already ended,
+        # and don't overwrite a summary that already covers later turns
+        current = await state.get_data()
+        if (current.get("session_id") == data.get("session_id")
+                and current.get("summary_turn_index", -1) < covered_turn):
+            current_pending = current.get("summary_pending", [])
+            if current_pending is None:
+                # Overflowed again after this summary started: keep regenerating
+                current_pending = [] if current.get("turn_index", 0) - 1 <= covered_turn else None
+            else:
+                current_pending = [p for p in current_pending if p[0] > covered_turn]
+            await state.update_data(
+                running_summary=summary,
+                summary_turn_index=covered_turn,
+                summary_pending=current_pending
+            )
+        return summary
+    
     async def start_interview(self, message: types.Message, state: FSMContext, interview_id: str):
         """Начинает интервью с респондентом"""
         user_id = message.from_user.id
@@ -49,13 +167,13 @@ class BaseRespondentAgent(ABC):
             return
         
         # Get interview details
-        interview = self.supabase.get_interview(interview_id)
+        interview = await self.supabase.get_interview(interview_id)
         if not interview:
             await message.answer("❌ Интервью не найдено")
             return
         
         # Create session for respondent (instead of response record)
-        session = self.supabase.create_session(
+        session = await self.supabase.create_session(
             user_id=user_id,
             session_type="respondent",
             interview_id=interview_id
@@ -80,8 +198,9 @@ class BaseRespondentAgent(ABC):
             session_id=session_id,
             zep_session_id=zep_session_id,
             instruction=interview.get("instruction") or interview.get("fields", {}).get("instruction", ""),
-            answers={},
-            inactivity_timer=None
+            # Compact plan compiled once per interview; None for interviews without one
+            question_plan=(interview.get("fields") or {}).get("question_plan"),
+            answers={}
         )
         
         # Get instruction
@@ -98,12 +217,20 @@ class BaseRespondentAgent(ABC):
         
         await message.answer(welcome_text, reply_markup=types.ReplyKeyboardRemove())
         
-        # Generate and ask first question
-        first_question = await self.generate_first_question(instruction)
+        # Opening questions are pre-generated when the interview is created;
+        # the LLM is called only for interviews created before that
+        opening_questions = (interview.get("fields") or {}).get("opening_questions") or []
+        if opening_questions:
+            first_question = random.choice(opening_questions)
+        else:
+            first_question = await self.generate_first_question(instruction)
         await message.answer(first_question)
         
         # Save first question in state
-        await state.update_data(last_question=first_question)
+        await state.update_data(
+            last_question=first_question,
+            last_question_at=datetime.now(timezone.utc).isoformat()
+        )
         
         # Log to Zep
         await self.zep.add_message(zep_session_id, "assistant", welcome_text)
@@ -112,9 +239,10 @@ class BaseRespondentAgent(ABC):
         # Start inactivity timer
         await self._start_inactivity_timer(message, state)
     
-    async def process_text_message(self, message: types.Message, state: FSMContext):
-        """Обрабатывает текстовое сообщение"""
-        await self._process_message(message.text, message, state)
+    async def process_text_message(self, message: types.Message, state: FSMContext,
+                                   text: Optional[str] = None):
+        """Обрабатывает текстовое сообщение (text - объединённые сообщения, если были)"""
+        await self._process_message(text or message.text, message, state)
     
     async def process_voice_message(self, message: types.Message, state: FSMContext, bot: Bot):
         """Обрабатывает голосовое сообщение"""
@@ -124,7 +252,8 @@ class BaseRespondentAgent(ABC):
         # Process voice message
         result = await self.voice_handler.process_voice_message(
             file_id=message.voice.file_id,
-            duration=message.voice.duration
+            duration=message.voice.duration,
+            file_unique_id=message.voice.file_unique_id
         )
         
         # Delete processing message
@@ -135,17 +264,19 @@ class BaseRespondentAgent(ABC):
             logger.info(f"Voice transcribed: {text}")
             
             # Process the message
-            await self._process_message(text, message, state)
+            await self._process_message(text, message, state, is_transcribed=True)
         else:
             error = result.get("error", "Unknown error")
             logger.error(f"Voice processing failed: {error}")
             await message.answer("❌ Не удалось распознать голосовое сообщение. Попробуйте еще раз или отправьте текстом.")
     
-    async def _process_message(self, text: str, message: types.Message, state: FSMContext):
+    async def _process_message(self, text: str, message: types.Message, state: FSMContext,
+                               is_transcribed: bool = False):
         """Основная логика обработки сообщений респондента"""
         data = await state.get_data()
         user_id = message.from_user.id
         session_id = data.get("session_id")
+        interview_id = data.get("interview_id")
         zep_session_id = data.get("zep_session_id")
         instruction = data.get("instruction", "")
         answers = data.get("answers", {})
@@ -196,30 +327,61 @@ class BaseRespondentAgent(ABC):
                 logger.debug("Reset finish attempts - user continues interview")
         
         # Save answer
+        turn_index = data.get("turn_index", 0)
         answers[last_question] = text
-        await state.update_data(answers=answers)
+        await state.update_data(
+            answers=answers,
+            turn_index=turn_index + 1,
+            **self._summary_pending_update(data, turn_index, last_question, text)
+        )
         
-        # Update session in database
-        self.supabase.update_session(session_id, {"answers": answers})
+        # Append the answer as a row; the buffer inserts rows in batches in the background
+        await self.supabase.buffer_answer(session_id, {
+            "interview_id": interview_id,
+            "session_id": session_id,
+            "user_id": user_id,
+            "turn_index": turn_index,
+            "question_text": last_question,
+            "answer_text": text,
+            "asked_at": data.get("last_question_at"),
+            "answered_at": datetime.now(timezone.utc).isoformat(),
+            "is_transcribed": is_transcribed
+        })
         
         # Check if we need to send interim summary (after 5, 10, 15 answers)
         answers_count = len(answers)
         if answers_count in [5, 10, 15]:
             asyncio.create_task(self._send_interim_summary(message, state, answers_count))
         
-        # Get conversation history
-        history = await self.zep.get_memory(zep_session_id, last_n=10)
+        # With a question plan the prompt needs only the plan position and the last exchange
+        next_question = None
+        question_plan = data.get("question_plan")
+        if question_plan:
+            position = (turn_index + 1) // max(1, get_config().question_plan_turns_per_topic)
+            try:
+                next_question = await self.generate_planned_question(
+                    question_plan, position, last_question, text, len(answers)
+                )
+            except Exception as e:
+                logger.error(f"Planned question generation failed, using full context: {e}")
         
-        # Generate next question
-        logger.info(f"Generating next question. Answers count: {len(answers)}, Instruction: {instruction[:100]}...")
-        next_question = await self.generate_next_question(instruction, answers, history)
+        if not next_question:
+            # Get conversation history
+            history = await self.zep.get_memory(zep_session_id, last_n=10)
+            
+            # Generate next question
+            logger.info(f"Generating next question. Answers count: {len(answers)}, Instruction: {instruction[:100]}...")
+            next_question = await self.generate_next_question(instruction, answers, history)
         logger.info(f"Generated question: {next_question}")
         
         if next_question:
             await message.answer(next_question)
             await self.zep.add_message(zep_session_id, "assistant", next_question)
             # Save the question for context
-            await state.update_data(last_question=next_question)
+            await state.update_data(
+                last_question=next_question,
+                last_question_at=datetime.now(timezone.utc).isoformat()
+            )
             # Start inactivity timer for next response
             await self._start_inactivity_timer(message, state)
         else:
@@ -238,19 +400,21 @@ class BaseRespondentAgent(ABC):
         logger.info(f"Session ID: {session_id}")
         logger.info(f"User: {message.from_user.id} (@{message.from_user.username})")
         
-        # Generate summary
-        summary = await self.generate_summary(answers)
+        # Generate summary (folds in only the answers since the last interim summary)
+        summary = await self._get_summary(state, full=get_config().final_summary_full)
         logger.info(f"Generated summary: {summary[:100]}...")
         
+        # All buffered answers must be stored before the session is marked completed
+        await self.supabase.flush_answers(session_id)
+        
         # Update session
-        self.supabase.update_session(session_id, {
+        await self.supabase.update_session(session_id, {
             "status": "completed",
-            "summary": summary,
-            "answers": answers
+            "summary": summary
         })
         
         # Send to researcher
-        interview = self.supabase.get_interview(interview_id)
+        interview = await self.supabase.get_interview(interview_id)
         logger.info(f"Interview data: {interview}")
         
         researcher_id = None
@@ -275,7 +439,13 @@ class BaseRespondentAgent(ABC):
                     logger.error(f"Cannot convert researcher_id to int: {researcher_id}")
                     researcher_id = None
         
-        if researcher_id:
+        if researcher_id and digest_mode_enabled():
+            # Collected into one periodic digest per interview instead of a message per respondent
+            get_digest_service().add_completion(
+                researcher_id, interview_id, self._interview_title(interview),
+                session_id, message.from_user.username, summary
+            )
+        elif researcher_id:
             summary_text = (
                 f"📊 <b>Новый ответ на исследование</b>\n\n"
                 f"<b>Респондент:</b> @{message.from_user.username or 'anonymous'}\n\n"
@@ -284,7 +454,8 @@ class BaseRespondentAgent(ABC):
             )
             
             try:
-                await message.bot.send_message(researcher_id, summary_text, parse_mode="HTML")
+                with send_priority(SendPriority.DIGEST):
+                    await message.bot.send_message(researcher_id, summary_text, parse_mode="HTML")
                 logger.info(f"Summary sent to researcher {researcher_id}")
             except Exception as e:
                 logger.error(f"Failed to send summary to researcher {researcher_id}: {e}")
@@ -312,6 +483,9 @@ class BaseRespondentAgent(ABC):
         
         await message.answer(thank_text, reply_markup=types.ReplyKeyboardRemove())
         
+        # Send the rest of the conversation log before the session state is gone
+        await self.zep.flush(data.get("zep_session_id"))
+        
         # Cancel inactivity timer before clearing state
         await self._cancel_inactivity_timer(state)
         
@@ -325,22 +499,45 @@ class BaseRespondentAgent(ABC):
         
         logger.info(f"Sending interim summary after {answers_count} answers")
         
-        # Генерируем промежуточное резюме
-        summary = await self.generate_summary(answers)
-        
         # Получаем ID исследователя
         researcher_id = await self._get_researcher_id(interview_id)
         if not researcher_id:
             logger.error(f"Researcher ID not found for interview {interview_id}")
             return
         
+        # In digest mode only the progress is counted; no summary is generated
+        if digest_mode_enabled():
+            interview = await self.supabase.get_interview(interview_id)
+            get_digest_service().add_progress(
+                researcher_id, interview_id, self._interview_title(interview),
+                data.get("session_id"), answers_count
+            )
+            return
+        
+        # Генерируем промежуточное резюме
+        summary = await self._get_summary(state)
+        
         # Формируем текст отчета
         interim_text = self._format_interim_report(answers_count, message.from_user.username, summary)
         
         # Отправляем отчет
         await self._send_message_to_researcher(researcher_id, interim_text, message.bot)
     
-    async def _send_inactivity_reminder(self, message: types.Message, state: FSMContext, reminder_number: int = 1):
+    async def send_scheduled_reminder(self, bot: Bot, storage: BaseStorage, payload: Dict):
+        """Доставить напоминание из планировщика, если интервью ещё идёт"""
+        key = StorageKey(bot_id=payload["bot_id"], chat_id=payload["chat_id"], user_id=payload["user_id"])
+        state = FSMContext(storage=storage, key=key)
+        
+        # The interview may have been finished, cancelled or restarted since scheduling
+        if await state.get_state() != RespondentStates.answering.state:
+            return
+        data = await state.get_data()
+        if data.get("session_id") != payload.get("session_id"):
+            return
+        
+        await self._send_inactivity_reminder(bot, state, payload["reminder"])
+    
+    async def _send_inactivity_reminder(self, bot: Bot, state: FSMContext, reminder_number: int = 1):
         """Отправить напоминание о неактивности"""
         data = await state.get_data()
         
@@ -364,8 +561,9 @@ class BaseRespondentAgent(ABC):
             )
         
         try:
-            await message.answer(reminder_text)
-            logger.info(f"Inactivity reminder {reminder_number} sent to user {message.from_user.id}")
+            with send_priority(SendPriority.NOTIFICATION):
+                await bot.send_message(state.key.chat_id, reminder_text)
+            logger.info(f"Inactivity reminder {reminder_number} sent to user {state.key.user_id}")
             
             # Mark reminder as sent
             reminders_sent.append(reminder_number)
@@ -373,53 +571,35 @@ class BaseRespondentAgent(ABC):
             
             # If this was first reminder, schedule second one after 1 hour
             if reminder_number == 1:
-                await self._start_second_inactivity_timer(message, state)
+                await self._schedule_reminder(state, data.get("session_id"), 2, SECOND_REMINDER_DELAY)
         except Exception as e:
             logger.error(f"Failed to send inactivity reminder: {e}")
     
+    @staticmethod
+    def _reminder_key(state: FSMContext) -> str:
+        # One pending reminder per user: scheduling again replaces it
+        return f"inactivity:{state.key.bot_id}:{state.key.chat_id}:{state.key.user_id}"
+    
+    async def _schedule_reminder(self, state: FSMContext, session_id: Optional[str],
+                                 reminder_number: int, delay: float):
+        await self.reminders.schedule(self._reminder_key(state), delay, {
+            "bot_id": state.key.bot_id,
+            "chat_id": state.key.chat_id,
+            "user_id": state.key.user_id,
+            "session_id": session_id,
+            "reminder": reminder_number
+        })
+    
     async def _start_inactivity_timer(self, message: types.Message, state: FSMContext):
-        """Запустить таймер неактивности"""
-        # Отменяем предыдущие таймеры, если они есть
-        await self._cancel_all_timers(state)
-        
+        """Запустить (перезапустить) таймер неактивности"""
         # Reset reminders sent when user is active
-        await state.update_data(reminders_sent=[])
-        
-        # Создаем новый таймер на 2 минуты
-        async def timer_callback():
-            await asyncio.sleep(120)  # 2 минуты
-            await self._send_inactivity_reminder(message, state, reminder_number=1)
-        
-        timer_task = asyncio.create_task(timer_callback())
-        await state.update_data(inactivity_timer=timer_task)
-        logger.debug(f"Inactivity timer started for user {message.from_user.id}")
-    
-    async def _start_second_inactivity_timer(self, message: types.Message, state: FSMContext):
-        """Запустить второй таймер неактивности (1 час)"""
-        # Создаем таймер на 1 час
-        async def timer_callback():
-            await asyncio.sleep(3600)  # 1 час
-            await self._send_inactivity_reminder(message, state, reminder_number=2)
-        
-        timer_task = asyncio.create_task(timer_callback())
-        await state.update_data(second_inactivity_timer=timer_task)
-        logger.debug(f"Second inactivity timer started for user {message.from_user.id}")
+        data = await state.update_data(reminders_sent=[])
+        await self._schedule_reminder(state, data.get("session_id"), 1, FIRST_REMINDER_DELAY)
+        logger.debug(f"Inactivity reminder scheduled for user {message.from_user.id}")
     
     async def _cancel_all_timers(self, state: FSMContext):
-        """Отменить все таймеры неактивности"""
-        data = await state.get_data()
-        
-        # Cancel first timer
-        timer_task = data.get("inactivity_timer")
-        if timer_task and not timer_task.done():
-            timer_task.cancel()
-            logger.debug("First inactivity timer cancelled")
-        
-        # Cancel second timer
-        second_timer_task = data.get("second_inactivity_timer")
-        if second_timer_task and not second_timer_task.done():
-            second_timer_task.cancel()
-            logger.debug("Second inactivity timer cancelled")
+        """Отменить все напоминания о неактивности"""
+        await self.reminders.cancel(self._reminder_key(state))
     
     async def _cancel_inactivity_timer(self, state: FSMContext):
         """Отменить таймер неактивности (для обратной совместимости)"""
@@ -427,7 +607,7 @@ class BaseRespondentAgent(ABC):
     
     async def _get_researcher_id(self, interview_id: str) -> Optional[int]:
         """Получить ID исследователя из интервью"""
-        interview = self.supabase.get_interview(interview_id)
+        interview = await self.supabase.get_interview(interview_id)
         if not interview:
             return None
         
@@ -448,6 +628,13 @@ class BaseRespondentAgent(ABC):
         
         return researcher_id
     
+    @staticmethod
+    def _interview_title(interview: Optional[Dict]) -> str:
+        """Короткое название исследования для сводки"""
+        fields = (interview or {}).get("fields") or {}
+        title = str(fields.get("industry") or fields.get("name") or "").strip()
+        return f"«{title[:60]}»" if title else ""
+    
     def _format_interim_report(self, answers_count: int, username: str, summary: str) -> str:
         """Форматировать промежуточный отчет"""
         return (
@@ -460,7 +647,8 @@ class BaseRespondentAgent(ABC):
     async def _send_message_to_researcher(self, researcher_id: int, text: str, bot: Bot):
         """Отправить сообщение исследователю"""
         try:
-            await bot.send_message(researcher_id, text, parse_mode="HTML")
+            with send_priority(SendPriority.DIGEST):
+                await bot.send_message(researcher_id, text, parse_mode="HTML")
             logger.info(f"Message sent to researcher {researcher_id}")
         except Exception as e:
             logger.error(f"Failed to send message to researcher {researcher_id}: {e}")
\ No newline at end of file
@@ -1,30 +1,24 @@
 from typing import Dict
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
 from loguru import logger
 import json
 
 from src.agents.base import BaseResearcherAgent
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import AsyncSupabaseService
 from src.services.zep_service import ZepService
+from src.services.llm_registry import get_llm
+from src.services.prompt_registry import get_prompt
 
 
 class DirectResearcherAgent(BaseResearcherAgent):
     """Direct implementation of ResearcherAgent using OpenAI API directly"""
     
-    def __init__(self, supabase: SupabaseService, zep: ZepService):
+    def __init__(self, supabase: AsyncSupabaseService, zep: ZepService):
         super().__init__(supabase, zep)
-        self.llm = ChatOpenAI(model_name="gpt-4o", temperature=0.7)
+        self.llm = get_llm()
     
     async def evaluate_answer_quality(self, field: str, answer: str) -> Dict:
         """Оценивает качество ответа на вопрос используя прямой вызов LLM"""
-        with open("src/prompts/field_analyzer.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["field_name", "field_description", "question", "answer"],
-            template=template
-        )
+        prompt = get_prompt("field_analyzer")
         
         field_description = {
             "name": "Имя или обращение к исследователю",
@@ -95,13 +89,7 @@ class DirectResearcherAgent(BaseResearcherAgent):
     
     async def generate_clarification(self, field: str, answer: str, missing_aspects: list) -> str:
         """Генерирует уточняющий вопрос используя прямой вызов LLM"""
-        with open("src/prompts/clarification_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["field_name", "original_question", "answer", "missing_aspects", "conversation_history"],
-            template=template
-        )
+        prompt = get_prompt("clarification_generator")
         
         response = await self.llm.ainvoke(
             prompt.format(
@@ -117,13 +105,7 @@ class DirectResearcherAgent(BaseResearcherAgent):
     
     async def generate_interview_brief(self, fields: Dict) -> str:
         """Генерирует интервью-бриф на основе собранных данных используя прямой вызов LLM"""
-        with open("src/prompts/interview_brief_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["answers"],
-            template=template
-        )
+        prompt = get_prompt("interview_brief_generator")
         
         # Just pass the fields as they are, let the LLM handle formatting
         response = await self.llm.ainvoke(
@@ -134,13 +116,7 @@ class DirectResearcherAgent(BaseResearcherAgent):
     
     async def generate_instruction(self, fields: Dict) -> str:
         """Генерирует инструкцию для респондентов используя прямой вызов LLM"""
-        with open("src/prompts/instruction_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["fields"],
-            template=template
-        )
+        prompt = get_prompt("instruction_generator")
         
         response = await self.llm.ainvoke(prompt.format(fields=fields))
         return response.content
\ No newline at end of file
@@ -1,19 +1,20 @@
-from typing import Dict, Optional, List
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
+from typing import Dict, Optional, List, Tuple
 from loguru import logger
+import json
 
 from src.agents.base import BaseRespondentAgent
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import AsyncSupabaseService
 from src.services.zep_service import ZepService
+from src.services.llm_registry import get_llm
+from src.services.prompt_registry import get_prompt
 
 
 class DirectRespondentAgent(BaseRespondentAgent):
     """Direct implementation of RespondentAgent using OpenAI API directly"""
     
-    def __init__(self, supabase: SupabaseService, zep: ZepService):
+    def __init__(self, supabase: AsyncSupabaseService, zep: ZepService):
         super().__init__(supabase, zep)
-        self.llm = ChatOpenAI(model_name="gpt-4o", temperature=0.7)
+        self.llm = get_llm()
     
     async def generate_first_question(self, instruction: str) -> str:
         """Генерирует первый вопрос для респондента используя прямой вызов LLM"""
@@ -29,13 +30,7 @@ class DirectRespondentAgent(BaseRespondentAgent):
         elif "эксперт" in instruction.lower():
             style = "expert"
         
-        with open("src/prompts/first_question_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["instruction", "style", "target"],
-            template=template
-        )
+        prompt = get_prompt("first_question_generator")
         
         response = await self.llm.ainvoke(
             prompt.format(
@@ -69,13 +64,7 @@ class DirectRespondentAgent(BaseRespondentAgent):
         elif "эксперт" in instruction.lower():
             style = "expert"
         
-        with open("src/prompts/next_question_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["instruction", "history", "questions_count", "style"],
-            template=template
-        )
+        prompt = get_prompt("next_question_generator")
         
         response = await self.llm.ainvoke(
             prompt.format(
@@ -111,13 +100,109 @@ class DirectRespondentAgent(BaseRespondentAgent):
             for q, a in answers.items()
         ])
         
-        with open("src/prompts/interview_summary_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["qa_text", "answers_count"],
-            template=template
-        )
+        prompt = get_prompt("interview_summary_generator")
         
         response = await self.llm.ainvoke(prompt.format(qa_text=qa_text, answers_count=answers_count))
-        return response.content
\ No newline at end of file
+        return response.content
+    
+    async def update_summary(self, running_summary: str, new_answers: List[Tuple[str, str]],
+                             answers_count: int) -> Optional[str]:
+        """Дополняет текущее резюме только новыми ответами"""
+        new_qa_text = "\n\n".join([
+            f"Вопрос: {q}\nОтвет: {a}" 
+            for q, a in new_answers
+        ])
+        
+        prompt = get_prompt("interview_summary_updater")
+        
+        response = await self.llm.ainvoke(prompt.format(
+            running_summary=running_summary or "(пока нет)",
+            new_qa_text=new_qa_text,
+            answers_count=answers_count
+        ))
+        return response.content
+    
+    async def compile_question_plan(self, instruction: str, fields: Dict) -> Optional[Dict]:
+        """Компилирует бриф и инструкцию в компактный план вопросов"""
+        prompt = get_prompt("question_plan_generator")
+        
+        response = await self.llm.ainvoke(prompt.format(
+            industry=fields.get("industry", ""),
+            target=fields.get("target", ""),
+            hypotheses=fields.get("hypotheses", ""),
+            style=fields.get("style", ""),
+            instruction=instruction
+        ))
+        
+        # Clean up the response - remove markdown code blocks
+        content = response.content.strip()
+        if content.startswith("```"):
+            content = content.strip("`")
+            if content.startswith("json"):
+                content = content[4:]
+        content = content[content.find("{"):content.rfind("}") + 1]
+        
+        try:
+            plan = json.loads(content)
+        except json.JSONDecodeError as e:
+            logger.error(f"JSON decode error in compile_question_plan: {e}")
+            return None
+        
+        topics = [
+            {
+                "topic": str(t.get("topic", "")).strip(),
+                "goal": str(t.get("goal", "")).strip(),
+                "probes": [str(p).strip() for p in (t.get("probes") or [])][:3],
+                "hypotheses": [str(h).strip() for h in (t.get("hypotheses") or [])][:3]
+            }
+            for t in (plan.get("topics") or [])[:8]
+            if isinstance(t, dict) and t.get("topic")
+        ]
+        if not topics:
+            logger.error("Question plan has no topics")
+            return None
+        
+        style = plan.get("style")
+        if style not in ("friendly", "neutral", "expert"):
+            style = "friendly"
+        return {"style": style, "topics": topics}
+    
+    async def generate_planned_question(self, plan: Dict, position: int, last_question: str,
+                                        last_answer: str, questions_count: int) -> Optional[str]:
+        """Генерирует следующий вопрос по плану: текущая тема + последний обмен репликами"""
+        topics = plan.get("topics") or []
+        if not topics:
+            return None
+        
+        if position < len(topics):
+            current = topics[position]
+            next_topic = topics[position + 1]["topic"] if position + 1 < len(topics) else "завершение интервью"
+        else:
+            # Plan is covered: keep digging for extra insights
+            current = {
+                "topic": "Дополнительные инсайты",
+                "goal": "Узнать, что еще важно респонденту и не прозвучало раньше",
+                "probes": [],
+                "hypotheses": []
+            }
+            next_topic = "завершение интервью"
+        
+        prompt = get_prompt("next_question_from_plan")
+        
+        response = await self.llm.ainvoke(prompt.format(
+            style=plan.get("style", "friendly"),
+            topic=current["topic"],
+            goal=current["goal"],
+            probes="; ".join(current.get("probes") or []) or "-",
+            hypotheses="; ".join(current.get("hypotheses") or []) or "-",
+            next_topic=next_topic,
+            questions_count=questions_count,
+            last_question=last_question,
+            last_answer=last_answer
+        ))
+        
+        content = response.content.strip()
+        # Интервью заканчивается только когда пользователь говорит "хватит"
+        if not content or content.upper() == "FINISH":
+            return None
+        return content
@@ -1,15 +1,24 @@
 import os
-from typing import Union
+from typing import Dict, Tuple, Union
 from loguru import logger
 
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import AsyncSupabaseService
 from src.services.zep_service import ZepService
 from src.agents.base import BaseResearcherAgent, BaseRespondentAgent
 from src.agents.direct import DirectResearcherAgent, DirectRespondentAgent
 
+# Process-level agent singletons keyed by (role, mode)
+_agents: Dict[Tuple[str, str], Union[BaseResearcherAgent, BaseRespondentAgent]] = {}
+
+
+def _resolve_mode(mode: str = None) -> str:
+    if mode is None:
+        mode = os.getenv("AGENT_MODE", "direct").lower()
+    return mode
+
 
 def create_researcher_agent(
-    supabase: SupabaseService, 
+    supabase: AsyncSupabaseService, 
     zep: ZepService,
     mode: str = None
 ) -> BaseResearcherAgent:
@@ -24,8 +33,7 @@ def create_researcher_agent(
     Returns:
         ResearcherAgent instance
     """
-    if mode is None:
-        mode = os.getenv("AGENT_MODE", "direct").lower()
+    mode = _resolve_mode(mode)
     
     logger.info(f"Creating ResearcherAgent in mode: {mode}")
     
@@ -45,7 +53,7 @@ def create_researcher_agent(
 
 
 def create_respondent_agent(
-    supabase: SupabaseService, 
+    supabase: AsyncSupabaseService, 
     zep: ZepService,
     mode: str = None
 ) -> BaseRespondentAgent:
@@ -60,8 +68,7 @@ def create_respondent_agent(
     Returns:
         RespondentAgent instance
     """
-    if mode is None:
-        mode = os.getenv("AGENT_MODE", "direct").lower()
+    mode = _resolve_mode(mode)
     
     logger.info(f"Creating RespondentAgent in mode: {mode}")
     
@@ -81,7 +88,7 @@ def create_respondent_agent(
 
 
 # For backward compatibility - these will use the default mode from env
-def create_agents(supabase: SupabaseService, zep: ZepService) -> tuple:
+def create_agents(supabase: AsyncSupabaseService, zep: ZepService) -> tuple:
     """
     Create both agents using the default mode from environment.
     
@@ -91,4 +98,42 @@ def create_agents(supabase: SupabaseService, zep: ZepService) -> tuple:
     return (
         create_researcher_agent(supabase, zep),
         create_respondent_agent(supabase, zep)
-    )
\ No newline at end of file
+    )
+
+
+def get_researcher_agent(
+    supabase: AsyncSupabaseService,
+    zep: ZepService,
+    mode: str = None
+) -> BaseResearcherAgent:
+    """
+    Returns the process-wide ResearcherAgent for the given mode.
+    
+    Agents are stateless: all per-dialog data lives in FSM state, so a single
+    instance serves every user. The instance is created on first use.
+    """
+    key = ("researcher", _resolve_mode(mode))
+    agent = _agents.get(key)
+    if agent is None:
+        agent = create_researcher_agent(supabase, zep, key[1])
+        _agents[key] = agent
+    return agent
+
+
+def get_respondent_agent(
+    supabase: AsyncSupabaseService,
+    zep: ZepService,
+    mode: str = None
+) -> BaseRespondentAgent:
+    """
+    Returns the process-wide RespondentAgent for the given mode.
+    
+    Agents are stateless: all per-interview data lives in FSM state, so a single
+    instance serves every respondent. The instance is created on first use.
+    """
+    key = ("respondent", _resolve_mode(mode))
+    agent = _agents.get(key)
+    if agent is None:
+        agent = create_respondent_agent(supabase, zep, key[1])
+        _agents[key] = agent
+    return agent
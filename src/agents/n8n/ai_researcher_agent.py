@@ -5,14 +5,14 @@ import json
 from loguru import logger
 
 from src.agents.base import BaseResearcherAgent
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import AsyncSupabaseService
 from src.services.zep_service import ZepService
 
 
 class AIResearcherAgent(BaseResearcherAgent):
     """n8n workflow implementation of ResearcherAgent"""
     
-    def __init__(self, supabase: SupabaseService, zep: ZepService):
+    def __init__(self, supabase: AsyncSupabaseService, zep: ZepService):
         super().__init__(supabase, zep)
         self.n8n_webhook_url = os.getenv("N8N_WEBHOOK_URL", "").rstrip("/")
         self.n8n_api_key = os.getenv("N8N_API_KEY", "")
@@ -1,27 +1,27 @@
 from typing import Dict, Optional
 from aiogram import types, Bot
 from aiogram.fsm.context import FSMContext
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
 from loguru import logger
 import json
 import re
 import os
 
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import AsyncSupabaseService
 from src.services.zep_service import ZepService
+from src.services.llm_registry import get_llm
+from src.services.prompt_registry import get_prompt
 from src.services.voice_handler import VoiceMessageHandler
 from src.utils.keyboards import get_cancel_keyboard
 from src.state.user_states import ResearcherStates
 
 class ResearcherAgent:
-    def __init__(self, supabase: SupabaseService, zep: ZepService):
+    def __init__(self, supabase: AsyncSupabaseService, zep: ZepService):
         self.supabase = supabase
         self.zep = zep
         # Initialize voice handler with bot token
         bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
         self.voice_handler = VoiceMessageHandler(bot_token=bot_token)
-        self.llm = ChatOpenAI(model_name="gpt-4o", temperature=0.7)
+        self.llm = get_llm()
         
         # Статичные вопросы и поля
         self.static_questions = {
@@ -49,7 +49,7 @@ class ResearcherAgent:
         user_id = message.from_user.id
         
         # Create new interview
-        interview = self.supabase.create_interview({"researcher_telegram_id": user_id})
+        interview = await self.supabase.create_interview({"researcher_telegram_id": user_id})
         if not interview:
             await message.answer("❌ Ошибка создания интервью")
             return
@@ -105,7 +105,8 @@ class ResearcherAgent:
         # Process voice message
         result = await self.voice_handler.process_voice_message(
             file_id=message.voice.file_id,
-            duration=message.voice.duration
+            duration=message.voice.duration,
+            file_unique_id=message.voice.file_unique_id
         )
         
         # Delete processing message
@@ -262,13 +263,7 @@ class ResearcherAgent:
     
     async def _evaluate_answer_quality(self, field: str, answer: str) -> Dict:
         """Оценивает качество ответа на вопрос"""
-        with open("src/prompts/field_analyzer.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["field_name", "field_description", "question", "answer"],
-            template=template
-        )
+        prompt = get_prompt("field_analyzer")
         
         field_description = {
             "name": "Имя или обращение к исследователю",
@@ -340,13 +335,7 @@ class ResearcherAgent:
     
     async def _generate_clarification(self, field: str, answer: str, missing_aspects: list) -> str:
         """Генерирует уточняющий вопрос"""
-        with open("src/prompts/clarification_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["field_name", "original_question", "answer", "missing_aspects", "conversation_history"],
-            template=template
-        )
+        prompt = get_prompt("clarification_generator")
         
         response = await self.llm.ainvoke(
             prompt.format(
@@ -362,13 +351,7 @@ class ResearcherAgent:
     
     async def _generate_interview_brief(self, fields: Dict) -> str:
         """Генерирует интервью-бриф на основе собранных данных"""
-        with open("src/prompts/interview_brief_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["answers"],
-            template=template
-        )
+        prompt = get_prompt("interview_brief_generator")
         
         # Just pass the fields as they are, let the LLM handle formatting
         response = await self.llm.ainvoke(
@@ -447,7 +430,7 @@ class ResearcherAgent:
             # После выполнения миграций можно будет добавить сохранение на верхний уровень
             
             try:
-                self.supabase.update_interview(interview_id, update_data)
+                await self.supabase.update_interview(interview_id, update_data)
             except Exception as e:
                 logger.error(f"Error updating interview: {e}")
                 await message.answer(
@@ -493,13 +476,7 @@ class ResearcherAgent:
             await state.clear()
     
     async def _generate_instruction(self, fields: Dict) -> str:
-        with open("src/prompts/instruction_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["fields"],
-            template=template
-        )
+        prompt = get_prompt("instruction_generator")
         
         response = await self.llm.ainvoke(prompt.format(fields=fields))
         return response.content
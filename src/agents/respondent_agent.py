@@ -1,28 +1,28 @@
 from typing import Dict, Optional, List
 from aiogram import types, Bot
 from aiogram.fsm.context import FSMContext
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
 from loguru import logger
 import json
 import os
 import asyncio
 from datetime import datetime
 
-from src.services.supabase_service import SupabaseService
+from src.services.supabase_service import AsyncSupabaseService
 from src.services.zep_service import ZepService
+from src.services.llm_registry import get_llm
+from src.services.prompt_registry import get_prompt
 from src.services.voice_handler import VoiceMessageHandler
 # Removed import of get_finish_keyboard
 from src.state.user_states import RespondentStates
 
 class RespondentAgent:
-    def __init__(self, supabase: SupabaseService, zep: ZepService):
+    def __init__(self, supabase: AsyncSupabaseService, zep: ZepService):
         self.supabase = supabase
         self.zep = zep
         # Initialize voice handler with bot token
         bot_token = os.getenv("TELEGRAM_BOT_TOKEN")
         self.voice_handler = VoiceMessageHandler(bot_token=bot_token)
-        self.llm = ChatOpenAI(model_name="gpt-4o", temperature=0.7)
+        self.llm = get_llm()
     
     async def start_interview(self, message: types.Message, state: FSMContext, interview_id: str):
         user_id = message.from_user.id
@@ -34,13 +34,13 @@ class RespondentAgent:
             return
         
         # Get interview details
-        interview = self.supabase.get_interview(interview_id)
+        interview = await self.supabase.get_interview(interview_id)
         if not interview:
             await message.answer("❌ Интервью не найдено")
             return
         
         # Create session for respondent (instead of response record)
-        session = self.supabase.create_session(
+        session = await self.supabase.create_session(
             user_id=user_id,
             session_type="respondent",
             interview_id=interview_id
@@ -107,7 +107,8 @@ class RespondentAgent:
         # Process voice message
         result = await self.voice_handler.process_voice_message(
             file_id=message.voice.file_id,
-            duration=message.voice.duration
+            duration=message.voice.duration,
+            file_unique_id=message.voice.file_unique_id
         )
         
         # Delete processing message
@@ -182,7 +183,7 @@ class RespondentAgent:
         await state.update_data(answers=answers)
         
         # Update session in database
-        self.supabase.update_session(session_id, {"answers": answers})
+        await self.supabase.update_session(session_id, {"answers": answers})
         
         # Check if we need to send interim summary (after 5, 10, 15 answers)
         answers_count = len(answers)
@@ -221,13 +222,7 @@ class RespondentAgent:
         elif "эксперт" in instruction.lower():
             style = "expert"
         
-        with open("src/prompts/first_question_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["instruction", "style", "target"],
-            template=template
-        )
+        prompt = get_prompt("first_question_generator")
         
         response = await self.llm.ainvoke(
             prompt.format(
@@ -260,13 +255,7 @@ class RespondentAgent:
         elif "эксперт" in instruction.lower():
             style = "expert"
         
-        with open("src/prompts/next_question_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["instruction", "history", "questions_count", "style"],
-            template=template
-        )
+        prompt = get_prompt("next_question_generator")
         
         response = await self.llm.ainvoke(
             prompt.format(
@@ -304,14 +293,14 @@ class RespondentAgent:
         logger.info(f"Generated summary: {summary[:100]}...")
         
         # Update session
-        self.supabase.update_session(session_id, {
+        await self.supabase.update_session(session_id, {
             "status": "completed",
             "summary": summary,
             "answers": answers
         })
         
         # Send to researcher
-        interview = self.supabase.get_interview(interview_id)
+        interview = await self.supabase.get_interview(interview_id)
         logger.info(f"Interview data: {interview}")
         
         researcher_id = None
@@ -398,13 +387,7 @@ class RespondentAgent:
             for q, a in answers.items()
         ])
         
-        with open("src/prompts/interview_summary_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["qa_text", "answers_count"],
-            template=template
-        )
+        prompt = get_prompt("interview_summary_generator")
         
         response = await self.llm.ainvoke(prompt.format(qa_text=qa_text, answers_count=answers_count))
         return response.content
@@ -519,7 +502,7 @@ class RespondentAgent:
     
     async def _get_researcher_id(self, interview_id: str) -> Optional[int]:
         """Получить ID исследователя из интервью"""
-        interview = self.supabase.get_interview(interview_id)
+        interview = await self.supabase.get_interview(interview_id)
         if not interview:
             return None
         
@@ -5,6 +5,8 @@ import os
 from loguru import logger
 
 from src.api.endpoints import router
+from src.services.llm_registry import close_llm_clients
+from src.services.prompt_registry import load_prompts
 
 
 # Security
@@ -26,8 +28,10 @@ async def verify_api_key(credentials: HTTPAuthorizationCredentials = Security(se
 async def lifespan(app: FastAPI):
     """Manage application lifecycle"""
     logger.info("Starting API server for n8n integration...")
+    load_prompts()
     yield
     logger.info("Shutting down API server...")
+    await close_llm_clients()
 
 
 # Create FastAPI app
@@ -2,17 +2,14 @@ from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Dict, List, Optional
 from loguru import logger
-from langchain_openai import ChatOpenAI
-from langchain.prompts import PromptTemplate
 import json
 
+from src.services.llm_registry import get_llm
+from src.services.prompt_registry import get_prompt
+
 # Create router
 router = APIRouter()
 
-# Initialize LLM (will be used by n8n endpoints)
-llm = ChatOpenAI(model_name="gpt-4o", temperature=0.7)
-
-
 # Request/Response models
 class AnalyzeAnswerRequest(BaseModel):
     field: str
@@ -86,15 +83,9 @@ class GenerateSummaryResponse(BaseModel):
 async def analyze_answer(request: AnalyzeAnswerRequest):
     """Analyze answer quality for researcher"""
     try:
-        with open("src/prompts/field_analyzer.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["field_name", "field_description", "question", "answer"],
-            template=template
-        )
+        prompt = get_prompt("field_analyzer")
         
-        response = await llm.ainvoke(
+        response = await get_llm().ainvoke(
             prompt.format(
                 field_name=request.field,
                 field_description=request.field_description,
@@ -124,15 +115,9 @@ async def analyze_answer(request: AnalyzeAnswerRequest):
 async def generate_clarification(request: GenerateClarificationRequest):
     """Generate clarification question for researcher"""
     try:
-        with open("src/prompts/clarification_generator.txt", "r") as f:
-            template = f.read()
+        prompt = get_prompt("clarification_generator")
         
-        prompt = PromptTemplate(
-            input_variables=["field_name", "original_question", "answer", "missing_aspects", "conversation_history"],
-            template=template
-        )
-        
-        response = await llm.ainvoke(
+        response = await get_llm().ainvoke(
             prompt.format(
                 field_name=request.field,
                 original_question=request.original_question,
@@ -153,15 +138,9 @@ async def generate_clarification(request: GenerateClarificationRequest):
 async def generate_brief(request: GenerateBriefRequest):
     """Generate interview brief"""
     try:
-        with open("src/prompts/interview_brief_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["answers"],
-            template=template
-        )
+        prompt = get_prompt("interview_brief_generator")
         
-        response = await llm.ainvoke(
+        response = await get_llm().ainvoke(
             prompt.format(answers=json.dumps(request.fields, ensure_ascii=False, indent=2))
         )
         
@@ -176,15 +155,9 @@ async def generate_brief(request: GenerateBriefRequest):
 async def generate_instruction(request: GenerateInstructionRequest):
     """Generate instruction for respondents"""
     try:
-        with open("src/prompts/instruction_generator.txt", "r") as f:
-            template = f.read()
+        prompt = get_prompt("instruction_generator")
         
-        prompt = PromptTemplate(
-            input_variables=["fields"],
-            template=template
-        )
-        
-        response = await llm.ainvoke(prompt.format(fields=request.fields))
+        response = await get_llm().ainvoke(prompt.format(fields=request.fields))
         
         return GenerateInstructionResponse(instruction=response.content)
         
@@ -198,15 +171,9 @@ async def generate_instruction(request: GenerateInstructionRequest):
 async def generate_first_question(request: GenerateFirstQuestionRequest):
     """Generate first question for respondent"""
     try:
-        with open("src/prompts/first_question_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["instruction", "style", "target"],
-            template=template
-        )
+        prompt = get_prompt("first_question_generator")
         
-        response = await llm.ainvoke(
+        response = await get_llm().ainvoke(
             prompt.format(
                 instruction=request.instruction,
                 style=request.style,
@@ -225,15 +192,9 @@ async def generate_first_question(request: GenerateFirstQuestionRequest):
 async def generate_next_question(request: GenerateNextQuestionRequest):
     """Generate next question for respondent"""
     try:
-        with open("src/prompts/next_question_generator.txt", "r") as f:
-            template = f.read()
+        prompt = get_prompt("next_question_generator")
         
-        prompt = PromptTemplate(
-            input_variables=["instruction", "history", "questions_count", "style"],
-            template=template
-        )
-        
-        response = await llm.ainvoke(
+        response = await get_llm().ainvoke(
             prompt.format(
                 instruction=request.instruction,
                 history=request.history,
@@ -264,15 +225,9 @@ async def generate_summary(request: GenerateSummaryRequest):
             for pair in request.qa_pairs
         ])
         
-        with open("src/prompts/interview_summary_generator.txt", "r") as f:
-            template = f.read()
-        
-        prompt = PromptTemplate(
-            input_variables=["qa_text", "answers_count"],
-            template=template
-        )
+        prompt = get_prompt("interview_summary_generator")
         
-        response = await llm.ainvoke(
+        response = await get_llm().ainvoke(
             prompt.format(qa_text=qa_text, answers_count=request.answers_count)
         )
         
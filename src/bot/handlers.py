@@ -4,8 +4,9 @@ from aiogram.fsm.context import FSMContext
 from loguru import logger
 from typing import Dict, Any
 
-# Import factory functions instead of direct classes
-from src.agents import create_researcher_agent, create_respondent_agent
+# Agents are process-level singletons; FSM state holds only serializable session data
+from src.agents import get_researcher_agent, get_respondent_agent
+from src.services.digest_service import DIGEST_CALLBACK_PREFIX, get_digest_service
 from src.state.user_states import ResearcherStates, RespondentStates
 from src.utils.keyboards import get_main_menu_keyboard, get_cancel_keyboard
 
@@ -38,15 +39,14 @@ async def start_respondent_interview(message: types.Message, state: FSMContext,
     supabase = kwargs.get("supabase")
     
     # Get interview data
-    interview = supabase.get_interview(interview_id)
+    interview = await supabase.get_interview(interview_id)
     if not interview or interview["status"] != "in_progress":
         await message.answer("❌ Интервью не найдено или уже завершено")
         await show_main_menu(message, state, **kwargs)
         return
     
-    # Initialize respondent agent using factory
-    agent = create_respondent_agent(kwargs.get("supabase"), kwargs.get("zep"))
-    await state.update_data(agent=agent, interview_id=interview_id)
+    agent = get_respondent_agent(kwargs.get("supabase"), kwargs.get("zep"))
+    await state.update_data(interview_id=interview_id)
     await state.set_state(RespondentStates.answering)
     
     # Start interview
@@ -86,9 +86,7 @@ async def cmd_cancel(message: types.Message, state: FSMContext):
 async def start_research(message: types.Message, state: FSMContext, **kwargs):
     logger.info(f"User {message.from_user.id} starting new research")
     
-    # Initialize researcher agent using factory
-    agent = create_researcher_agent(kwargs.get("supabase"), kwargs.get("zep"))
-    await state.update_data(agent=agent)
+    agent = get_researcher_agent(kwargs.get("supabase"), kwargs.get("zep"))
     await state.set_state(ResearcherStates.collecting_info)
     
     # Start research dialog
@@ -103,34 +101,57 @@ async def show_my_researches(message: types.Message, **kwargs):
 @router.message(ResearcherStates.collecting_info)
 async def process_researcher_message(message: types.Message, state: FSMContext, **kwargs):
     data = await state.get_data()
-    agent = data.get("agent")  # Type will be BaseResearcherAgent
     
-    if not agent:
+    # Dialog was never started properly (e.g. interview creation failed)
+    if not data.get("interview_id"):
         await state.clear()
         await show_main_menu(message, state, **kwargs)
         return
     
-    # Process message (text or voice)
+    agent = get_researcher_agent(kwargs.get("supabase"), kwargs.get("zep"))
+    
+    # Process message (text or voice); a debounced burst arrives as merged_text
     if message.voice:
         await agent.process_voice_message(message, state, message.bot)
     else:
-        await agent.process_text_message(message, state)
+        await agent.process_text_message(message, state, kwargs.get("merged_text"))
 
 @router.message(RespondentStates.answering)
 async def process_respondent_message(message: types.Message, state: FSMContext, **kwargs):
     data = await state.get_data()
-    agent = data.get("agent")  # Type will be BaseRespondentAgent
     
-    if not agent:
+    # Interview session was never created
+    if not data.get("session_id"):
         await state.clear()
         await show_main_menu(message, state, **kwargs)
         return
     
-    # Process answer
+    agent = get_respondent_agent(kwargs.get("supabase"), kwargs.get("zep"))
+    
+    # Process answer; a debounced burst arrives as merged_text
     if message.voice:
         await agent.process_voice_message(message, state, message.bot)
     else:
-        await agent.process_text_message(message, state)
+        await agent.process_text_message(message, state, kwargs.get("merged_text"))
+
+@router.callback_query(F.data.startswith(DIGEST_CALLBACK_PREFIX))
+async def show_digest_details(callback: types.CallbackQuery):
+    digest_id = callback.data[len(DIGEST_CALLBACK_PREFIX):]
+    details = get_digest_service().get_details(digest_id, callback.from_user.id)
+    if details is None:
+        await callback.answer("Подробности больше недоступны", show_alert=True)
+        return
+    
+    await callback.answer()
+    # Pack summaries into as few messages as the length limit allows
+    chunk = ""
+    for item in details:
+        if chunk and len(chunk) + len(item) + 2 > 4000:
+            await callback.message.answer(chunk)
+            chunk = ""
+        chunk = f"{chunk}\n\n{item}" if chunk else item[:4000]
+    if chunk:
+        await callback.message.answer(chunk)
 
 @router.message()
 async def echo_handler(message: types.Message):
@@ -1,4 +1,6 @@
-from typing import Callable, Dict, Any, Awaitable
+import asyncio
+import time
+from typing import Callable, Dict, Any, Awaitable, Iterable, List, Optional
 from aiogram import BaseMiddleware
 from aiogram.types import Message
 from loguru import logger
@@ -21,4 +23,104 @@ class LoggingMiddleware(BaseMiddleware):
         except Exception as e:
             logger.error(f"Error handling message from {user.id}: {e}")
             await event.answer("❌ Произошла ошибка. Пожалуйста, попробуйте позже.")
-            raise
\ No newline at end of file
+            raise
+
+
+class _Burst:
+    __slots__ = ("texts", "last_at")
+
+    def __init__(self, text: str):
+        self.texts = [text]
+        self.last_at = time.monotonic()
+
+
+class ChatSerializationMiddleware(BaseMiddleware):
+    """
+    Обрабатывает сообщения одного чата строго по очереди.
+
+    Every message joins its chat's queue (a FIFO lock) as soon as it arrives.
+    The FSM state is filled in by the update-level FSM middleware before this one
+    runs, so after taking the lock it is re-read from data["state"]; routing then
+    sees the state left by the previous message. Optionally merges bursts: when a
+    text message (in the given FSM states) reaches the head of the queue, it waits
+    until no further text has arrived for debounce_window seconds. Texts arriving
+    meanwhile are appended to it, and the first message reaches the handler with
+    the combined text in data["merged_text"]. Any other message (voice, command)
+    closes the burst and is queued behind it, so arrival order is kept.
+    """
+
+    def __init__(self, debounce_window: float = 0.0, debounce_states: Optional[Iterable[str]] = None):
+        """
+        Args:
+            debounce_window: Seconds to wait for further messages; 0 disables merging
+            debounce_states: FSM states where merging applies; None means any state
+        """
+        self.debounce_window = debounce_window
+        self.debounce_states = set(debounce_states) if debounce_states is not None else None
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._lock_users: Dict[int, int] = {}
+        # Open bursts: the head of the chat's queue is waiting for more text
+        self._bursts: Dict[int, _Burst] = {}
+
+        # Metrics
+        self.merged_messages = 0
+
+    def _is_mergeable(self, event: Message) -> bool:
+        return self.debounce_window > 0 and bool(event.text) and not event.text.startswith("/")
+
+    async def _refresh_state(self, data: Dict[str, Any]) -> Optional[str]:
+        state = data.get("state")
+        if state is not None:
+            data["raw_state"] = await state.get_state()
+        return data.get("raw_state")
+
+    async def _collect_burst(self, chat_id: int, text: str) -> List[str]:
+        burst = self._bursts[chat_id] = _Burst(text)
+        try:
+            while True:
+                delay = burst.last_at + self.debounce_window - time.monotonic()
+                if delay <= 0 or self._bursts.get(chat_id) is not burst:
+                    break
+                await asyncio.sleep(delay)
+        finally:
+            if self._bursts.get(chat_id) is burst:
+                del self._bursts[chat_id]
+        return burst.texts
+
+    async def __call__(
+        self,
+        handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
+        event: Message,
+        data: Dict[str, Any]
+    ) -> Any:
+        chat_id = event.chat.id
+
+        burst = self._bursts.get(chat_id)
+        if burst is not None:
+            if self._is_mergeable(event):
+                # The message at the head of the queue carries this text
+                burst.texts.append(event.text)
+                burst.last_at = time.monotonic()
+                self.merged_messages += 1
+                return None
+            # Nothing after this message may overtake it
+            del self._bursts[chat_id]
+
+        lock = self._locks.setdefault(chat_id, asyncio.Lock())
+        self._lock_users[chat_id] = self._lock_users.get(chat_id, 0) + 1
+        try:
+            async with lock:
+                raw_state = await self._refresh_state(data)
+                if self._is_mergeable(event) and (
+                    self.debounce_states is None or raw_state in self.debounce_states
+                ):
+                    texts = await self._collect_burst(chat_id, event.text)
+                    if len(texts) > 1:
+                        data["merged_text"] = "\n".join(texts)
+                        logger.info(f"Merged {len(texts)} messages from chat {chat_id}")
+                return await handler(event, data)
+        finally:
+            self._lock_users[chat_id] -= 1
+            if not self._lock_users[chat_id]:
+                del self._lock_users[chat_id]
+                self._locks.pop(chat_id, None)
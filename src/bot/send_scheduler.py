@@ -0,0 +1,262 @@
+"""Outbound send scheduler with Telegram flood-control awareness.
+
+Registered as a bot session middleware, so every send/edit request - replies,
+reminders, researcher notifications - passes through it. A request waits for a
+token from the global bucket and from its chat's bucket. Waiting requests are
+granted in priority order: interactive replies first, then notifications, then
+digests. A waiting request moves up one priority level for every
+priority_aging seconds it has waited, so a steady stream of replies cannot
+starve lower priorities. A request rejected with TelegramRetryAfter pauses its
+chat for retry_after seconds and is retried.
+
+Callers mark lower-priority sends with the send_priority() context manager.
+"""
+import asyncio
+import bisect
+import itertools
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from enum import IntEnum
+from typing import Any, Dict, Hashable, List, Optional
+
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods import TelegramMethod
+from aiogram.methods.base import TelegramType
+from loguru import logger
+
+
+class SendPriority(IntEnum):
+    INTERACTIVE = 0  # Replies to the user's own message
+    NOTIFICATION = 1  # Reminders
+    DIGEST = 2  # Researcher notifications and summaries
+
+
+_priority: ContextVar[SendPriority] = ContextVar("send_priority", default=SendPriority.INTERACTIVE)
+
+
+@contextmanager
+def send_priority(priority: SendPriority):
+    """Задать приоритет отправок внутри блока"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Секунды до появления токена (0, если есть)"""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self) -> None:
+        self.tokens -= 1
+
+    def is_full(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "chat_id", "future", "enqueued_at")
+
+    def __init__(self, priority: int, seq: int, chat_id: Hashable, future: asyncio.Future):
+        self.priority = priority
+        self.seq = seq
+        self.chat_id = chat_id
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+# Methods that post or change messages count against the flood limits
+_LIMITED_PREFIXES = ("send", "edit", "copy", "forward")
+
+
+class SendScheduler(BaseRequestMiddleware):
+    """Планировщик исходящих сообщений: token bucket на чат и глобально, приоритеты, retry_after"""
+
+    def __init__(self, global_rate: float = 30.0, chat_rate: float = 1.0, chat_burst: float = 3.0,
+                 group_rate: float = 20 / 60, max_retries: int = 3, priority_aging: float = 5.0):
+        """
+        Args:
+            global_rate: Messages per second for the whole bot
+            chat_rate: Messages per second to one private chat
+            chat_burst: Messages a private chat can receive back to back
+            group_rate: Messages per second to one group chat
+            max_retries: Retries of a request rejected with retry_after
+            priority_aging: Seconds of waiting that raise a request by one priority level; 0 disables
+        """
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.group_rate = group_rate
+        self.max_retries = max_retries
+        self.priority_aging = priority_aging
+
+        self._chat_buckets: Dict[Hashable, TokenBucket] = {}
+        self._blocked_until: Dict[Hashable, float] = {}
+        self._queue: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._last_cleanup = time.monotonic()
+
+        # Metrics
+        self.sent = 0
+        self.retries = 0
+        self.max_wait_ms = 0.0
+        self._total_wait_ms = 0.0
+
+    def _chat_bucket(self, chat_id: Hashable) -> TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if isinstance(chat_id, int) and chat_id > 0:
+                bucket = TokenBucket(self.chat_rate, self.chat_burst)
+            else:
+                bucket = TokenBucket(self.group_rate, 1)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _chat_delay(self, chat_id: Hashable, now: float) -> float:
+        blocked = self._blocked_until.get(chat_id, 0.0) - now
+        return max(blocked, self._chat_bucket(chat_id).delay(now))
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType[TelegramType],
+        bot: Bot,
+        method: TelegramMethod[TelegramType],
+    ) -> Any:
+        chat_id = getattr(method, "chat_id", None)
+        api_method = getattr(method, "__api_method__", "")
+        if chat_id is None or not api_method.startswith(_LIMITED_PREFIXES):
+            return await make_request(bot, method)
+
+        priority = _priority.get()
+        attempt = 0
+        while True:
+            await self._acquire(chat_id, priority)
+            try:
+                return await make_request(bot, method)
+            except TelegramRetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                self.retries += 1
+                self._blocked_until[chat_id] = time.monotonic() + e.retry_after
+                logger.warning(
+                    f"Flood control for chat {chat_id}: retry {attempt}/{self.max_retries} "
+                    f"of {api_method} in {e.retry_after}s"
+                )
+
+    async def _acquire(self, chat_id: Hashable, priority: int) -> None:
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+        waiter = _Waiter(priority, next(self._seq), chat_id, asyncio.get_running_loop().create_future())
+        bisect.insort(self._queue, waiter)
+        self._wakeup.set()
+        await waiter.future
+
+    async def _dispatch_loop(self) -> None:
+        while True:
+            if not self._queue:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            now = time.monotonic()
+            wait = self.global_bucket.delay(now)
+            if wait <= 0:
+                # Callers that went away (cancelled)
+                self._queue = [waiter for waiter in self._queue if not waiter.future.done()]
+                wait = float("inf")
+                best: Optional[_Waiter] = None
+                best_key = None
+                for waiter in self._queue:
+                    chat_wait = self._chat_delay(waiter.chat_id, now)
+                    if chat_wait > 0:
+                        wait = min(wait, chat_wait)
+                        continue
+                    key = (self._effective_priority(waiter, now), waiter.seq)
+                    if best_key is None or key < best_key:
+                        best, best_key = waiter, key
+                if best is not None:
+                    self._queue.remove(best)
+                    self._grant(best, now)
+                    wait = 0.0
+                self._cleanup(now)
+
+            if wait > 0:
+                # Sleep until a token frees up or a new request arrives
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=wait)
+                except asyncio.TimeoutError:
+                    pass
+
+    def _effective_priority(self, waiter: _Waiter, now: float) -> int:
+        if self.priority_aging <= 0:
+            return waiter.priority
+        return max(0, waiter.priority - int((now - waiter.enqueued_at) / self.priority_aging))
+
+    def _grant(self, waiter: _Waiter, now: float) -> None:
+        self.global_bucket.take()
+        self._chat_bucket(waiter.chat_id).take()
+        waited_ms = (now - waiter.enqueued_at) * 1000
+        self.sent += 1
+        self._total_wait_ms += waited_ms
+        self.max_wait_ms = max(self.max_wait_ms, waited_ms)
+        waiter.future.set_result(None)
+
+    def _cleanup(self, now: float, interval: float = 60.0) -> None:
+        # Full buckets hold no information: drop them to keep memory bounded
+        if now - self._last_cleanup < interval:
+            return
+        self._last_cleanup = now
+        queued = {waiter.chat_id for waiter in self._queue}
+        for chat_id in [c for c, b in self._chat_buckets.items() if c not in queued and b.is_full(now)]:
+            del self._chat_buckets[chat_id]
+        for chat_id in [c for c, until in self._blocked_until.items() if until <= now]:
+            del self._blocked_until[chat_id]
+
+    def stats(self) -> Dict:
+        """Метрики очереди отправки"""
+        depth = {priority.name.lower(): 0 for priority in SendPriority}
+        for waiter in self._queue:
+            depth[SendPriority(waiter.priority).name.lower()] += 1
+        return {
+            "queue_depth": depth,
+            "sent": self.sent,
+            "retries": self.retries,
+            "avg_wait_ms": round(self._total_wait_ms / self.sent, 1) if self.sent else 0.0,
+            "max_wait_ms": round(self.max_wait_ms, 1),
+            "tracked_chats": len(self._chat_buckets),
+        }
+
+    async def close(self) -> None:
+        if self._dispatcher:
+            self._dispatcher.cancel()
+            try:
+                await self._dispatcher
+            except asyncio.CancelledError:
+                pass
+            self._dispatcher = None
+        logger.info(f"Send scheduler stopped: {self.stats()}")
@@ -0,0 +1,160 @@
+"""Persistent FSM storage for the dispatcher.
+
+FSM_STORAGE selects the backend:
+- memory: aiogram MemoryStorage (default; state is lost on restart)
+- sqlite: local SQLite database in WAL mode; survives restarts of a single replica
+- redis: aiogram RedisStorage (any Redis-protocol server); shared by all replicas
+
+Both persistent backends store FSM data as compact JSON and expire sessions
+that have not been touched for FSM_TTL seconds, so abandoned dialogs do not
+accumulate.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from loguru import logger
+
+from src.utils.config import Config
+
+
+def compact_dumps(value: Any) -> str:
+    """JSON без пробелов и с кириллицей как есть - заметно короче стандартного"""
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class SQLiteStorage(BaseStorage):
+    """FSM-хранилище в SQLite (WAL) с истечением неактивных сессий"""
+
+    PURGE_INTERVAL = 300  # seconds between removals of expired rows
+
+    def __init__(self, path: str = "data/fsm.sqlite3", ttl: Optional[float] = None):
+        """
+        Args:
+            path: Database file
+            ttl: Seconds of inactivity after which a session expires; None keeps it forever
+        """
+        self.path = path
+        self.ttl = ttl
+        self.key_builder = DefaultKeyBuilder(with_destiny=True)
+        # sqlite3 connections are bound to one thread: all queries go through it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="fsm-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+        self._last_purge = 0.0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS fsm ("
+                " key TEXT PRIMARY KEY,"
+                " state TEXT,"
+                " data TEXT,"
+                " expires_at REAL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS fsm_expires_at ON fsm (expires_at)")
+            conn.commit()
+            self._conn = conn
+            logger.info(f"SQLite FSM storage opened: {self.path}")
+        return self._conn
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _expires_at(self) -> Optional[float]:
+        return time.time() + self.ttl if self.ttl else None
+
+    def _read(self, key: str) -> Optional[tuple]:
+        row = self._connect().execute(
+            "SELECT state, data, expires_at FROM fsm WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None or (row[2] is not None and row[2] <= time.time()):
+            return None
+        return row
+
+    def _write(self, key: str, column: str, value: Optional[str]) -> None:
+        conn = self._connect()
+        now = time.time()
+        # An expired row must not resurrect its other column under a fresh TTL
+        conn.execute("DELETE FROM fsm WHERE key = ? AND expires_at IS NOT NULL AND expires_at <= ?", (key, now))
+        conn.execute(
+            f"INSERT INTO fsm (key, {column}, expires_at) VALUES (?, ?, ?) "
+            f"ON CONFLICT(key) DO UPDATE SET {column} = excluded.{column}, expires_at = excluded.expires_at",
+            (key, value, self._expires_at()),
+        )
+        # Both columns empty: nothing left to keep
+        conn.execute("DELETE FROM fsm WHERE key = ? AND state IS NULL AND data IS NULL", (key,))
+        if now - self._last_purge > self.PURGE_INTERVAL:
+            conn.execute("DELETE FROM fsm WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+            self._last_purge = now
+        conn.commit()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        value = state.state if isinstance(state, State) else state
+        await self._run(self._write, self.key_builder.build(key), "state", value)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._run(self._read, self.key_builder.build(key))
+        return row[0] if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        value = compact_dumps(dict(data)) if data else None
+        await self._run(self._write, self.key_builder.build(key), "data", value)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._run(self._read, self.key_builder.build(key))
+        if not row or not row[1]:
+            return {}
+        return json.loads(row[1])
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        await self._run(self._close)
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+
+def create_fsm_storage(config: Config) -> BaseStorage:
+    """Создаёт FSM-хранилище по настройке fsm_storage"""
+    backend = config.fsm_storage.lower()
+    ttl = config.fsm_ttl or None
+
+    if backend == "memory":
+        return MemoryStorage()
+
+    if backend == "sqlite":
+        logger.info(f"FSM storage: SQLite ({config.fsm_sqlite_path}, ttl={ttl})")
+        return SQLiteStorage(path=config.fsm_sqlite_path, ttl=ttl)
+
+    if backend == "redis":
+        if not config.redis_url:
+            raise ValueError("REDIS_URL must be set for FSM_STORAGE=redis")
+        from aiogram.fsm.storage.redis import RedisStorage
+
+        logger.info(f"FSM storage: Redis (ttl={ttl})")
+        return RedisStorage.from_url(
+            config.redis_url,
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=int(ttl) if ttl else None,
+            data_ttl=int(ttl) if ttl else None,
+            json_dumps=compact_dumps,
+        )
+
+    raise ValueError(f"Unknown FSM storage: {config.fsm_storage}")
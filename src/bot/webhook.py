@@ -0,0 +1,86 @@
+"""Webhook delivery of Telegram updates.
+
+Telegram POSTs updates to a route mounted on the FastAPI app from src/api/app.py,
+so in webhook mode one process serves the n8n API and the bot with the same
+connection pools. Requests are authenticated with the secret token Telegram
+echoes in X-Telegram-Bot-Api-Secret-Token. Updates are acknowledged right away
+and processed in the background; a semaphore bounds how many are in flight, and
+once it is exhausted new requests wait, which pushes back on Telegram.
+"""
+import asyncio
+import hmac
+from typing import Optional, Set
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from fastapi import APIRouter, HTTPException, Request, Response
+from loguru import logger
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateFeeder:
+    """Передаёт обновления из вебхука в диспетчер с ограничением параллельности"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, max_concurrency: int = 64):
+        self.dp = dp
+        self.bot = bot
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Metrics
+        self.received = 0
+        self.failed = 0
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._tasks)
+
+    async def feed(self, update: Update) -> None:
+        """Запускает обработку обновления; ждёт, если обрабатывается слишком много"""
+        await self._semaphore.acquire()
+        self.received += 1
+        task = asyncio.create_task(self._process(update))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, update: Update) -> None:
+        try:
+            await self.dp.feed_update(self.bot, update)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error processing update {update.update_id}: {e}")
+        finally:
+            self._semaphore.release()
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Дождаться обработки принятых обновлений (при остановке)"""
+        if self._tasks:
+            logger.info(f"Waiting for {len(self._tasks)} in-flight updates")
+            await asyncio.wait(set(self._tasks), timeout=timeout)
+
+
+def create_webhook_router(feeder: UpdateFeeder, path: str,
+                          secret_token: Optional[str] = None) -> APIRouter:
+    """
+    Создаёт маршрут FastAPI, принимающий обновления Telegram.
+
+    Args:
+        feeder: Update feeder bound to the dispatcher and bot
+        path: Webhook path, e.g. /telegram/webhook
+        secret_token: Expected X-Telegram-Bot-Api-Secret-Token value
+    """
+    router = APIRouter()
+
+    @router.post(path, include_in_schema=False)
+    async def telegram_webhook(request: Request) -> Response:
+        if secret_token:
+            received = request.headers.get(SECRET_HEADER, "")
+            if not hmac.compare_digest(received, secret_token):
+                raise HTTPException(status_code=401, detail="Invalid secret token")
+
+        update = Update.model_validate(await request.json(), context={"bot": feeder.bot})
+        await feeder.feed(update)
+        return Response(status_code=200)
+
+    return router
@@ -5,13 +5,26 @@ from os import getenv
 
 from aiogram import Bot, Dispatcher
 from aiogram.client.default import DefaultBotProperties
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
 from aiogram.enums import ParseMode
 from dotenv import load_dotenv
 from loguru import logger
 
+from src.agents import get_respondent_agent
 from src.bot.handlers import router
-from src.bot.middlewares import LoggingMiddleware
-from src.utils.config import Config
+from src.bot.middlewares import ChatSerializationMiddleware, LoggingMiddleware
+from src.bot.send_scheduler import SendScheduler
+from src.bot.storage import create_fsm_storage
+from src.services.audio_processing import configure_audio_pool, shutdown_audio_pool
+from src.services.http_session import close_http_session
+from src.services.llm_registry import close_llm_clients
+from src.services.whisper_service import close_transcription_service, get_transcription_service
+from src.services.digest_service import close_digest_service, get_digest_service
+from src.services.prompt_registry import load_prompts
+from src.services.reminder_scheduler import close_reminder_scheduler, get_reminder_scheduler
+from src.state.user_states import ResearcherStates, RespondentStates
+from src.utils.config import get_config
 
 load_dotenv()
 
@@ -25,14 +38,18 @@ class MockSupabaseService:
     def __init__(self):
         logger.info("Mock Supabase service initialized (disabled for testing)")
     
-    def create_interview(self, fields): return {"id": "mock_interview_id"}
-    def update_interview(self, interview_id, data): return {"id": interview_id}
-    def get_interview(self, interview_id): return {"id": interview_id}
-    def create_session(self, user_id, session_type, interview_id=None): return {"id": "mock_session_id"}
-    def update_session(self, session_id, state_update): return {"id": session_id}
-    def get_active_session(self, user_id): return {"id": "mock_session_id"}
-    def save_answer(self, interview_id, user_id, question, answer): return {"id": "mock_answer_id"}
-    def get_interview_answers(self, interview_id): return []
+    async def create_interview(self, fields): return {"id": "mock_interview_id"}
+    async def update_interview(self, interview_id, data): return {"id": interview_id}
+    async def get_interview(self, interview_id): return {"id": interview_id}
+    async def create_session(self, user_id, session_type, interview_id=None): return {"id": "mock_session_id"}
+    async def update_session(self, session_id, state_update): return {"id": session_id}
+    async def buffer_answer(self, session_id, row): pass
+    async def flush_answers(self, session_id=None): pass
+    async def get_active_session(self, user_id): return {"id": "mock_session_id"}
+    async def save_answer(self, interview_id, user_id, question, answer): return {"id": "mock_answer_id"}
+    async def save_answers(self, rows): pass
+    async def get_interview_answers(self, interview_id, limit=500, after_created_at=None, after_id=None): return []
+    async def close(self): pass
 
 class MockZepService:
     def __init__(self):
@@ -44,11 +61,21 @@ class MockZepService:
     async def search_memory(self, session_id, query, limit=5): return []
     async def get_session(self, session_id): return {"session_id": session_id}
     async def update_session_metadata(self, session_id, metadata): pass
+    async def flush(self, session_id=None): pass
+    async def close(self): pass
 
 async def main() -> None:
     # Configure logging
     logging.basicConfig(level=logging.INFO)
     
+    # Compile prompt templates once, before the first update arrives
+    load_prompts()
+    
+    config = get_config()
+    configure_audio_pool(config.audio_workers)
+    # Loads the local Whisper model up front when TRANSCRIPTION_BACKEND=local
+    await get_transcription_service().backend.warmup()
+    
     # Условная инициализация сервисов
     supabase_url = getenv("SUPABASE_URL")
     supabase_key = getenv("SUPABASE_KEY") 
@@ -56,8 +83,15 @@ async def main() -> None:
     
     if supabase_url and supabase_key:
         try:
-            from src.services.supabase_service import SupabaseService
-            supabase_service = SupabaseService()
+            from src.services.supabase_service import AsyncSupabaseService
+            supabase_service = AsyncSupabaseService(
+                max_workers=config.supabase_max_workers,
+                answer_flush_interval=config.answer_flush_interval,
+                answer_flush_max_answers=config.answer_flush_max_answers,
+                answer_flush_max_bytes=config.answer_flush_max_bytes,
+                interview_cache_ttl=config.interview_cache_ttl,
+                interview_cache_max_size=config.interview_cache_max_size
+            )
             logger.info("✅ Real Supabase service initialized")
         except Exception as e:
             logger.warning(f"⚠️ Supabase failed, using mock: {e}")
@@ -69,7 +103,15 @@ async def main() -> None:
     if zep_api_key:
         try:
             from src.services.zep_service import ZepService
-            zep_service = ZepService()
+            zep_service = ZepService(
+                flush_interval=config.zep_flush_interval,
+                max_queue_size=config.zep_max_queue_size,
+                max_batch_size=config.zep_max_batch_size,
+                max_retries=config.zep_max_retries,
+                enqueue_timeout=config.zep_enqueue_timeout,
+                window_size=config.zep_window_size,
+                window_idle_ttl=config.zep_window_idle_ttl
+            )
             logger.info("✅ Real Zep service initialized")
         except Exception as e:
             logger.warning(f"⚠️ Zep failed, using mock: {e}")
@@ -78,28 +120,115 @@ async def main() -> None:
         logger.warning("🚧 ZEP_API_KEY not set, using mock service")
         zep_service = MockZepService()
     
-    # Initialize Bot instance
+    # Initialize Bot instance (optionally against a self-hosted Bot API server)
+    session = None
+    if config.telegram_api_server:
+        session = AiohttpSession(
+            api=TelegramAPIServer.from_base(config.telegram_api_server, is_local=config.telegram_api_local)
+        )
+        logger.info(f"Using Telegram Bot API server: {config.telegram_api_server}")
     bot = Bot(
         token=TOKEN,
+        session=session,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
     
+    # All outgoing messages go through per-chat and global rate limits
+    send_scheduler = SendScheduler(
+        global_rate=config.send_global_rate,
+        chat_rate=config.send_chat_rate,
+        chat_burst=config.send_chat_burst,
+        group_rate=config.send_group_rate,
+        max_retries=config.send_max_retries,
+        priority_aging=config.send_priority_aging
+    )
+    bot.session.middleware(send_scheduler)
+    
     # Initialize Dispatcher
-    dp = Dispatcher()
+    dp = Dispatcher(storage=create_fsm_storage(config))
     
     # Store services in dispatcher data
     dp["supabase"] = supabase_service
     dp["zep"] = zep_service
     
     # Register middlewares
+    # Messages of one chat are handled in order; quick bursts of answers are merged
+    dp.message.outer_middleware(ChatSerializationMiddleware(
+        debounce_window=config.message_debounce_window,
+        debounce_states=[ResearcherStates.collecting_info.state, RespondentStates.answering.state]
+    ))
     dp.message.middleware(LoggingMiddleware())
     
     # Include routers
     dp.include_router(router)
     
-    # Start polling
-    logger.info("🤖 Bot starting...")
-    await dp.start_polling(bot)
+    # Inactivity reminders: one delivery loop for all respondents (leader replica only)
+    async def deliver_reminder(key, payload):
+        agent = get_respondent_agent(supabase_service, zep_service)
+        await agent.send_scheduled_reminder(bot, dp.storage, payload)
+    
+    get_reminder_scheduler().start(deliver_reminder)
+    
+    # Researcher digests (RESEARCHER_NOTIFICATIONS=digest)
+    get_digest_service().start(bot)
+    
+    try:
+        if config.bot_delivery_mode.lower() == "webhook":
+            await run_webhook(dp, bot, config)
+        else:
+            # Start polling
+            logger.info("🤖 Bot starting...")
+            # getUpdates is rejected while a webhook is set (e.g. after running in webhook mode)
+            await bot.delete_webhook()
+            await dp.start_polling(bot)
+    finally:
+        await close_reminder_scheduler()
+        await close_digest_service()
+        await send_scheduler.close()
+        await dp.storage.close()
+        await supabase_service.close()
+        await zep_service.close()
+        await close_transcription_service()
+        await close_llm_clients()
+        await close_http_session()
+        shutdown_audio_pool()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot, config) -> None:
+    """Serve Telegram updates via webhook from the same server as the n8n API"""
+    import uvicorn
+    from src.api.app import app
+    from src.bot.webhook import UpdateFeeder, create_webhook_router
+    
+    if not config.webhook_base_url:
+        raise ValueError("WEBHOOK_BASE_URL must be set for BOT_DELIVERY_MODE=webhook")
+    if not config.webhook_secret:
+        logger.warning("⚠️ WEBHOOK_SECRET not set, webhook requests are not authenticated")
+    
+    feeder = UpdateFeeder(dp, bot, max_concurrency=config.webhook_max_concurrency)
+    app.include_router(create_webhook_router(feeder, config.webhook_path, config.webhook_secret))
+    
+    # Dispatcher startup/shutdown hooks normally run by start_polling
+    await dp.emit_startup(bot=bot, dispatcher=dp, **dp.workflow_data)
+    
+    webhook_url = config.webhook_base_url.rstrip("/") + config.webhook_path
+    await bot.set_webhook(
+        webhook_url,
+        secret_token=config.webhook_secret,
+        allowed_updates=dp.resolve_used_update_types(),
+        max_connections=min(100, config.webhook_max_concurrency),
+    )
+    
+    port = int(getenv("PORT") or config.api_port)
+    server = uvicorn.Server(uvicorn.Config(app, host=config.api_host, port=port, log_level="info"))
+    logger.info(f"🤖 Bot starting in webhook mode: {webhook_url} (listening on {config.api_host}:{port})")
+    try:
+        await server.serve()
+    finally:
+        await feeder.drain()
+        await dp.emit_shutdown(bot=bot, dispatcher=dp, **dp.workflow_data)
+        await bot.session.close()
+        logger.info(f"Webhook stopped: {feeder.received} updates received, {feeder.failed} failed")
 
 if __name__ == "__main__":
     asyncio.run(main())
\ No newline at end of file
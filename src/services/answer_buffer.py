@@ -0,0 +1,169 @@
+"""Write-behind buffer for respondent answers.
+
+Answers are appended as rows (one per turn) and flushed in the background in bulk
+inserts: on an interval, when the pending data exceeds a size threshold, explicitly
+before an interview is completed, and on shutdown. Rows carry (session_id,
+turn_index), which is unique in the database, so retried flushes are idempotent.
+"""
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from loguru import logger
+
+FlushFunc = Callable[[List[Dict]], Awaitable[None]]
+
+
+class AnswerWriteBuffer:
+    """Накопитель ответов респондентов с отложенной пакетной записью в базу"""
+
+    def __init__(self, flush_func: FlushFunc, flush_interval: float = 2.0,
+                 max_pending_answers: int = 10, max_pending_bytes: int = 65536,
+                 max_batch_rows: int = 500):
+        """
+        Args:
+            flush_func: Coroutine that bulk-inserts answer rows
+            flush_interval: Seconds between background flushes
+            max_pending_answers: Flush once this many answers are pending
+            max_pending_bytes: Flush once pending answers exceed this size
+            max_batch_rows: Maximum rows per insert request
+        """
+        self._flush_func = flush_func
+        self.flush_interval = flush_interval
+        self.max_pending_answers = max_pending_answers
+        self.max_pending_bytes = max_pending_bytes
+        self.max_batch_rows = max_batch_rows
+
+        self._pending: Dict[str, List[Dict]] = {}
+        self._pending_bytes: Dict[str, int] = {}
+        # Flushes are serialized: once flush() returns, rows popped by an earlier
+        # concurrent flush are either written or back in the buffer
+        self._flush_lock = asyncio.Lock()
+        self._flusher: Optional[asyncio.Task] = None
+        # Threshold-triggered flushes; the loop keeps only weak references to tasks
+        self._flush_tasks: Set[asyncio.Task] = set()
+        self._closed = False
+
+        # Metrics
+        self.flushes = 0
+        self.flush_errors = 0
+        self.answers_written = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    @property
+    def pending_bytes(self) -> int:
+        return sum(self._pending_bytes.values())
+
+    @property
+    def pending_answers(self) -> int:
+        return sum(len(rows) for rows in self._pending.values())
+
+    def stats(self) -> Dict:
+        """Метрики буфера"""
+        return {
+            "pending_sessions": len(self._pending),
+            "pending_answers": self.pending_answers,
+            "pending_bytes": self.pending_bytes,
+            "flushes": self.flushes,
+            "flush_errors": self.flush_errors,
+            "answers_written": self.answers_written,
+            "last_flush_ms": round(self.last_flush_ms, 1),
+            "avg_flush_ms": round(self._total_flush_ms / self.flushes, 1) if self.flushes else 0.0,
+            "max_flush_ms": round(self.max_flush_ms, 1),
+        }
+
+    async def add(self, session_id: str, row: Dict) -> None:
+        """Добавить строку ответа в буфер; запись в базу произойдёт позже"""
+        if self._closed:
+            raise RuntimeError("Answer buffer is closed")
+        self._ensure_flusher()
+
+        self._pending.setdefault(session_id, []).append(row)
+        self._pending_bytes[session_id] = (
+            self._pending_bytes.get(session_id, 0)
+            + len(json.dumps(row, ensure_ascii=False, default=str).encode("utf-8"))
+        )
+
+        if (self.pending_answers >= self.max_pending_answers
+                or self.pending_bytes >= self.max_pending_bytes):
+            task = asyncio.create_task(self._safe_flush())
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
+
+    async def flush(self, session_id: Optional[str] = None) -> None:
+        """
+        Записать накопленные ответы в базу.
+
+        Args:
+            session_id: Flush only this session. None flushes every session
+
+        Raises:
+            Exception: Errors of the flush function; rows stay buffered for retry
+        """
+        async with self._flush_lock:
+            session_ids = [session_id] if session_id is not None else list(self._pending)
+            rows: List[Dict] = []
+            taken: Dict[str, tuple] = {}
+            for sid in session_ids:
+                session_rows = self._pending.pop(sid, None)
+                if session_rows:
+                    taken[sid] = (session_rows, self._pending_bytes.pop(sid, 0))
+                    rows.extend(session_rows)
+            if not rows:
+                return
+
+            started = time.perf_counter()
+            written = 0
+            try:
+                for i in range(0, len(rows), self.max_batch_rows):
+                    await self._flush_func(rows[i:i + self.max_batch_rows])
+                    written += len(rows[i:i + self.max_batch_rows])
+            except Exception:
+                self.flush_errors += 1
+                # Re-queue everything taken; duplicates of already written rows are ignored
+                for sid, (session_rows, session_bytes) in taken.items():
+                    self._pending[sid] = session_rows + self._pending.get(sid, [])
+                    self._pending_bytes[sid] = self._pending_bytes.get(sid, 0) + session_bytes
+                raise
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flushes += 1
+            self.answers_written += written
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            logger.debug(f"Flushed {written} answers for {len(taken)} sessions in {elapsed_ms:.1f} ms")
+
+    async def close(self) -> None:
+        """Остановить фоновую запись и сбросить всё, что накоплено"""
+        self._closed = True
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        if self._flush_tasks:
+            await asyncio.gather(*self._flush_tasks)
+        await self._safe_flush()
+        logger.info(f"Answer buffer closed: {self.stats()}")
+
+    def _ensure_flusher(self) -> None:
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._safe_flush()
+
+    async def _safe_flush(self) -> None:
+        try:
+            await self.flush()
+        except Exception as e:
+            # Rows are kept in the buffer and retried on the next flush
+            logger.error(f"Background flush of answers failed: {e}")
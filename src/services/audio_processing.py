@@ -0,0 +1,232 @@
+"""
+CPU-bound audio processing for the voice pipeline.
+
+Audio never touches the disk: data is passed to ffmpeg through stdin/stdout pipes.
+Before upload, voice notes are pre-processed: leading/trailing silence is trimmed,
+the signal is downmixed to mono, resampled to 16 kHz (what Whisper works with
+internally) and re-encoded as low-bitrate Opus.
+Transcoding runs in a bounded process pool, so decoding and encoding do not block
+the event loop and every other chat. Worker functions are module-level so they
+can be pickled into pool processes.
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import re
+import shutil
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Форматы, которые OpenAI Whisper API принимает без конвертации
+WHISPER_ACCEPTED_FORMATS = {"flac", "m4a", "mp3", "mp4", "mpeg", "mpga", "oga", "ogg", "wav", "webm"}
+
+FFMPEG_TIMEOUT = 120  # seconds per ffmpeg invocation
+
+TARGET_SAMPLE_RATE = 16000
+
+_SILENCE_START_RE = re.compile(r"silence_start: (-?[\d.]+)")
+_SILENCE_END_RE = re.compile(r"silence_end: (-?[\d.]+)")
+
+_executor: Optional[ProcessPoolExecutor] = None
+_max_workers = 2
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def detect_audio_format(data: bytes) -> Optional[str]:
+    """Определяет формат аудио по сигнатуре файла"""
+    if data.startswith(b"OggS"):
+        return "ogg"
+    if data.startswith(b"ID3") or data[:2] in (b"\xff\xfb", b"\xff\xf3", b"\xff\xf2"):
+        return "mp3"
+    if data.startswith(b"RIFF") and data[8:12] == b"WAVE":
+        return "wav"
+    if data.startswith(b"fLaC"):
+        return "flac"
+    if data[4:8] == b"ftyp":
+        return "m4a"
+    if data.startswith(b"\x1a\x45\xdf\xa3"):
+        return "webm"
+    return None
+
+
+def transcode(data: bytes, target_format: str = "mp3", bitrate: str = "64k") -> bytes:
+    """
+    Перекодирует аудио через ffmpeg в памяти (выполняется в процессе пула).
+
+    Raises:
+        RuntimeError: If ffmpeg fails
+    """
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-vn", "-b:a", bitrate,
+        "-f", target_format, "pipe:1",
+    ]
+    proc = subprocess.run(command, input=data, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode(errors='ignore').strip()}")
+    return proc.stdout
+
+
+def detect_silences(data: bytes, noise: str = "-35dB", min_silence: float = 0.5) -> List[Tuple[float, float]]:
+    """
+    Находит паузы в аудио фильтром ffmpeg silencedetect (выполняется в процессе пула).
+
+    Returns:
+        List of (start, end) seconds of silent intervals
+    """
+    command = [
+        "ffmpeg", "-hide_banner", "-nostats",
+        "-i", "pipe:0",
+        "-af", f"silencedetect=noise={noise}:d={min_silence}",
+        "-f", "null", "-",
+    ]
+    proc = subprocess.run(command, input=data, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode(errors='ignore').strip()[-500:]}")
+
+    silences = []
+    start = None
+    for line in proc.stderr.decode(errors="ignore").splitlines():
+        match = _SILENCE_START_RE.search(line)
+        if match:
+            start = max(0.0, float(match.group(1)))
+            continue
+        match = _SILENCE_END_RE.search(line)
+        if match and start is not None:
+            silences.append((start, float(match.group(1))))
+            start = None
+    return silences
+
+
+def plan_chunks(duration: float, silences: List[Tuple[float, float]],
+                target_seconds: float = 60.0, max_seconds: float = 90.0) -> List[Tuple[float, float]]:
+    """
+    Разбивает аудио на куски, разрезая по середине пауз.
+
+    A cut is placed at the silence closest to target_seconds after the previous cut;
+    if there is no silence before max_seconds the chunk is cut hard at max_seconds.
+
+    Returns:
+        Ordered list of (start, end) seconds covering the whole duration
+    """
+    cut_points = [(start + end) / 2 for start, end in silences]
+    chunks = []
+    chunk_start = 0.0
+    while duration - chunk_start > max_seconds:
+        candidates = [p for p in cut_points if chunk_start < p <= chunk_start + max_seconds]
+        if candidates:
+            cut = min(candidates, key=lambda p: abs(p - (chunk_start + target_seconds)))
+        else:
+            cut = chunk_start + max_seconds
+        chunks.append((chunk_start, cut))
+        chunk_start = cut
+    chunks.append((chunk_start, duration))
+    return chunks
+
+
+def _compact_encode_args(bitrate: str) -> List[str]:
+    """Аргументы ffmpeg для компактного кодирования речи: mono, 16 kHz, Opus в OGG"""
+    return [
+        "-vn", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE),
+        "-c:a", "libopus", "-b:a", bitrate, "-application", "voip",
+        "-f", "ogg", "pipe:1",
+    ]
+
+
+def preprocess(data: bytes, bitrate: str = "24k", silence_threshold: str = "-40dB",
+               trim_silence: bool = True) -> Tuple[bytes, float]:
+    """
+    Подготавливает голосовое к загрузке (выполняется в процессе пула).
+
+    Decodes to 16 kHz mono PCM with leading and trailing silence removed, then
+    encodes it as compact Opus. Decoding to PCM first gives the exact duration
+    of the trimmed audio.
+
+    Returns:
+        Tuple of (OGG/Opus bytes, duration in seconds after trimming)
+
+    Raises:
+        RuntimeError: If ffmpeg fails
+    """
+    filters = []
+    if trim_silence:
+        trim = f"silenceremove=start_periods=1:start_threshold={silence_threshold}:start_silence=0.2"
+        # Trailing silence: trim the start of the reversed signal
+        filters = [trim, "areverse", trim, "areverse"]
+
+    decode = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0", "-vn",
+    ]
+    if filters:
+        decode += ["-af", ",".join(filters)]
+    decode += ["-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "-f", "s16le", "pipe:1"]
+    proc = subprocess.run(decode, input=data, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode(errors='ignore').strip()}")
+    pcm = proc.stdout
+    if not pcm:
+        raise RuntimeError("No audio left after silence trimming")
+    duration = len(pcm) / (2 * TARGET_SAMPLE_RATE)
+
+    encode = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-f", "s16le", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "-i", "pipe:0",
+    ] + _compact_encode_args(bitrate)
+    proc = subprocess.run(encode, input=pcm, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode(errors='ignore').strip()}")
+    return proc.stdout, duration
+
+
+def extract_chunk(data: bytes, start: float, end: float, bitrate: str = "24k") -> bytes:
+    """Вырезает фрагмент [start, end) и кодирует его в OGG/Opus (выполняется в процессе пула)"""
+    command = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-ss", f"{start:.3f}", "-t", f"{end - start:.3f}",
+    ] + _compact_encode_args(bitrate)
+    proc = subprocess.run(command, input=data, capture_output=True, timeout=FFMPEG_TIMEOUT)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {proc.stderr.decode(errors='ignore').strip()}")
+    return proc.stdout
+
+
+def configure_audio_pool(max_workers: int) -> None:
+    """Задаёт размер пула процессов (до первого использования)"""
+    global _max_workers
+    _max_workers = max_workers
+
+
+def get_audio_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: the bot process has threads (DB pool), forking it is unsafe
+        _executor = ProcessPoolExecutor(
+            max_workers=_max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+        logger.info(f"Audio process pool started (max_workers={_max_workers})")
+    return _executor
+
+
+async def run_in_audio_pool(func: Callable[..., Any], *args) -> Any:
+    """Выполняет функцию обработки аудио в пуле процессов"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_audio_executor(), func, *args)
+
+
+def shutdown_audio_pool() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+        logger.info("Audio process pool stopped")
@@ -0,0 +1,258 @@
+"""Batched researcher digests.
+
+With RESEARCHER_NOTIFICATIONS=digest, completed interviews and interim progress
+are not sent to the researcher one message each. They are collected per
+(researcher, interview) and, once the window has passed since the first event,
+sent as one compact message: how many respondents finished, how many are in
+progress, and the most frequent themes of the summaries. The per-respondent
+summaries stay available behind an inline button for a while (see
+get_details()); they are also stored with the sessions in the database.
+A digest that fails to send goes back into the queue and is retried with
+growing delays.
+"""
+import asyncio
+import html
+import re
+import time
+import uuid
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from aiogram import Bot, types
+from loguru import logger
+
+from src.bot.send_scheduler import SendPriority, send_priority
+from src.services.cache import TTLCache
+from src.utils.config import get_config
+
+DIGEST_CALLBACK_PREFIX = "digest:"
+
+_WORD_RE = re.compile(r"[a-zA-Zа-яА-ЯёЁ-]{5,}")
+_STOPWORDS = {
+    "который", "которые", "которая", "которое", "потому", "также", "чтобы", "этого",
+    "более", "очень", "может", "могут", "нужно", "своих", "своей", "своего", "такие",
+    "респондент", "респондента", "респонденту", "интервью", "ответы", "ответов",
+    "отмечает", "считает", "говорит", "хочет", "использует", "основные", "проблемы",
+    "which", "their", "about", "would", "there",
+}
+
+
+@dataclass
+class _Completion:
+    username: str
+    summary: str
+    session_id: str = ""
+
+
+@dataclass
+class _PendingDigest:
+    researcher_id: int
+    interview_id: str
+    title: str
+    opened_at: float = field(default_factory=time.monotonic)
+    completions: List[_Completion] = field(default_factory=list)
+    # session_id -> answers count of the latest interim report
+    in_progress: Dict[str, int] = field(default_factory=dict)
+    # Failed sends are retried later instead of being dropped
+    attempts: int = 0
+    retry_at: float = 0.0
+
+
+def top_themes(summaries: List[str], limit: int = 5) -> List[str]:
+    """Самые частые содержательные слова в резюме (без вызова LLM)"""
+    counter: Counter = Counter()
+    for summary in summaries:
+        words = {w.lower().strip("-") for w in _WORD_RE.findall(summary)}
+        counter.update(w for w in words if w not in _STOPWORDS)
+    return [word for word, count in counter.most_common(limit) if count > 1]
+
+
+class DigestService:
+    """Накопление уведомлений исследователю и отправка сводкой раз в окно"""
+
+    def __init__(self, window: float = 600.0, details_ttl: float = 7 * 86400, details_max_size: int = 1000,
+                 max_attempts: int = 5, retry_delay: float = 60.0):
+        """
+        Args:
+            window: Seconds between the first event of a digest and its sending
+            details_ttl: How long per-respondent summaries stay available
+            details_max_size: Maximum number of digests with available details
+            max_attempts: Send attempts before a digest is given up
+            retry_delay: Seconds before the first retry; doubles with each attempt
+        """
+        self.window = window
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self._pending: Dict[Tuple[int, str], _PendingDigest] = {}
+        self._details: TTLCache[Tuple[int, List[_Completion]]] = TTLCache(
+            maxsize=details_max_size, ttl=details_ttl
+        )
+        self._bot: Optional[Bot] = None
+        self._flusher: Optional[asyncio.Task] = None
+
+        # Metrics
+        self.events = 0
+        self.digests_sent = 0
+
+    def start(self, bot: Bot) -> None:
+        self._bot = bot
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+
+    def _digest(self, researcher_id: int, interview_id: str, title: str) -> _PendingDigest:
+        key = (researcher_id, interview_id)
+        digest = self._pending.get(key)
+        if digest is None:
+            digest = self._pending[key] = _PendingDigest(researcher_id, interview_id, title)
+        self.events += 1
+        return digest
+
+    def add_completion(self, researcher_id: int, interview_id: str, title: str,
+                       session_id: str, username: Optional[str], summary: str) -> None:
+        """Учесть завершённое интервью"""
+        digest = self._digest(researcher_id, interview_id, title)
+        digest.in_progress.pop(session_id, None)
+        digest.completions.append(_Completion(username or "anonymous", summary, session_id))
+
+    def add_progress(self, researcher_id: int, interview_id: str, title: str,
+                     session_id: str, answers_count: int) -> None:
+        """Учесть промежуточный прогресс респондента"""
+        digest = self._digest(researcher_id, interview_id, title)
+        digest.in_progress[session_id] = answers_count
+
+    def get_details(self, digest_id: str, researcher_id: int) -> Optional[List[str]]:
+        """Резюме по респондентам для кнопки под дайджестом (только его получателю)"""
+        entry = self._details.get(digest_id)
+        if entry is None or entry[0] != researcher_id:
+            return None
+        return [
+            f"<b>@{html.escape(completion.username)}</b>\n{html.escape(completion.summary)}"
+            for completion in entry[1]
+        ]
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(min(5.0, max(self.window / 4, 0.5)))
+            now = time.monotonic()
+            due = [
+                key for key, digest in self._pending.items()
+                if now - digest.opened_at >= self.window and now >= digest.retry_at
+            ]
+            for key in due:
+                await self._send(self._pending.pop(key))
+
+    async def flush(self) -> None:
+        """Отправить все накопленные сводки сейчас (неотправленные остаются в очереди)"""
+        for key in list(self._pending):
+            digest = self._pending.pop(key, None)
+            if digest is not None:
+                await self._send(digest)
+
+    def _requeue(self, digest: _PendingDigest) -> None:
+        """Вернуть неотправленную сводку в очередь (с паузой перед повтором)"""
+        digest.attempts += 1
+        if digest.attempts >= self.max_attempts:
+            logger.error(
+                f"Digest for researcher {digest.researcher_id} dropped after {digest.attempts} attempts: "
+                f"{len(digest.completions)} completed, {len(digest.in_progress)} in progress"
+            )
+            return
+        digest.retry_at = time.monotonic() + self.retry_delay * 2 ** (digest.attempts - 1)
+        self._restore(digest)
+
+    def _restore(self, digest: _PendingDigest) -> None:
+        # Events that arrived while sending opened a newer digest: merge them in
+        key = (digest.researcher_id, digest.interview_id)
+        newer = self._pending.get(key)
+        if newer is not None:
+            digest.completions.extend(newer.completions)
+            digest.in_progress.update(newer.in_progress)
+            for completion in newer.completions:
+                digest.in_progress.pop(completion.session_id, None)
+        self._pending[key] = digest
+
+    def _format(self, digest: _PendingDigest) -> str:
+        lines = [f"📊 <b>Сводка по исследованию</b> {html.escape(digest.title)}".rstrip(), ""]
+        if digest.completions:
+            lines.append(f"✅ Завершили интервью: <b>{len(digest.completions)}</b>")
+        if digest.in_progress:
+            lines.append(
+                f"⏳ В процессе: <b>{len(digest.in_progress)}</b> "
+                f"(до {max(digest.in_progress.values())} ответов)"
+            )
+        themes = top_themes([c.summary for c in digest.completions])
+        if themes:
+            lines += ["", "<b>Частые темы:</b> " + html.escape(", ".join(themes))]
+        return "\n".join(lines)
+
+    async def _send(self, digest: _PendingDigest) -> None:
+        if self._bot is None:
+            logger.error("Digest service is not started, digest dropped")
+            return
+
+        reply_markup = None
+        digest_id = None
+        if digest.completions:
+            digest_id = uuid.uuid4().hex[:12]
+            self._details.set(digest_id, (digest.researcher_id, digest.completions))
+            reply_markup = types.InlineKeyboardMarkup(inline_keyboard=[[
+                types.InlineKeyboardButton(
+                    text=f"📄 Резюме респондентов ({len(digest.completions)})",
+                    callback_data=f"{DIGEST_CALLBACK_PREFIX}{digest_id}",
+                )
+            ]])
+
+        try:
+            with send_priority(SendPriority.DIGEST):
+                await self._bot.send_message(
+                    digest.researcher_id, self._format(digest), parse_mode="HTML", reply_markup=reply_markup
+                )
+            self.digests_sent += 1
+            logger.info(
+                f"Digest sent to researcher {digest.researcher_id}: "
+                f"{len(digest.completions)} completed, {len(digest.in_progress)} in progress"
+            )
+        except asyncio.CancelledError:
+            self._restore(digest)
+            raise
+        except Exception as e:
+            logger.error(f"Failed to send digest to researcher {digest.researcher_id}, will retry: {e}")
+            if digest_id:
+                self._details.invalidate(digest_id)
+            self._requeue(digest)
+
+    async def close(self) -> None:
+        if self._flusher:
+            self._flusher.cancel()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._flusher = None
+        await self.flush()
+        if self._pending:
+            logger.error(f"{len(self._pending)} digests could not be sent before shutdown")
+        logger.info(f"Digest service stopped: {self.events} events, {self.digests_sent} digests sent")
+
+
+_service: Optional[DigestService] = None
+
+
+def digest_mode_enabled() -> bool:
+    return get_config().researcher_notifications.lower() == "digest"
+
+
+def get_digest_service() -> DigestService:
+    """Возвращает общий сервис сводок процесса"""
+    global _service
+    if _service is None:
+        _service = DigestService(window=get_config().researcher_digest_window)
+    return _service
+
+
+async def close_digest_service() -> None:
+    global _service
+    if _service is not None:
+        await _service.close()
+    _service = None
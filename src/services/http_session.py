@@ -0,0 +1,29 @@
+"""Long-lived shared aiohttp session with keep-alive and DNS caching."""
+from typing import Optional
+
+import aiohttp
+from loguru import logger
+
+_session: Optional[aiohttp.ClientSession] = None
+
+
+def get_http_session() -> aiohttp.ClientSession:
+    """Возвращает общую HTTP-сессию процесса (создаётся при первом вызове)"""
+    global _session
+    if _session is None or _session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=100,
+            ttl_dns_cache=300,
+            keepalive_timeout=60,
+        )
+        _session = aiohttp.ClientSession(connector=connector)
+        logger.info("Shared HTTP session created")
+    return _session
+
+
+async def close_http_session() -> None:
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+        logger.info("Shared HTTP session closed")
+    _session = None
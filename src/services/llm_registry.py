@@ -0,0 +1,110 @@
+"""Process-wide registry of shared LLM clients.
+
+All agents and API endpoints get their ChatOpenAI instances from here instead of
+constructing one per dialog. Clients are keyed by (model, temperature, max_tokens)
+and share a single connection-pooled httpx.AsyncClient, so concurrent interviews
+reuse a few warm keep-alive connections to OpenAI. The raw AsyncOpenAI client used
+for audio transcription rides on the same pool.
+"""
+from typing import Dict, Optional, Tuple
+
+import httpx
+from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI
+from loguru import logger
+
+from src.utils.config import Config, get_config
+
+_LLMKey = Tuple[str, float, Optional[int]]
+
+_config: Optional[Config] = None
+_http_async_client: Optional[httpx.AsyncClient] = None
+_llm_clients: Dict[_LLMKey, ChatOpenAI] = {}
+_openai_client: Optional[AsyncOpenAI] = None
+
+
+def _get_config() -> Config:
+    global _config
+    if _config is None:
+        _config = get_config()
+    return _config
+
+
+def get_http_async_client() -> httpx.AsyncClient:
+    """Возвращает общий HTTP-клиент с пулом соединений для запросов к OpenAI"""
+    global _http_async_client
+    if _http_async_client is None or _http_async_client.is_closed:
+        config = _get_config()
+        _http_async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=config.llm_max_connections,
+                max_keepalive_connections=config.llm_max_keepalive_connections,
+                keepalive_expiry=config.llm_keepalive_expiry,
+            ),
+            timeout=httpx.Timeout(config.llm_timeout),
+        )
+        logger.info(
+            f"Shared OpenAI HTTP pool created "
+            f"(max_connections={config.llm_max_connections}, "
+            f"keepalive={config.llm_max_keepalive_connections})"
+        )
+    return _http_async_client
+
+
+def get_llm(
+    model: Optional[str] = None,
+    temperature: Optional[float] = None,
+    max_tokens: Optional[int] = None,
+) -> ChatOpenAI:
+    """
+    Возвращает общий экземпляр ChatOpenAI для указанных параметров.
+
+    Args:
+        model: Model name. Defaults to Config.langchain_model
+        temperature: Sampling temperature. Defaults to Config.langchain_temperature
+        max_tokens: Completion token limit. None means no explicit limit
+
+    Returns:
+        Shared ChatOpenAI instance
+    """
+    config = _get_config()
+    key = (
+        model or config.langchain_model,
+        config.langchain_temperature if temperature is None else temperature,
+        max_tokens,
+    )
+
+    llm = _llm_clients.get(key)
+    if llm is None:
+        llm = ChatOpenAI(
+            model_name=key[0],
+            temperature=key[1],
+            max_tokens=key[2],
+            max_retries=config.llm_max_retries,
+            http_async_client=get_http_async_client(),
+        )
+        _llm_clients[key] = llm
+        logger.info(f"LLM client registered: model={key[0]}, temperature={key[1]}, max_tokens={key[2]}")
+    return llm
+
+
+def get_openai_client() -> AsyncOpenAI:
+    """Возвращает общий AsyncOpenAI-клиент (Whisper и прочие прямые вызовы API)"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = AsyncOpenAI(
+            max_retries=_get_config().llm_max_retries,
+            http_client=get_http_async_client(),
+        )
+    return _openai_client
+
+
+async def close_llm_clients() -> None:
+    """Закрывает общий HTTP-пул (вызывается при остановке процесса)"""
+    global _http_async_client, _openai_client
+    _llm_clients.clear()
+    _openai_client = None
+    if _http_async_client is not None and not _http_async_client.is_closed:
+        await _http_async_client.aclose()
+        logger.info("Shared OpenAI HTTP pool closed")
+    _http_async_client = None
@@ -0,0 +1,94 @@
+"""In-memory registry of compiled prompt templates.
+
+All files from src/prompts/*.txt are read and compiled into PromptTemplate objects
+once, then served from memory. Paths are resolved relative to this package, so the
+bot works no matter which directory it is launched from. With hot reload enabled a
+template is recompiled when its file's mtime changes.
+"""
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from langchain.prompts import PromptTemplate
+from loguru import logger
+
+from src.utils.config import get_config
+
+PROMPTS_DIR = Path(__file__).resolve().parent.parent / "prompts"
+
+
+class PromptRegistry:
+    """Кэш скомпилированных шаблонов промптов"""
+
+    def __init__(self, prompts_dir: Path = PROMPTS_DIR, hot_reload: bool = False,
+                 reload_interval: float = 2.0):
+        self.prompts_dir = Path(prompts_dir)
+        self.hot_reload = hot_reload
+        self.reload_interval = reload_interval
+        # name -> (template, mtime, last mtime check)
+        self._templates: Dict[str, Tuple[PromptTemplate, float, float]] = {}
+
+    def _compile(self, name: str) -> PromptTemplate:
+        path = self.prompts_dir / f"{name}.txt"
+        mtime = path.stat().st_mtime
+        template = PromptTemplate.from_template(path.read_text(encoding="utf-8"))
+        self._templates[name] = (template, mtime, time.monotonic())
+        return template
+
+    def load_all(self) -> int:
+        """Загружает и компилирует все промпты из каталога"""
+        for path in sorted(self.prompts_dir.glob("*.txt")):
+            self._compile(path.stem)
+        logger.info(f"Loaded {len(self._templates)} prompt templates from {self.prompts_dir}")
+        return len(self._templates)
+
+    def get(self, name: str) -> PromptTemplate:
+        """
+        Возвращает скомпилированный шаблон по имени файла без расширения.
+
+        Raises:
+            FileNotFoundError: If src/prompts/<name>.txt does not exist
+        """
+        cached = self._templates.get(name)
+        if cached is None:
+            return self._compile(name)
+
+        template, mtime, checked_at = cached
+        if self.hot_reload:
+            now = time.monotonic()
+            if now - checked_at >= self.reload_interval:
+                try:
+                    current_mtime = os.stat(self.prompts_dir / f"{name}.txt").st_mtime
+                except OSError as e:
+                    logger.warning(f"Cannot stat prompt {name}, keeping cached version: {e}")
+                    current_mtime = mtime
+                if current_mtime != mtime:
+                    logger.info(f"Prompt {name} changed on disk, reloading")
+                    return self._compile(name)
+                self._templates[name] = (template, mtime, now)
+        return template
+
+
+_registry: Optional[PromptRegistry] = None
+
+
+def get_prompt_registry() -> PromptRegistry:
+    global _registry
+    if _registry is None:
+        config = get_config()
+        _registry = PromptRegistry(
+            hot_reload=config.prompts_hot_reload,
+            reload_interval=config.prompts_reload_interval,
+        )
+    return _registry
+
+
+def load_prompts() -> int:
+    """Предзагружает все промпты (вызывается при старте процесса)"""
+    return get_prompt_registry().load_all()
+
+
+def get_prompt(name: str) -> PromptTemplate:
+    """Возвращает скомпилированный промпт src/prompts/<name>.txt"""
+    return get_prompt_registry().get(name)
@@ -0,0 +1,452 @@
+"""Centralized scheduler for delayed reminders.
+
+Instead of one sleeping task per respondent, reminders are rows in a due-time
+index and a single loop delivers whatever is due:
+- memory: binary heap with lazy deletion (single replica, lost on restart)
+- sqlite: table with an index on due_at (survives restarts; the leader lock
+  lives in the database file, so it only coordinates processes on one host)
+- redis: sorted set scored by due time (survives restarts, shared by replicas)
+
+REMINDER_STORE=auto (the default) follows FSM_STORAGE, so reminders persist
+whenever dialog state does.
+
+Scheduling a key again reschedules it and cancelling removes it, both in
+O(log n). Due reminders are claimed atomically, and only the replica holding
+the leader lock runs the delivery loop, so each reminder is sent exactly once.
+"""
+import asyncio
+import heapq
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from loguru import logger
+
+from src.utils.config import Config, get_config
+
+Payload = Dict[str, Any]
+ReminderHandler = Callable[[str, Payload], Awaitable[None]]
+
+
+class ReminderStore(ABC):
+    """Индекс напоминаний по времени срабатывания"""
+
+    @abstractmethod
+    async def upsert(self, key: str, due_at: float, payload: Payload) -> None:
+        """Schedule or reschedule the reminder with this key"""
+
+    @abstractmethod
+    async def remove(self, key: str) -> None:
+        """Cancel the reminder with this key, if any"""
+
+    @abstractmethod
+    async def pop_due(self, now: float, limit: int) -> List[Tuple[str, Payload]]:
+        """Atomically claim and remove up to limit reminders due at or before now"""
+
+    @abstractmethod
+    async def acquire_leadership(self, owner: str, ttl: float) -> bool:
+        """Take or renew the leader lock; True if owner holds it"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Number of pending reminders"""
+
+    async def release_leadership(self, owner: str) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+
+class MemoryReminderStore(ReminderStore):
+    """Куча в памяти процесса; отменённые записи удаляются лениво"""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, str]] = []
+        self._entries: Dict[str, Tuple[float, int, Payload]] = {}
+        self._seq = itertools.count()
+
+    async def upsert(self, key: str, due_at: float, payload: Payload) -> None:
+        seq = next(self._seq)
+        self._entries[key] = (due_at, seq, payload)
+        heapq.heappush(self._heap, (due_at, seq, key))
+        # Drop stale heap entries once they dominate
+        if len(self._heap) > 2 * len(self._entries) + 1024:
+            self._heap = [(due, s, k) for k, (due, s, _) in self._entries.items()]
+            heapq.heapify(self._heap)
+
+    async def remove(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+    async def pop_due(self, now: float, limit: int) -> List[Tuple[str, Payload]]:
+        due = []
+        while self._heap and self._heap[0][0] <= now and len(due) < limit:
+            _, seq, key = heapq.heappop(self._heap)
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] == seq:
+                del self._entries[key]
+                due.append((key, entry[2]))
+        return due
+
+    async def acquire_leadership(self, owner: str, ttl: float) -> bool:
+        return True
+
+    async def count(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteReminderStore(ReminderStore):
+    """
+    Напоминания в SQLite (WAL) с индексом по due_at.
+
+    The leader lock is a row in the same file: it coordinates processes that
+    share the file on one host, not replicas on different machines.
+    """
+
+    def __init__(self, path: str = "data/reminders.sqlite3"):
+        self.path = path
+        # sqlite3 connections are bound to one thread: all queries go through it
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="reminders-sqlite")
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(self.path, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS reminders ("
+                " key TEXT PRIMARY KEY,"
+                " due_at REAL NOT NULL,"
+                " payload TEXT NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS reminders_due_at ON reminders (due_at)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS scheduler_leader ("
+                " name TEXT PRIMARY KEY,"
+                " owner TEXT NOT NULL,"
+                " expires_at REAL NOT NULL)"
+            )
+            self._conn = conn
+            logger.info(f"SQLite reminder store opened: {self.path}")
+        return self._conn
+
+    async def _run(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    def _upsert(self, key: str, due_at: float, payload: str) -> None:
+        self._connect().execute(
+            "INSERT INTO reminders (key, due_at, payload) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET due_at = excluded.due_at, payload = excluded.payload",
+            (key, due_at, payload),
+        )
+
+    def _remove(self, key: str) -> None:
+        self._connect().execute("DELETE FROM reminders WHERE key = ?", (key,))
+
+    def _pop_due(self, now: float, limit: int) -> List[Tuple[str, Payload]]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                "SELECT key, payload FROM reminders WHERE due_at <= ? ORDER BY due_at LIMIT ?",
+                (now, limit),
+            ).fetchall()
+            conn.executemany("DELETE FROM reminders WHERE key = ?", [(key,) for key, _ in rows])
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return [(key, json.loads(payload)) for key, payload in rows]
+
+    def _acquire(self, owner: str, ttl: float) -> bool:
+        conn = self._connect()
+        now = time.time()
+        conn.execute(
+            "INSERT INTO scheduler_leader (name, owner, expires_at) VALUES ('reminders', ?, ?) "
+            "ON CONFLICT(name) DO UPDATE SET owner = excluded.owner, expires_at = excluded.expires_at "
+            "WHERE scheduler_leader.owner = excluded.owner OR scheduler_leader.expires_at < ?",
+            (owner, now + ttl, now),
+        )
+        row = conn.execute("SELECT owner FROM scheduler_leader WHERE name = 'reminders'").fetchone()
+        return row is not None and row[0] == owner
+
+    def _release(self, owner: str) -> None:
+        self._connect().execute(
+            "DELETE FROM scheduler_leader WHERE name = 'reminders' AND owner = ?", (owner,)
+        )
+
+    def _count(self) -> int:
+        return self._connect().execute("SELECT COUNT(*) FROM reminders").fetchone()[0]
+
+    async def upsert(self, key: str, due_at: float, payload: Payload) -> None:
+        await self._run(self._upsert, key, due_at, json.dumps(payload, separators=(",", ":")))
+
+    async def remove(self, key: str) -> None:
+        await self._run(self._remove, key)
+
+    async def pop_due(self, now: float, limit: int) -> List[Tuple[str, Payload]]:
+        return await self._run(self._pop_due, now, limit)
+
+    async def acquire_leadership(self, owner: str, ttl: float) -> bool:
+        return await self._run(self._acquire, owner, ttl)
+
+    async def release_leadership(self, owner: str) -> None:
+        await self._run(self._release, owner)
+
+    async def count(self) -> int:
+        return await self._run(self._count)
+
+    async def close(self) -> None:
+        if self._executor is None:
+            return
+        if self._conn is not None:
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=True)
+        self._executor = None
+
+
+# KEYS: due zset, payload hash; ARGV: now, limit
+_POP_DUE_LUA = """
+local keys = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+local result = {}
+for _, key in ipairs(keys) do
+    redis.call('ZREM', KEYS[1], key)
+    local payload = redis.call('HGET', KEYS[2], key)
+    redis.call('HDEL', KEYS[2], key)
+    table.insert(result, key)
+    table.insert(result, payload or '{}')
+end
+return result
+"""
+
+# KEYS: lock; ARGV: owner, ttl ms
+_ACQUIRE_LUA = """
+local current = redis.call('GET', KEYS[1])
+if not current then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+    return 1
+end
+if current == ARGV[1] then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+    return 1
+end
+return 0
+"""
+
+_RELEASE_LUA = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisReminderStore(ReminderStore):
+    """Напоминания в Redis: ZSET по времени срабатывания + HASH с данными"""
+
+    def __init__(self, url: str, prefix: str = "reminders"):
+        from redis.asyncio import Redis
+
+        self.redis = Redis.from_url(url, decode_responses=True)
+        self.due_key = f"{prefix}:due"
+        self.payload_key = f"{prefix}:payload"
+        self.lock_key = f"{prefix}:leader"
+        self._pop_due = self.redis.register_script(_POP_DUE_LUA)
+        self._acquire = self.redis.register_script(_ACQUIRE_LUA)
+        self._release = self.redis.register_script(_RELEASE_LUA)
+
+    async def upsert(self, key: str, due_at: float, payload: Payload) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self.payload_key, key, json.dumps(payload, separators=(",", ":")))
+            pipe.zadd(self.due_key, {key: due_at})
+            await pipe.execute()
+
+    async def remove(self, key: str) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.zrem(self.due_key, key)
+            pipe.hdel(self.payload_key, key)
+            await pipe.execute()
+
+    async def pop_due(self, now: float, limit: int) -> List[Tuple[str, Payload]]:
+        flat = await self._pop_due(keys=[self.due_key, self.payload_key], args=[now, limit])
+        return [(flat[i], json.loads(flat[i + 1])) for i in range(0, len(flat), 2)]
+
+    async def acquire_leadership(self, owner: str, ttl: float) -> bool:
+        return bool(await self._acquire(keys=[self.lock_key], args=[owner, int(ttl * 1000)]))
+
+    async def release_leadership(self, owner: str) -> None:
+        await self._release(keys=[self.lock_key], args=[owner])
+
+    async def count(self) -> int:
+        return await self.redis.zcard(self.due_key)
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+class ReminderScheduler:
+    """Один цикл доставки напоминаний для всех пользователей"""
+
+    def __init__(self, store: ReminderStore, poll_interval: float = 1.0,
+                 leader_ttl: float = 30.0, batch_size: int = 100,
+                 max_concurrent_deliveries: int = 20):
+        """
+        Args:
+            store: Due-time index
+            poll_interval: Seconds between checks for due reminders
+            leader_ttl: Leader lock lifetime; renewed every third of it
+            batch_size: Maximum reminders claimed per check
+            max_concurrent_deliveries: Reminders delivered at the same time
+        """
+        self.store = store
+        self.poll_interval = poll_interval
+        self.leader_ttl = leader_ttl
+        self.batch_size = batch_size
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.is_leader = False
+
+        self._handler: Optional[ReminderHandler] = None
+        self._loop_task: Optional[asyncio.Task] = None
+        self._deliveries: Set[asyncio.Task] = set()
+        self._semaphore = asyncio.Semaphore(max_concurrent_deliveries)
+
+        # Metrics
+        self.scheduled = 0
+        self.cancelled = 0
+        self.delivered = 0
+        self.failed = 0
+
+    async def schedule(self, key: str, delay: float, payload: Payload) -> None:
+        """Запланировать (или перенести) напоминание через delay секунд"""
+        await self.store.upsert(key, time.time() + delay, payload)
+        self.scheduled += 1
+
+    async def cancel(self, key: str) -> None:
+        await self.store.remove(key)
+        self.cancelled += 1
+
+    def start(self, handler: ReminderHandler) -> None:
+        """Запустить цикл доставки; handler(key, payload) отправляет напоминание"""
+        self._handler = handler
+        if self._loop_task is None or self._loop_task.done():
+            self._loop_task = asyncio.create_task(self._run())
+            logger.info(f"Reminder scheduler started ({type(self.store).__name__}, owner={self.owner})")
+            if isinstance(self.store, MemoryReminderStore):
+                logger.warning(
+                    "Reminders are kept in memory: pending ones are lost on restart, and with "
+                    "more than one replica each replica sends its own. Use REMINDER_STORE=redis "
+                    "for several replicas"
+                )
+
+    async def _run(self) -> None:
+        renew_at = 0.0
+        while True:
+            try:
+                now = time.time()
+                if now >= renew_at:
+                    was_leader = self.is_leader
+                    self.is_leader = await self.store.acquire_leadership(self.owner, self.leader_ttl)
+                    renew_at = now + self.leader_ttl / 3
+                    if self.is_leader != was_leader:
+                        logger.info(f"Reminder scheduler leadership {'acquired' if self.is_leader else 'lost'}")
+
+                if self.is_leader:
+                    for key, payload in await self.store.pop_due(now, self.batch_size):
+                        await self._semaphore.acquire()
+                        task = asyncio.create_task(self._deliver(key, payload))
+                        self._deliveries.add(task)
+                        task.add_done_callback(self._deliveries.discard)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Reminder scheduler iteration failed: {e}")
+            await asyncio.sleep(self.poll_interval)
+
+    async def _deliver(self, key: str, payload: Payload) -> None:
+        try:
+            await self._handler(key, payload)
+            self.delivered += 1
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Failed to deliver reminder {key}: {e}")
+        finally:
+            self._semaphore.release()
+
+    async def stats(self) -> Dict:
+        return {
+            "pending": await self.store.count(),
+            "scheduled": self.scheduled,
+            "cancelled": self.cancelled,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "in_flight": len(self._deliveries),
+            "is_leader": self.is_leader,
+        }
+
+    async def close(self) -> None:
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+        if self._deliveries:
+            await asyncio.wait(set(self._deliveries), timeout=10)
+        try:
+            logger.info(f"Reminder scheduler stopped: {await self.stats()}")
+            if self.is_leader:
+                await self.store.release_leadership(self.owner)
+        finally:
+            await self.store.close()
+
+
+def create_reminder_store(config: Config) -> ReminderStore:
+    """Создаёт хранилище напоминаний по настройке reminder_store (auto - как fsm_storage)"""
+    backend = config.reminder_store.lower()
+    if backend == "auto":
+        backend = config.fsm_storage.lower()
+    if backend == "memory":
+        return MemoryReminderStore()
+    if backend == "sqlite":
+        return SQLiteReminderStore(path=config.reminder_sqlite_path)
+    if backend == "redis":
+        if not config.redis_url:
+            raise ValueError("REDIS_URL must be set for REMINDER_STORE=redis")
+        return RedisReminderStore(config.redis_url)
+    raise ValueError(f"Unknown reminder store: {config.reminder_store}")
+
+
+_scheduler: Optional[ReminderScheduler] = None
+
+
+def get_reminder_scheduler() -> ReminderScheduler:
+    """Возвращает общий планировщик напоминаний процесса"""
+    global _scheduler
+    if _scheduler is None:
+        config = get_config()
+        _scheduler = ReminderScheduler(
+            create_reminder_store(config),
+            poll_interval=config.reminder_poll_interval,
+            leader_ttl=config.reminder_leader_ttl,
+        )
+    return _scheduler
+
+
+async def close_reminder_scheduler() -> None:
+    global _scheduler
+    if _scheduler is not None:
+        await _scheduler.close()
+    _scheduler = None
@@ -1,9 +1,16 @@
 import os
-from typing import Dict, List, Optional
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
 from uuid import UUID
 from supabase import create_client, Client
 from loguru import logger
 from postgrest.exceptions import APIError
+from postgrest.types import ReturnMethod
+
+from src.services.answer_buffer import AnswerWriteBuffer
+from src.services.cache import TTLCache
 
 class SupabaseService:
     def __init__(self):
@@ -13,6 +20,8 @@ class SupabaseService:
             raise ValueError("SUPABASE_URL and SUPABASE_KEY must be set")
         
         self.client: Client = create_client(url, key)
+        # Disabled automatically if merge_session_state() is missing in the database
+        self.session_merge_rpc = True
         logger.info("Supabase client initialized")
     
     def create_interview(self, fields: Dict) -> Optional[Dict]:
@@ -95,15 +104,48 @@ class SupabaseService:
             raise
     
     def update_session(self, session_id: str, state_update: Dict) -> Optional[Dict]:
+        """Merge state_update into the session state in one atomic round trip
+        
+        Uses the merge_session_state() database function (migration 003). Falls back
+        to read-modify-write if the function is not installed yet.
+        """
+        if self.session_merge_rpc:
+            try:
+                result = self.client.rpc("merge_session_state", {
+                    "p_session_id": session_id,
+                    "p_delta": state_update
+                }).execute()
+                if not result.data:
+                    logger.error(f"Session {session_id} not found")
+                    return None
+                return result.data[0]
+            except APIError as e:
+                # PGRST202: function not found in the schema cache
+                if e.code != "PGRST202":
+                    logger.error(f"Supabase API error updating session {session_id}: {e.message}")
+                    raise
+                logger.warning(
+                    "merge_session_state() is not installed, falling back to read-modify-write. "
+                    "Apply database/migrations/003_merge_session_state.sql"
+                )
+                self.session_merge_rpc = False
+            except Exception as e:
+                logger.error(f"Error updating session: {e}")
+                raise
+        
+        return self._update_session_read_modify_write(session_id, state_update)
+    
+    def _update_session_read_modify_write(self, session_id: str, state_update: Dict) -> Optional[Dict]:
+        """Legacy two-round-trip update (SELECT + UPDATE), not atomic"""
         try:
             # Получаем текущую сессию
-            current = self.client.table("user_sessions").select("*").eq("id", session_id).execute()
+            current = self.client.table("user_sessions").select("state").eq("id", session_id).execute()
             if not current.data:
                 logger.error(f"Session {session_id} not found")
                 return None
             
             # Обновляем state, объединяя с существующим
-            current_state = current.data[0].get("state", {})
+            current_state = current.data[0].get("state") or {}
             current_state.update(state_update)
             
             result = self.client.table("user_sessions").update({
@@ -126,9 +168,9 @@ class SupabaseService:
     
     def save_answer(self, interview_id: str, user_id: int, 
                          question: str, answer: str) -> Optional[Dict]:
-        """Save respondent's answer to the database
+        """Save a single respondent's answer to the database
         
-        Note: Currently not used as answers are stored in user_sessions.answers
+        Note: The bot writes answers in batches via save_answers
         """
         try:
             logger.info(f"Saving answer for interview {interview_id}, user {user_id}")
@@ -149,13 +191,174 @@ class SupabaseService:
             logger.error(f"Error type: {type(e).__name__}")
             raise
     
-    def get_interview_answers(self, interview_id: str) -> List[Dict]:
+    def save_answers(self, rows: List[Dict]) -> None:
+        """Bulk insert answer rows into respondent_answers
+        
+        Rows are unique by (session_id, turn_index) (migration 004), so a retried
+        batch does not create duplicates.
+        """
+        if not rows:
+            return
+        try:
+            self.client.table("respondent_answers").upsert(
+                rows,
+                on_conflict="session_id,turn_index",
+                ignore_duplicates=True,
+                returning=ReturnMethod.minimal
+            ).execute()
+            logger.debug(f"Saved batch of {len(rows)} answers")
+        except APIError as e:
+            logger.error(f"Supabase API error saving batch of {len(rows)} answers: {e.message}")
+            logger.error(f"Error details: {e.json if hasattr(e, 'json') else str(e)}")
+            raise
+        except Exception as e:
+            logger.error(f"Unexpected error saving batch of {len(rows)} answers: {e}")
+            logger.error(f"Error type: {type(e).__name__}")
+            raise
+    
+    def get_interview_answers(self, interview_id: str, limit: int = 500,
+                              after_created_at: Optional[str] = None,
+                              after_id: Optional[str] = None) -> List[Dict]:
+        """Page through answers of an interview with keyset pagination
+        
+        Pass created_at and id of the last row of the previous page as
+        after_created_at / after_id to get the next page. An empty or short
+        page means there is nothing left.
+        """
         try:
-            result = self.client.table("respondent_answers").select("*").eq(
-                "interview_id", interview_id
-            ).order("created_at").execute()
+            query = self.client.table("respondent_answers").select(
+                "id, session_id, user_id, turn_index, question_text, answer_text, "
+                "asked_at, answered_at, is_transcribed, created_at"
+            ).eq("interview_id", interview_id)
+            if after_created_at and after_id:
+                query = query.or_(
+                    f'created_at.gt."{after_created_at}",'
+                    f'and(created_at.eq."{after_created_at}",id.gt.{after_id})'
+                )
+            result = query.order("created_at").order("id").limit(limit).execute()
             return result.data
         except Exception as e:
             logger.error(f"Error getting answers: {e}")
             return []
+
+
+class AsyncSupabaseService:
+    """
+    Асинхронный доступ к Supabase для aiogram-хендлеров и агентов.
+    
+    Has the same interface as SupabaseService, but every call runs the
+    synchronous client in a bounded thread pool, so a slow database round trip
+    no longer blocks the event loop and other users' conversations.
+    """
+    
+    def __init__(self, service: Optional[SupabaseService] = None, max_workers: int = 10,
+                 answer_flush_interval: float = 2.0, answer_flush_max_answers: int = 10,
+                 answer_flush_max_bytes: int = 65536, interview_cache_ttl: float = 60.0,
+                 interview_cache_max_size: int = 1000):
+        self.service = service or SupabaseService()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix="supabase"
+        )
+        self.answer_buffer = AnswerWriteBuffer(
+            self.save_answers,
+            flush_interval=answer_flush_interval,
+            max_pending_answers=answer_flush_max_answers,
+            max_pending_bytes=answer_flush_max_bytes
+        )
+        # Read-through cache of interview records; returned dicts must be treated as read-only
+        self.interview_cache: TTLCache[Dict] = TTLCache(
+            maxsize=interview_cache_max_size,
+            ttl=interview_cache_ttl
+        )
+        self._interview_loads: Dict[str, asyncio.Future] = {}
+        # Bumped by every update; a load that saw an older generation is not cached
+        self._interview_generations: Dict[str, int] = {}
+        logger.info(f"Async Supabase service initialized (max_workers={max_workers})")
+    
+    async def _run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self._executor, functools.partial(func, *args, **kwargs)
+        )
+    
+    async def create_interview(self, fields: Dict) -> Optional[Dict]:
+        return await self._run(self.service.create_interview, fields)
+    
+    def _invalidate_interview(self, interview_id: str) -> None:
+        self._interview_generations[interview_id] = self._interview_generations.get(interview_id, 0) + 1
+        self.interview_cache.invalidate(interview_id)
+        # Later readers start a fresh load instead of joining one that may predate the update
+        self._interview_loads.pop(interview_id, None)
+    
+    async def update_interview(self, interview_id: str, data: Dict) -> Optional[Dict]:
+        self._invalidate_interview(interview_id)
+        try:
+            return await self._run(self.service.update_interview, interview_id, data)
+        finally:
+            self._invalidate_interview(interview_id)
+    
+    async def get_interview(self, interview_id: str) -> Optional[Dict]:
+        interview = self.interview_cache.get(interview_id)
+        if interview is not None:
+            return interview
+        
+        # Concurrent misses for the same interview share one database read
+        pending = self._interview_loads.get(interview_id)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        
+        generation = self._interview_generations.get(interview_id, 0)
+        future = asyncio.get_running_loop().create_future()
+        self._interview_loads[interview_id] = future
+        try:
+            interview = await self._run(self.service.get_interview, interview_id)
+            if interview is not None and self._interview_generations.get(interview_id, 0) == generation:
+                self.interview_cache.set(interview_id, interview)
+            future.set_result(interview)
+            return interview
+        finally:
+            # Waiters get the same "not found" result the sync service returns on
+            # errors; also when the loading caller was cancelled
+            if not future.done():
+                future.set_result(None)
+            if self._interview_loads.get(interview_id) is future:
+                del self._interview_loads[interview_id]
+    
+    async def create_session(self, user_id: int, session_type: str,
+                             interview_id: Optional[str] = None) -> Optional[Dict]:
+        return await self._run(self.service.create_session, user_id, session_type, interview_id)
+    
+    async def update_session(self, session_id: str, state_update: Dict) -> Optional[Dict]:
+        return await self._run(self.service.update_session, session_id, state_update)
+    
+    async def buffer_answer(self, session_id: str, row: Dict) -> None:
+        """Queue an answer row for batched write-behind insertion (see AnswerWriteBuffer)"""
+        await self.answer_buffer.add(session_id, row)
+    
+    async def flush_answers(self, session_id: Optional[str] = None) -> None:
+        """Persist buffered answers now; raises if the flush fails"""
+        await self.answer_buffer.flush(session_id)
+    
+    async def get_active_session(self, user_id: int) -> Optional[Dict]:
+        return await self._run(self.service.get_active_session, user_id)
+    
+    async def save_answer(self, interview_id: str, user_id: int,
+                          question: str, answer: str) -> Optional[Dict]:
+        return await self._run(self.service.save_answer, interview_id, user_id, question, answer)
+    
+    async def save_answers(self, rows: List[Dict]) -> None:
+        await self._run(self.service.save_answers, rows)
+    
+    async def get_interview_answers(self, interview_id: str, limit: int = 500,
+                                    after_created_at: Optional[str] = None,
+                                    after_id: Optional[str] = None) -> List[Dict]:
+        return await self._run(
+            self.service.get_interview_answers, interview_id, limit, after_created_at, after_id
+        )
     
+    async def close(self) -> None:
+        """Сбросить буфер ответов, дождаться завершения запросов и остановить пул потоков"""
+        await self.answer_buffer.close()
+        await asyncio.to_thread(self._executor.shutdown, True)
+        logger.info(f"Async Supabase service closed, interview cache: {self.interview_cache.stats()}")
@@ -0,0 +1,152 @@
+"""Transcription backends behind TranscriptionService.
+
+- openai: whisper-1 over the shared AsyncOpenAI client (default)
+- local: faster-whisper (CTranslate2) on CPU in dedicated worker processes; the
+  model is loaded once per worker by the pool initializer and stays in memory
+- stub: deterministic text without any I/O, for load tests and offline runs
+
+The backend is selected with TRANSCRIPTION_BACKEND.
+"""
+import asyncio
+import hashlib
+import io
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional
+
+from loguru import logger
+
+from src.services.llm_registry import get_openai_client
+from src.utils.config import Config
+
+
+class TranscriptionBackend(ABC):
+    """Базовый класс бэкенда транскрибации"""
+
+    name = "base"
+
+    @abstractmethod
+    async def transcribe(self, audio_data: bytes, audio_format: str, language: str) -> Optional[str]:
+        """Returns transcribed text, None if nothing was recognized"""
+
+    async def warmup(self) -> None:
+        """Подготовка к работе (загрузка модели и т.п.)"""
+
+    async def close(self) -> None:
+        """Освобождение ресурсов"""
+
+
+class OpenAITranscriptionBackend(TranscriptionBackend):
+    """Whisper API через общий AsyncOpenAI-клиент"""
+
+    name = "openai"
+
+    def __init__(self, model: str = "whisper-1"):
+        self.model = model
+
+    async def transcribe(self, audio_data: bytes, audio_format: str, language: str) -> Optional[str]:
+        transcript = await get_openai_client().audio.transcriptions.create(
+            model=self.model,
+            file=(f"voice.{audio_format}", io.BytesIO(audio_data)),
+            language=language,
+        )
+        return transcript.text.strip() if transcript.text else None
+
+
+# Worker-process state of the local backend
+_local_model: Any = None
+
+
+def _init_local_model(model_size: str, compute_type: str, cpu_threads: int) -> None:
+    """Загружает модель один раз при старте процесса-воркера"""
+    global _local_model
+    from faster_whisper import WhisperModel
+
+    _local_model = WhisperModel(
+        model_size,
+        device="cpu",
+        compute_type=compute_type,
+        cpu_threads=cpu_threads,
+    )
+
+
+def _local_ready() -> bool:
+    return _local_model is not None
+
+
+def _local_transcribe(audio_data: bytes, language: str) -> str:
+    segments, _ = _local_model.transcribe(io.BytesIO(audio_data), language=language, beam_size=1)
+    return " ".join(segment.text.strip() for segment in segments).strip()
+
+
+class LocalWhisperBackend(TranscriptionBackend):
+    """faster-whisper на CPU в отдельных процессах с предзагруженной моделью"""
+
+    name = "local"
+
+    def __init__(self, model_size: str = "small", compute_type: str = "int8",
+                 workers: int = 1, cpu_threads: int = 0):
+        """
+        Args:
+            model_size: faster-whisper model name or path
+            compute_type: CTranslate2 compute type (int8 is the fastest on CPU)
+            workers: Number of worker processes, each holds its own model copy
+            cpu_threads: Threads per worker; 0 lets CTranslate2 decide
+        """
+        self.model_size = model_size
+        self.workers = workers
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_local_model,
+            initargs=(model_size, compute_type, cpu_threads),
+        )
+
+    async def warmup(self) -> None:
+        # Start every worker now so the first voice message does not pay for model loading
+        loop = asyncio.get_running_loop()
+        await asyncio.gather(*(
+            loop.run_in_executor(self._executor, _local_ready) for _ in range(self.workers)
+        ))
+        logger.info(f"Local Whisper model '{self.model_size}' loaded in {self.workers} worker(s)")
+
+    async def transcribe(self, audio_data: bytes, audio_format: str, language: str) -> Optional[str]:
+        loop = asyncio.get_running_loop()
+        text = await loop.run_in_executor(self._executor, _local_transcribe, audio_data, language)
+        return text or None
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class StubTranscriptionBackend(TranscriptionBackend):
+    """Детерминированная заглушка: одинаковое аудио даёт одинаковый текст"""
+
+    name = "stub"
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+
+    async def transcribe(self, audio_data: bytes, audio_format: str, language: str) -> Optional[str]:
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        digest = hashlib.sha1(audio_data).hexdigest()[:8]
+        return f"[stub transcription {digest}, {len(audio_data)} bytes, {audio_format}/{language}]"
+
+
+def create_transcription_backend(config: Config) -> TranscriptionBackend:
+    """Создаёт бэкенд по настройке transcription_backend"""
+    backend = config.transcription_backend.lower()
+    if backend == "openai":
+        return OpenAITranscriptionBackend(model=config.transcription_model)
+    if backend == "local":
+        return LocalWhisperBackend(
+            model_size=config.local_whisper_model,
+            compute_type=config.local_whisper_compute_type,
+            workers=config.local_whisper_workers,
+            cpu_threads=config.local_whisper_cpu_threads,
+        )
+    if backend == "stub":
+        return StubTranscriptionBackend(delay=config.stub_transcription_delay)
+    raise ValueError(f"Unknown transcription backend: {config.transcription_backend}")
@@ -2,27 +2,44 @@
 Модуль для обработки голосовых сообщений в Telegram боте
 
 Основные функции:
-- Скачивание голосовых файлов через Telegram Bot API
-- Конвертация аудио форматов (OGG → MP3) с graceful fallback
-- Автоматическая транскрибация через OpenAI Whisper API
-- Обработка ошибок и таймаутов
+- Скачивание голосовых файлов через Telegram Bot API (общая HTTP-сессия, лимит размера,
+  поддержка собственного сервера Bot API)
+- Предобработка: обрезка тишины, mono 16 kHz, компактный Opus (в памяти, в пуле процессов)
+- Конвертация аудио только если формат не принимается Whisper
+- Автоматическая транскрибация через общий TranscriptionService (OpenAI, локальный
+  faster-whisper или заглушка; кэш по file_unique_id)
+- Длинные сообщения режутся по паузам и транскрибируются кусками параллельно
+- Обработка ошибок и таймаутов, замеры времени по этапам
 
 Требования:
 - Python 3.8+
-- aiohttp, aiofiles для асинхронных операций
-- pydub (опционально) для конвертации аудио
-- openai для транскрибации
+- aiohttp для асинхронных операций
+- openai для транскрибации (или faster-whisper для локального бэкенда)
 - FFmpeg (опционально) для конвертации аудио
 """
 
+import io
 import os
+import time
 import logging
-import tempfile
 import asyncio
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Tuple
 import aiohttp
-import aiofiles
-from pathlib import Path
+
+from src.services.http_session import get_http_session
+from src.services.whisper_service import get_transcription_service
+from src.services.audio_processing import (
+    WHISPER_ACCEPTED_FORMATS,
+    detect_audio_format,
+    detect_silences,
+    extract_chunk,
+    ffmpeg_available,
+    plan_chunks,
+    preprocess,
+    run_in_audio_pool,
+    transcode,
+)
+from src.utils.config import get_config
 
 # Настройка логгера для данного модуля
 logger = logging.getLogger(__name__)
@@ -37,7 +54,7 @@ class VoiceMessageHandler:
     
     Обеспечивает полный цикл обработки:
     1. Скачивание файла с Telegram серверов
-    2. Конвертация аудио формата (опционально)
+    2. Конвертация аудио формата (только если Whisper его не принимает)
     3. Транскрибация через OpenAI Whisper
     
     Пример использования:
@@ -49,13 +66,16 @@ class VoiceMessageHandler:
     ```
     """
     
-    def __init__(self, bot_token: str, openai_api_key: Optional[str] = None):
+    def __init__(self, bot_token: str, openai_api_key: Optional[str] = None,
+                 api_server: Optional[str] = None, api_local: Optional[bool] = None):
         """
         Инициализирует обработчик голосовых сообщений
         
         Args:
             bot_token: Токен Telegram бота
             openai_api_key: API ключ OpenAI (опционально, можно в .env)
+            api_server: URL собственного сервера Telegram Bot API (опционально, TELEGRAM_API_SERVER)
+            api_local: Сервер запущен с --local и отдаёт пути к файлам на диске (TELEGRAM_API_LOCAL)
             
         Raises:
             ValueError: При отсутствии обязательных параметров
@@ -65,12 +85,28 @@ class VoiceMessageHandler:
             
         self.bot_token = bot_token
         self.openai_api_key = openai_api_key or os.getenv("OPENAI_API_KEY")
-        self.telegram_api_url = f"https://api.telegram.org/bot{bot_token}"
+        api_server = (api_server or os.getenv("TELEGRAM_API_SERVER") or "https://api.telegram.org").rstrip("/")
+        if api_local is None:
+            api_local = os.getenv("TELEGRAM_API_LOCAL", "false").lower() == "true"
+        self.api_local = api_local
+        self.telegram_api_url = f"{api_server}/bot{bot_token}"
+        self.telegram_file_url = f"{api_server}/file/bot{bot_token}"
         
         # Константы для оптимизации
         self.MAX_FILE_SIZE_MB = 20  # Максимальный размер файла
         self.DOWNLOAD_TIMEOUT = 30  # Таймаут скачивания
-        self.TRANSCRIPTION_TIMEOUT = 60  # Таймаут транскрибации
+        
+        config = get_config()
+        
+        # Предобработка перед загрузкой
+        self.preprocess_enabled = config.voice_preprocess
+        self.preprocess_bitrate = config.voice_preprocess_bitrate
+        self.silence_threshold = config.voice_silence_threshold
+        
+        # Параллельная транскрибация длинных сообщений
+        self.chunking_min_duration = config.voice_chunking_min_duration
+        self.chunk_target_seconds = config.voice_chunk_target_seconds
+        self.chunk_max_seconds = config.voice_chunk_max_seconds
         
         # Проверка зависимостей
         self._check_dependencies()
@@ -80,16 +116,14 @@ class VoiceMessageHandler:
         Проверяет наличие всех необходимых зависимостей
         и устанавливает флаги доступности
         """
-        self.pydub_available = False
+        self.ffmpeg_available = ffmpeg_available()
         self.openai_available = False
         
-        # Проверка pydub для конвертации аудио
-        try:
-            from pydub import AudioSegment
-            self.pydub_available = True
-            logger.info("✅ pydub доступен для обработки аудио")
-        except ImportError:
-            logger.warning("⚠️  pydub не установлен. Конвертация аудио будет ограничена")
+        # Проверка ffmpeg для конвертации аудио
+        if self.ffmpeg_available:
+            logger.info("✅ ffmpeg доступен для обработки аудио")
+        else:
+            logger.warning("⚠️  ffmpeg не найден. Конвертация аудио будет недоступна")
             
         # Проверка OpenAI для транскрибации
         try:
@@ -102,144 +136,302 @@ class VoiceMessageHandler:
         except ImportError:
             logger.warning("⚠️  Библиотека openai не установлена. Транскрибация недоступна")
         
+        # Локальный и тестовый бэкенды не требуют OpenAI
+        self.transcription_available = (
+            self.openai_available or get_config().transcription_backend.lower() != "openai"
+        )
+        
         # Логируем общую информацию о возможностях
-        if not self.openai_available:
+        if not self.transcription_available:
             logger.error("❌ Отсутствуют критические зависимости для транскрибации")
     
     async def download_voice_file(self, file_id: str) -> Optional[bytes]:
-        """Download voice file from Telegram servers"""
+        """Download voice file from Telegram servers
+        
+        Uses the shared keep-alive HTTP session, enforces DOWNLOAD_TIMEOUT and
+        stops reading once the file exceeds MAX_FILE_SIZE_MB.
+        """
+        max_bytes = self.MAX_FILE_SIZE_MB * 1024 * 1024
+        timeout = aiohttp.ClientTimeout(total=self.DOWNLOAD_TIMEOUT)
+        session = get_http_session()
+        
         try:
             # Get file path from Telegram
-            async with aiohttp.ClientSession() as session:
-                file_info_url = f"{self.telegram_api_url}/getFile?file_id={file_id}"
-                async with session.get(file_info_url) as resp:
-                    if resp.status != 200:
-                        logger.error(f"Failed to get file info: {resp.status}")
-                        return None
-                    
-                    data = await resp.json()
-                    if not data.get("ok"):
-                        logger.error(f"Telegram API error: {data}")
-                        return None
-                    
-                    file_path = data["result"]["file_path"]
+            file_info_url = f"{self.telegram_api_url}/getFile"
+            async with session.get(file_info_url, params={"file_id": file_id}, timeout=timeout) as resp:
+                if resp.status != 200:
+                    logger.error(f"Failed to get file info: {resp.status}")
+                    return None
+                
+                data = await resp.json()
+                if not data.get("ok"):
+                    logger.error(f"Telegram API error: {data}")
+                    return None
                 
-                # Download the file
-                download_url = f"https://api.telegram.org/file/bot{self.bot_token}/{file_path}"
-                async with session.get(download_url) as resp:
-                    if resp.status != 200:
-                        logger.error(f"Failed to download file: {resp.status}")
+                file_path = data["result"]["file_path"]
+                file_size = data["result"].get("file_size") or 0
+            
+            if file_size > max_bytes:
+                logger.error(f"Voice file is too large: {file_size} bytes (limit {self.MAX_FILE_SIZE_MB} MB)")
+                return None
+            
+            # A local Bot API server returns a path on its own filesystem
+            if self.api_local and os.path.isabs(file_path) and os.path.exists(file_path):
+                return await asyncio.wait_for(
+                    asyncio.to_thread(self._read_local_file, file_path, max_bytes),
+                    timeout=self.DOWNLOAD_TIMEOUT
+                )
+            
+            # Download the file
+            download_url = f"{self.telegram_file_url}/{file_path.lstrip('/')}"
+            async with session.get(download_url, timeout=timeout) as resp:
+                if resp.status != 200:
+                    logger.error(f"Failed to download file: {resp.status}")
+                    return None
+                
+                buffer = bytearray()
+                async for chunk in resp.content.iter_chunked(64 * 1024):
+                    buffer.extend(chunk)
+                    if len(buffer) > max_bytes:
+                        logger.error(f"Voice file exceeds {self.MAX_FILE_SIZE_MB} MB, download aborted")
                         return None
-                    
-                    return await resp.read()
-                    
+                return bytes(buffer)
+                
+        except asyncio.TimeoutError:
+            logger.error(f"Timed out downloading voice file after {self.DOWNLOAD_TIMEOUT}s")
+            return None
         except Exception as e:
             logger.error(f"Error downloading voice file: {e}")
             return None
     
-    async def convert_ogg_to_mp3(self, ogg_data: bytes) -> Optional[bytes]:
-        """Convert OGG audio to MP3 format"""
-        if not self.pydub_available:
-            logger.warning("pydub not available, returning original OGG data")
-            return ogg_data
+    @staticmethod
+    def _read_local_file(path: str, max_bytes: int) -> Optional[bytes]:
+        """Read a file served by a local Bot API server, respecting the size limit"""
+        with open(path, "rb") as f:
+            data = f.read(max_bytes + 1)
+        if len(data) > max_bytes:
+            logger.error(f"Voice file {path} exceeds size limit")
+            return None
+        return data
+    
+    async def preprocess_audio(self, audio_data: bytes, duration: float) -> Optional[Tuple[bytes, Dict[str, Any]]]:
+        """
+        Trim silence, downmix to mono, resample to 16 kHz and re-encode as Opus.
         
+        Returns:
+            Tuple of (OGG/Opus bytes, report) or None if pre-processing is off or failed.
+            The report has bytes in/out/saved, audio seconds before/after trimming,
+            the pre-processing time and the expected transcription time saved.
+        """
+        if not self.preprocess_enabled or not self.ffmpeg_available:
+            return None
+        
+        started = time.perf_counter()
         try:
-            from pydub import AudioSegment
-            
-            # Create temporary files
-            with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as ogg_file:
-                ogg_path = ogg_file.name
-                await self._write_file(ogg_path, ogg_data)
-            
-            with tempfile.NamedTemporaryFile(suffix=".mp3", delete=False) as mp3_file:
-                mp3_path = mp3_file.name
-            
-            # Convert OGG to MP3
-            audio = AudioSegment.from_ogg(ogg_path)
-            audio.export(mp3_path, format="mp3")
-            
-            # Read the converted file
-            async with aiofiles.open(mp3_path, 'rb') as f:
-                mp3_data = await f.read()
-            
-            # Clean up temporary files
-            os.unlink(ogg_path)
-            os.unlink(mp3_path)
-            
-            return mp3_data
-            
+            processed, seconds_out = await run_in_audio_pool(
+                preprocess, audio_data, self.preprocess_bitrate, self.silence_threshold
+            )
+        except Exception as e:
+            logger.warning(f"Audio pre-processing failed, using original audio: {e}")
+            return None
+        preprocess_ms = (time.perf_counter() - started) * 1000
+        
+        # Transcription time scales with audio length; estimate the saving from
+        # the throughput observed so far
+        trimmed_seconds = max(0.0, duration - seconds_out) if duration else 0.0
+        rate = get_transcription_service().stats()["audio_seconds_per_second"]
+        report = {
+            "bytes_in": len(audio_data),
+            "bytes_out": len(processed),
+            "bytes_saved": len(audio_data) - len(processed),
+            "seconds_in": duration,
+            "seconds_out": round(seconds_out, 2),
+            "preprocess_ms": round(preprocess_ms, 1),
+            "est_transcribe_saved_ms": round(trimmed_seconds / rate * 1000, 1) if rate else None,
+        }
+        logger.info(
+            f"Pre-processed voice: {report['bytes_in']} -> {report['bytes_out']} bytes, "
+            f"{duration}s -> {report['seconds_out']}s audio, +{report['preprocess_ms']} ms "
+            f"(est. transcription saving {report['est_transcribe_saved_ms']} ms)"
+        )
+        return processed, report
+    
+    async def prepare_audio(self, audio_data: bytes) -> Tuple[bytes, str]:
+        """
+        Подготавливает аудио к транскрибации.
+        
+        Formats accepted by Whisper (Telegram voice notes are OGG/Opus) are passed
+        through untouched. Anything else is transcoded to MP3 in memory in the
+        audio process pool.
+        
+        Returns:
+            Tuple of (audio bytes, format name)
+        """
+        audio_format = detect_audio_format(audio_data)
+        if audio_format in WHISPER_ACCEPTED_FORMATS:
+            return audio_data, audio_format
+        
+        if not self.ffmpeg_available:
+            logger.warning(f"ffmpeg not available, sending {audio_format or 'unknown'} audio as is")
+            return audio_data, audio_format or "ogg"
+        
+        try:
+            mp3_data = await run_in_audio_pool(transcode, audio_data, "mp3")
+            return mp3_data, "mp3"
         except Exception as e:
             logger.error(f"Error converting audio: {e}")
             # Если конвертация не удалась, возвращаем оригинальные данные
-            logger.warning("Conversion failed, returning original OGG data for direct transcription")
-            return ogg_data
+            logger.warning("Conversion failed, returning original data for direct transcription")
+            return audio_data, audio_format or "ogg"
     
-    async def transcribe_audio(self, audio_data: bytes, language: str = "ru") -> Optional[str]:
-        """Transcribe audio using OpenAI Whisper API"""
-        if not self.openai_available:
-            logger.warning("OpenAI not available for transcription")
+    async def transcribe_audio(self, audio_data: bytes, language: str = "ru",
+                               audio_format: str = "ogg", cache_key: Optional[str] = None,
+                               duration: float = 0) -> Optional[str]:
+        """Transcribe audio using the shared transcription service"""
+        if not self.transcription_available:
+            logger.warning("No transcription backend available")
             return None
         
-        try:
-            from openai import OpenAI
-            # Настраиваем клиент с таймаутом и меньшим количеством попыток
-            client = OpenAI(
-                api_key=self.openai_api_key,
-                timeout=60.0,  # 60 секунд таймаут
-                max_retries=1   # Только 1 повторная попытка
+        return await get_transcription_service().transcribe(
+            audio_data,
+            audio_format=audio_format,
+            language=language,
+            cache_key=cache_key,
+            duration=duration
+        )
+    
+    async def transcribe_chunked(self, audio_data: bytes, duration: float,
+                                 language: str = "ru") -> Optional[str]:
+        """
+        Transcribe long audio as parallel chunks split at pauses.
+        
+        All chunks are submitted to the audio process pool at once and each
+        chunk's transcription starts as soon as that chunk is encoded, so the
+        first requests are in flight while later chunks are still being cut.
+        The text is stitched back in chunk order. A failed chunk is retried once;
+        if it fails again the whole transcription fails (None), so a partial
+        answer is never stored as if it were complete.
+        """
+        silences = await run_in_audio_pool(detect_silences, audio_data)
+        chunks = plan_chunks(duration, silences, self.chunk_target_seconds, self.chunk_max_seconds)
+        logger.info(f"Transcribing {duration}s of audio in {len(chunks)} chunks")
+        
+        async def encode_and_transcribe(start: float, end: float) -> Optional[str]:
+            chunk = await run_in_audio_pool(extract_chunk, audio_data, start, end, self.preprocess_bitrate)
+            return await self.transcribe_audio(
+                chunk,
+                language=language,
+                audio_format="ogg",
+                duration=end - start
             )
-            
-            # Save audio to temporary file (OGG is fine for Whisper)
-            with tempfile.NamedTemporaryFile(suffix=".ogg", delete=False) as temp_file:
-                temp_path = temp_file.name
-                await self._write_file(temp_path, audio_data)
-            
-            # Transcribe using Whisper with new API
-            with open(temp_path, "rb") as audio_file:
-                transcript = await asyncio.to_thread(
-                    client.audio.transcriptions.create,
-                    model="whisper-1",
-                    file=audio_file,
-                    language=language
+        
+        async def with_retry(index: int, start: float, end: float) -> Optional[str]:
+            for attempt in range(2):
+                try:
+                    text = await encode_and_transcribe(start, end)
+                except Exception as e:
+                    text, error = None, e
+                else:
+                    error = None
+                # An empty string is a silent chunk, not a failure
+                if text is not None:
+                    return text
+                logger.warning(
+                    f"Chunk {index + 1}/{len(chunks)} was not transcribed "
+                    f"(attempt {attempt + 1}/2): {error}"
                 )
-            
-            # Clean up
-            os.unlink(temp_path)
-            
-            return transcript.text.strip() if transcript.text else None
-            
-        except Exception as e:
-            logger.error(f"Error transcribing audio: {e}")
             return None
+        
+        results = await asyncio.gather(
+            *(with_retry(index, start, end) for index, (start, end) in enumerate(chunks))
+        )
+        
+        if any(text is None for text in results):
+            logger.error(f"Chunked transcription failed: {results.count(None)}/{len(chunks)} chunks missing")
+            return None
+        return " ".join(text for text in results if text) or None
+    
+    def _should_chunk(self, duration: float) -> bool:
+        return (
+            self.chunking_min_duration > 0
+            and duration >= self.chunking_min_duration
+            and duration > self.chunk_max_seconds
+            and self.ffmpeg_available
+        )
     
-    async def process_voice_message(self, file_id: str, duration: int = 0) -> Dict[str, Any]:
-        """Process a complete voice message from Telegram"""
+    async def process_voice_message(self, file_id: str, duration: int = 0,
+                                    file_unique_id: Optional[str] = None) -> Dict[str, Any]:
+        """Process a complete voice message from Telegram
+        
+        file_unique_id is stable across forwards and re-sends; when given, a cached
+        transcription is returned without downloading the file again.
+        """
         result = {
             "success": False,
             "file_id": file_id,
             "duration": duration,
             "transcription": None,
-            "error": None
+            "error": None,
+            "timings": {}
         }
+        timings = result["timings"]
+        started = time.perf_counter()
         
         try:
+            cached = get_transcription_service().get_cached(file_unique_id)
+            if cached is not None:
+                result["success"] = True
+                result["transcription"] = cached
+                result["cached"] = True
+                return result
+            
             # Download voice file
             logger.info(f"Downloading voice file: {file_id}")
-            ogg_data = await self.download_voice_file(file_id)
-            if not ogg_data:
+            stage_started = time.perf_counter()
+            audio_data = await self.download_voice_file(file_id)
+            timings["download_ms"] = round((time.perf_counter() - stage_started) * 1000, 1)
+            if not audio_data:
                 result["error"] = "Failed to download voice file"
                 return result
             
-            # Convert to MP3 (optional, fallback to OGG if fails)
-            logger.info("Converting OGG to MP3 (optional)")
-            mp3_data = await self.convert_ogg_to_mp3(ogg_data)
-            if not mp3_data:
-                logger.warning("Audio conversion failed, using original OGG")
-                mp3_data = ogg_data
+            # Trim and compact the audio; fall back to format conversion only
+            stage_started = time.perf_counter()
+            preprocessed = await self.preprocess_audio(audio_data, duration)
+            if preprocessed:
+                audio_data, result["preprocess"] = preprocessed
+                audio_format = "ogg"
+                audio_seconds = result["preprocess"]["seconds_out"]
+            else:
+                # Convert only if Whisper does not accept the source format
+                audio_data, audio_format = await self.prepare_audio(audio_data)
+                audio_seconds = duration
+            timings["convert_ms"] = round((time.perf_counter() - stage_started) * 1000, 1)
+            
+            # Long answers: split at pauses and transcribe chunks in parallel
+            if self._should_chunk(audio_seconds):
+                stage_started = time.perf_counter()
+                try:
+                    transcription = await self.transcribe_chunked(audio_data, audio_seconds)
+                except Exception as e:
+                    logger.error(f"Chunked transcription failed, falling back to single request: {e}")
+                    transcription = None
+                timings["chunked_transcribe_ms"] = round((time.perf_counter() - stage_started) * 1000, 1)
+                if transcription:
+                    get_transcription_service().store(file_unique_id, transcription)
+                    result["success"] = True
+                    result["transcription"] = transcription
+                    return result
             
-            # Transcribe audio (works with both MP3 and OGG)
-            logger.info("Transcribing audio")
-            transcription = await self.transcribe_audio(mp3_data)
+            # Transcribe audio
+            logger.info(f"Transcribing {audio_format} audio")
+            stage_started = time.perf_counter()
+            transcription = await self.transcribe_audio(
+                audio_data,
+                audio_format=audio_format,
+                cache_key=file_unique_id,
+                duration=audio_seconds
+            )
+            timings["transcribe_ms"] = round((time.perf_counter() - stage_started) * 1000, 1)
             if transcription:
                 result["success"] = True
                 result["transcription"] = transcription
@@ -253,8 +445,6 @@ class VoiceMessageHandler:
             logger.error(f"Error processing voice message: {e}")
             result["error"] = str(e)
             return result
-    
-    async def _write_file(self, path: str, data: bytes):
-        """Helper to write data to file asynchronously"""
-        async with aiofiles.open(path, 'wb') as f:
-            await f.write(data)
\ No newline at end of file
+        finally:
+            timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            logger.info(f"Voice message {file_id} timings: {timings}")
@@ -1,37 +1,176 @@
-import os
-import io
-from typing import Optional
-from openai import AsyncOpenAI
-from pydub import AudioSegment
+"""Async transcription service.
+
+One process-wide service wraps a pluggable backend (see transcription_backends):
+by default whisper-1 over the shared AsyncOpenAI client, so transcriptions reuse
+warm keep-alive connections instead of building a client per voice message.
+Results are cached by Telegram's file_unique_id: a forwarded or re-sent voice
+note, or a retried update, is answered from the cache, and concurrent requests
+for the same file share one API call.
+"""
+import asyncio
+import time
+from typing import Dict, Optional
+
 from loguru import logger
 
-class WhisperService:
-    def __init__(self):
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY must be set")
-        
-        self.client = AsyncOpenAI(api_key=api_key)
-        logger.info("Whisper service initialized")
-    
-    async def transcribe(self, audio_file: io.BytesIO) -> Optional[str]:
-        try:
-            # Convert OGG to MP3 (Whisper prefers standard formats)
-            audio = AudioSegment.from_ogg(audio_file)
-            mp3_buffer = io.BytesIO()
-            audio.export(mp3_buffer, format="mp3")
-            mp3_buffer.seek(0)
-            
-            # Transcribe with Whisper
-            transcription = await self.client.audio.transcriptions.create(
-                model="whisper-1",
-                file=("audio.mp3", mp3_buffer, "audio/mp3"),
-                language="ru"
-            )
-            
-            logger.info(f"Transcribed: {transcription.text[:50]}...")
-            return transcription.text
-            
-        except Exception as e:
-            logger.error(f"Error transcribing audio: {e}")
-            return None
\ No newline at end of file
+from src.services.cache import TTLCache
+from src.services.transcription_backends import (
+    OpenAITranscriptionBackend,
+    TranscriptionBackend,
+    create_transcription_backend,
+)
+from src.utils.config import get_config
+
+
+class TranscriptionService:
+    """Транскрибация через выбранный бэкенд с кэшем по file_unique_id"""
+
+    def __init__(self, backend: Optional[TranscriptionBackend] = None, timeout: float = 60.0,
+                 max_concurrency: int = 8, cache_ttl: float = 86400.0,
+                 cache_max_size: int = 5000):
+        """
+        Args:
+            backend: Transcription backend. Defaults to OpenAI whisper-1
+            timeout: Per-request timeout in seconds
+            max_concurrency: Maximum simultaneous transcription requests
+            cache_ttl: Lifetime of cached transcriptions in seconds
+            cache_max_size: Maximum number of cached transcriptions
+        """
+        self.backend = backend or OpenAITranscriptionBackend()
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.cache: TTLCache[str] = TTLCache(maxsize=cache_max_size, ttl=cache_ttl)
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        # Metrics
+        self.requests = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.inflight_hits = 0  # Requests that joined a transcription already in progress
+        self.audio_seconds = 0.0
+        self.busy_seconds = 0.0
+
+    def get_cached(self, cache_key: Optional[str]) -> Optional[str]:
+        """Готовая транскрипция из кэша (без скачивания файла)"""
+        if not cache_key:
+            return None
+        return self.cache.get(cache_key)
+
+    def store(self, cache_key: Optional[str], text: str) -> None:
+        """Сохранить транскрипцию, собранную вне transcribe() (например, по кускам)"""
+        if cache_key and text:
+            self.cache.set(cache_key, text)
+
+    async def transcribe(self, audio_data: bytes, audio_format: str = "ogg",
+                         language: str = "ru", cache_key: Optional[str] = None,
+                         duration: float = 0) -> Optional[str]:
+        """
+        Транскрибирует аудио.
+
+        Args:
+            audio_data: Audio bytes in a format Whisper accepts
+            audio_format: File extension passed to the API
+            language: Spoken language hint
+            cache_key: Telegram file_unique_id; enables caching and deduplication
+            duration: Audio length in seconds, used for throughput metrics
+
+        Returns:
+            Transcribed text or None on failure
+        """
+        if cache_key:
+            # Checked before the cache, so a joined request is not counted as a miss
+            inflight = self._inflight.get(cache_key)
+            if inflight is not None:
+                self.inflight_hits += 1
+                return await asyncio.shield(inflight)
+
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached
+
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[cache_key] = future
+            text = None
+            try:
+                text = await self._transcribe(audio_data, audio_format, language, duration)
+                if text:
+                    self.cache.set(cache_key, text)
+                return text
+            finally:
+                self._inflight.pop(cache_key, None)
+                if not future.done():
+                    future.set_result(text)
+
+        return await self._transcribe(audio_data, audio_format, language, duration)
+
+    async def _transcribe(self, audio_data: bytes, audio_format: str,
+                          language: str, duration: float) -> Optional[str]:
+        async with self._semaphore:
+            started = time.perf_counter()
+            self.requests += 1
+            try:
+                text = await asyncio.wait_for(
+                    self.backend.transcribe(audio_data, audio_format, language),
+                    timeout=self.timeout,
+                )
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                logger.error(f"Transcription timed out after {self.timeout}s")
+                return None
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"Error transcribing audio: {e}")
+                return None
+            finally:
+                self.busy_seconds += time.perf_counter() - started
+
+            self.audio_seconds += duration
+            return text
+
+    def stats(self) -> Dict:
+        """Метрики транскрибации"""
+        return {
+            "backend": self.backend.name,
+            "requests": self.requests,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "inflight_hits": self.inflight_hits,
+            "audio_seconds": round(self.audio_seconds, 1),
+            "busy_seconds": round(self.busy_seconds, 1),
+            "audio_seconds_per_second": (
+                round(self.audio_seconds / self.busy_seconds, 2) if self.busy_seconds else 0.0
+            ),
+            "cache": self.cache.stats(),
+        }
+
+
+_service: Optional[TranscriptionService] = None
+
+
+def get_transcription_service() -> TranscriptionService:
+    """Возвращает общий сервис транскрибации процесса"""
+    global _service
+    if _service is None:
+        config = get_config()
+        _service = TranscriptionService(
+            backend=create_transcription_backend(config),
+            timeout=config.transcription_timeout,
+            max_concurrency=config.transcription_max_concurrency,
+            cache_ttl=config.transcription_cache_ttl,
+            cache_max_size=config.transcription_cache_max_size,
+        )
+        logger.info(
+            f"Transcription service initialized "
+            f"(backend={config.transcription_backend}, max_concurrency={config.transcription_max_concurrency}, "
+            f"timeout={config.transcription_timeout}s)"
+        )
+    return _service
+
+
+async def close_transcription_service() -> None:
+    """Логирует метрики и освобождает ресурсы бэкенда"""
+    global _service
+    if _service is not None:
+        logger.info(f"Transcription stats: {_service.stats()}")
+        await _service.backend.close()
+    _service = None
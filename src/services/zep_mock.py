@@ -64,4 +64,10 @@ class ZepService:
     
     async def update_session_metadata(self, session_id: str, metadata: Dict) -> None:
         if session_id in self.sessions:
-            self.sessions[session_id].metadata.update(metadata)
\ No newline at end of file
+            self.sessions[session_id].metadata.update(metadata)
+    
+    async def flush(self, session_id: Optional[str] = None) -> None:
+        pass
+    
+    async def close(self) -> None:
+        pass
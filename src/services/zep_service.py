@@ -1,19 +1,111 @@
 import os
-from typing import Dict, List, Optional
+import time
+import asyncio
+from collections import OrderedDict, deque
+from typing import Deque, Dict, List, Optional
 from zep_cloud.client import AsyncZep
 from zep_cloud.types import Message
 from loguru import logger
 
 class ZepService:
-    def __init__(self):
+    """
+    Zep Cloud memory client.
+    
+    Messages are not sent one by one on the conversation's critical path:
+    add_message puts them into a per-session queue and a background task sends
+    each session's queue in one memory.add call. The total queue is bounded;
+    when it is full, add_message waits up to enqueue_timeout for space
+    (backpressure) and then drops the message. Failed batches are retried with
+    exponential backoff and dropped after max_retries.
+    
+    The last window_size messages of each active session are also kept in a
+    local ring buffer, so get_memory is served without a remote read. Zep is
+    only queried on a cache miss (e.g. after a restart). Idle windows are
+    evicted after window_idle_ttl seconds, and at most window_max_sessions
+    are kept.
+    """
+    
+    def __init__(self, flush_interval: float = 1.0, max_queue_size: int = 10000,
+                 max_batch_size: int = 30, max_retries: int = 3,
+                 enqueue_timeout: float = 1.0, max_concurrent_flushes: int = 10,
+                 window_size: int = 20, window_idle_ttl: float = 3600.0,
+                 window_max_sessions: int = 10000):
         api_key = os.getenv("ZEP_API_KEY")
         if not api_key:
             raise ValueError("ZEP_API_KEY must be set")
         
         self.client = AsyncZep(api_key=api_key)
         self._pending_metadata = {}  # Для хранения метаданных до первого сообщения
+        
+        # Batching queue
+        self.flush_interval = flush_interval
+        self.max_queue_size = max_queue_size
+        self.max_batch_size = max_batch_size
+        self.max_retries = max_retries
+        self.enqueue_timeout = enqueue_timeout
+        self._queues: Dict[str, List[Message]] = {}
+        self._queued = 0
+        self._space = asyncio.Condition()
+        self._session_locks: Dict[str, asyncio.Lock] = {}
+        self._lock_users: Dict[str, int] = {}
+        self._flush_semaphore = asyncio.Semaphore(max_concurrent_flushes)
+        self._flusher: Optional[asyncio.Task] = None
+        self._stopping = asyncio.Event()
+        
+        # Local conversation windows: session_id -> (recent messages, last access)
+        self.window_size = window_size
+        self.window_idle_ttl = window_idle_ttl
+        self.window_max_sessions = window_max_sessions
+        self._windows: "OrderedDict[str, Deque[Message]]" = OrderedDict()
+        self._window_access: Dict[str, float] = {}
+        
+        # Metrics
+        self.window_hits = 0
+        self.window_misses = 0
+        self.messages_sent = 0
+        self.messages_dropped = 0
+        self.batches_sent = 0
+        self.retries = 0
+        
         logger.info("Zep client initialized")
     
+    def stats(self) -> Dict:
+        """Метрики очереди сообщений"""
+        return {
+            "queued": self._queued,
+            "sessions": len(self._queues),
+            "messages_sent": self.messages_sent,
+            "messages_dropped": self.messages_dropped,
+            "batches_sent": self.batches_sent,
+            "retries": self.retries,
+            "windows": len(self._windows),
+            "window_hits": self.window_hits,
+            "window_misses": self.window_misses,
+        }
+    
+    def _touch_window(self, session_id: str, messages: Optional[List[Message]] = None) -> Deque[Message]:
+        """Возвращает локальное окно сессии, создавая его при необходимости"""
+        window = self._windows.get(session_id)
+        if window is None:
+            window = deque(messages or [], maxlen=self.window_size)
+            self._windows[session_id] = window
+            while len(self._windows) > self.window_max_sessions:
+                evicted, _ = self._windows.popitem(last=False)
+                self._window_access.pop(evicted, None)
+        else:
+            self._windows.move_to_end(session_id)
+        self._window_access[session_id] = time.monotonic()
+        return window
+    
+    def _evict_idle_windows(self) -> None:
+        deadline = time.monotonic() - self.window_idle_ttl
+        # Windows are ordered by last access, oldest first
+        for session_id in list(self._windows):
+            if self._window_access.get(session_id, 0) > deadline:
+                break
+            del self._windows[session_id]
+            self._window_access.pop(session_id, None)
+    
     async def create_session(self, session_id: str, metadata: Optional[Dict] = None) -> bool:
         """
         Zep автоматически создает сессии при первом добавлении сообщений.
@@ -23,6 +115,8 @@ class ZepService:
             logger.info(f"Zep session will be created on first message: {session_id}")
             # Сохраняем метаданные локально для использования при первом сообщении
             self._pending_metadata = {session_id: metadata or {}}
+            # Новая сессия пуста, поэтому локальное окно сразу полное
+            self._touch_window(session_id)
             return True
         except Exception as e:
             logger.error(f"Error preparing Zep session {session_id}: {e}")
@@ -30,6 +124,7 @@ class ZepService:
     
     async def add_message(self, session_id: str, role: str, content: str, 
                          metadata: Optional[Dict] = None) -> None:
+        """Ставит сообщение в очередь на отправку в Zep; не ждёт сетевого запроса"""
         try:
             # Определяем role_type на основе role
             role_type = "user" if role == "user" else "assistant"
@@ -40,13 +135,22 @@ class ZepService:
                 content=content
             )
             
-            # Используем правильный метод API
-            await self.client.memory.add(
-                session_id=session_id,
-                messages=[message]
-            )
+            if self._queued >= self.max_queue_size:
+                try:
+                    await asyncio.wait_for(self._wait_for_space(), timeout=self.enqueue_timeout)
+                except asyncio.TimeoutError:
+                    self.messages_dropped += 1
+                    logger.warning(f"Zep queue is full ({self._queued}), message for session {session_id} dropped")
+                    return
+            
+            self._queues.setdefault(session_id, []).append(message)
+            self._queued += 1
+            self._ensure_flusher()
             
-            logger.debug(f"Message added to Zep session {session_id}")
+            # Windows are only extended when they exist: a partial window after a
+            # restart would hide older history, so that case is a cache miss
+            if session_id in self._windows:
+                self._touch_window(session_id).append(message)
             
             # Очищаем метаданные после первого сообщения
             if session_id in self._pending_metadata:
@@ -56,15 +160,125 @@ class ZepService:
             logger.error(f"Error adding message to session {session_id}: {e}")
             # Don't raise for message logging failures
     
+    async def flush(self, session_id: Optional[str] = None) -> None:
+        """Отправляет накопленные сообщения сессии (или всех сессий) в Zep"""
+        if session_id is not None:
+            await self._flush_session(session_id)
+            return
+        
+        await asyncio.gather(*(
+            self._flush_session(pending_session_id)
+            for pending_session_id in list(self._queues)
+        ))
+    
+    async def close(self) -> None:
+        """Останавливает фоновую отправку и отправляет всё, что осталось в очереди"""
+        # The loop is stopped, not cancelled: a batch being sent is not lost
+        self._stopping.set()
+        if self._flusher:
+            await self._flusher
+            self._flusher = None
+        await self.flush()
+        logger.info(f"Zep service closed: {self.stats()}")
+    
+    def _ensure_flusher(self) -> None:
+        if self._stopping.is_set():
+            return
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+    
+    async def _flush_loop(self) -> None:
+        while not self._stopping.is_set():
+            try:
+                await asyncio.wait_for(self._stopping.wait(), timeout=self.flush_interval)
+                break
+            except asyncio.TimeoutError:
+                pass
+            self._evict_idle_windows()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing Zep queue: {e}")
+    
+    async def _wait_for_space(self) -> None:
+        async with self._space:
+            await self._space.wait_for(lambda: self._queued < self.max_queue_size)
+    
+    async def _flush_session(self, session_id: str) -> None:
+        # One flush per session at a time keeps messages in order
+        lock = self._session_locks.setdefault(session_id, asyncio.Lock())
+        self._lock_users[session_id] = self._lock_users.get(session_id, 0) + 1
+        try:
+            async with lock, self._flush_semaphore:
+                while self._queues.get(session_id):
+                    queue = self._queues[session_id]
+                    batch = queue[:self.max_batch_size]
+                    del queue[:len(batch)]
+                    if not queue:
+                        del self._queues[session_id]
+                    
+                    try:
+                        await self._send_batch(session_id, batch)
+                    except asyncio.CancelledError:
+                        # Put the batch back so a later flush still sends it
+                        self._queues[session_id] = batch + self._queues.get(session_id, [])
+                        raise
+                    
+                    self._queued -= len(batch)
+                    async with self._space:
+                        self._space.notify_all()
+        finally:
+            self._lock_users[session_id] -= 1
+            if not self._lock_users[session_id]:
+                del self._lock_users[session_id]
+                self._session_locks.pop(session_id, None)
+    
+    async def _send_batch(self, session_id: str, batch: List[Message]) -> None:
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.client.memory.add(
+                    session_id=session_id,
+                    messages=batch
+                )
+                self.messages_sent += len(batch)
+                self.batches_sent += 1
+                logger.debug(f"{len(batch)} messages added to Zep session {session_id}")
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    self.messages_dropped += len(batch)
+                    logger.error(
+                        f"Error adding {len(batch)} messages to session {session_id}, "
+                        f"dropped after {attempt + 1} attempts: {e}"
+                    )
+                    return
+                self.retries += 1
+                delay = min(0.5 * 2 ** attempt, 10.0)
+                logger.warning(f"Zep add failed for session {session_id}, retry in {delay:.1f}s: {e}")
+                await asyncio.sleep(delay)
+    
     async def get_memory(self, session_id: str, last_n: int = 10) -> List[Message]:
+        if session_id in self._windows and last_n <= self.window_size:
+            self.window_hits += 1
+            return list(self._touch_window(session_id))[-last_n:]
+        
+        self.window_misses += 1
         try:
+            # Read-your-writes: messages still queued locally must reach Zep first
+            if session_id in self._queues or session_id in self._session_locks:
+                await self.flush(session_id)
+            
             memory = await self.client.memory.get(
                 session_id=session_id
             )
-            if memory and memory.messages:
-                # Return last N messages, not first N
-                return memory.messages[-last_n:] if len(memory.messages) > last_n else memory.messages
-            return []
+            messages = list(memory.messages) if memory and memory.messages else []
+            
+            # Seed the local window; messages queued after the flush are not in Zep yet
+            self._windows.pop(session_id, None)
+            self._touch_window(session_id, messages + self._queues.get(session_id, []))
+            
+            # Return last N messages, not first N
+            return messages[-last_n:] if len(messages) > last_n else messages
         except Exception as e:
             logger.error(f"Error getting memory for session {session_id}: {e}")
             return []
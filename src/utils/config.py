@@ -4,17 +4,85 @@ from pydantic_settings import BaseSettings
 
 class Config(BaseSettings):
     # Telegram
-    telegram_bot_token: str
+    telegram_bot_token: Optional[str] = None
+    telegram_api_server: Optional[str] = None  # Self-hosted Bot API server URL
+    telegram_api_local: bool = False  # Server runs with --local and serves files from disk
     
     # OpenAI
-    openai_api_key: str
+    openai_api_key: Optional[str] = None
     
     # Zep Cloud
-    zep_api_key: str
+    zep_api_key: Optional[str] = None
+    zep_flush_interval: float = 1.0  # Seconds between batched memory.add calls
+    zep_max_queue_size: int = 10000
+    zep_max_batch_size: int = 30
+    zep_max_retries: int = 3
+    zep_enqueue_timeout: float = 1.0  # Backpressure wait before a message is dropped
+    zep_window_size: int = 20  # Recent messages kept locally per active session
+    zep_window_idle_ttl: float = 3600.0
     
     # Supabase
-    supabase_url: str
-    supabase_key: str
+    supabase_url: Optional[str] = None
+    supabase_key: Optional[str] = None
+    supabase_max_workers: int = 10  # Thread pool size for non-blocking DB calls
+    
+    # Write-behind buffer for respondent answers
+    answer_flush_interval: float = 2.0
+    answer_flush_max_answers: int = 10
+    answer_flush_max_bytes: int = 65536
+    
+    # Interview read-through cache
+    interview_cache_ttl: float = 60.0
+    interview_cache_max_size: int = 1000
+    
+    # Update delivery: polling | webhook
+    bot_delivery_mode: str = "polling"
+    webhook_base_url: Optional[str] = None  # Public URL, e.g. https://app.up.railway.app
+    webhook_path: str = "/telegram/webhook"
+    webhook_secret: Optional[str] = None
+    webhook_max_concurrency: int = 64  # Updates processed at the same time
+    
+    # FSM storage: memory | sqlite | redis
+    fsm_storage: str = "memory"
+    fsm_sqlite_path: str = "data/fsm.sqlite3"
+    fsm_ttl: float = 604800.0  # Abandoned dialogs expire after a week; 0 disables
+    redis_url: Optional[str] = None
+    
+    # Inactivity reminders: auto (same as fsm_storage) | memory | sqlite | redis
+    reminder_store: str = "auto"
+    reminder_sqlite_path: str = "data/reminders.sqlite3"
+    reminder_poll_interval: float = 1.0
+    reminder_leader_ttl: float = 30.0  # Only the lock holder delivers reminders
+    
+    # HTTP server (n8n API, and the webhook in webhook mode)
+    api_host: str = "0.0.0.0"
+    api_port: int = 8000
+    
+    # Opening question variants generated once per interview (0 = generate per respondent)
+    opening_question_variants: int = 3
+    
+    # Per-interview question plan used for next-question prompts
+    question_plan_enabled: bool = True
+    question_plan_turns_per_topic: int = 2
+    
+    # Interview summaries: incremental (fold new answers into a running summary) | full
+    summary_mode: str = "incremental"
+    final_summary_full: bool = False  # Regenerate the final report from the whole transcript
+    
+    # Researcher notifications: immediate (message per respondent) | digest
+    researcher_notifications: str = "immediate"
+    researcher_digest_window: float = 600.0  # Seconds a digest collects events
+    
+    # Outgoing message rate limits (Telegram: ~30 msg/s overall, ~1 msg/s per chat, 20/min per group)
+    send_global_rate: float = 30.0
+    send_chat_rate: float = 1.0
+    send_chat_burst: float = 3.0  # Messages a private chat can receive back to back
+    send_group_rate: float = 20 / 60
+    send_max_retries: int = 3  # Retries after TelegramRetryAfter
+    send_priority_aging: float = 5.0  # Seconds of waiting that raise a send by one priority level; 0 disables
+    
+    # Messages sent within this many seconds are merged into one answer; 0 disables
+    message_debounce_window: float = 0.0
     
     # Bot Settings
     bot_environment: str = "development"
@@ -26,9 +94,42 @@ class Config(BaseSettings):
     langchain_temperature: float = 0.7
     langchain_max_tokens: int = 2000
     
+    # OpenAI HTTP connection pool (shared by all LLM clients)
+    llm_max_connections: int = 100
+    llm_max_keepalive_connections: int = 20
+    llm_keepalive_expiry: float = 60.0
+    llm_timeout: float = 60.0
+    llm_max_retries: int = 2
+    
+    # Voice processing
+    audio_workers: int = 2  # Process pool size for audio transcoding
+    voice_preprocess: bool = True  # Trim silence, mono 16 kHz Opus before upload
+    voice_preprocess_bitrate: str = "24k"
+    voice_silence_threshold: str = "-40dB"
+    transcription_backend: str = "openai"  # openai | local | stub
+    transcription_model: str = "whisper-1"
+    transcription_timeout: float = 60.0
+    transcription_max_concurrency: int = 8
+    transcription_cache_ttl: float = 86400.0  # Cached by Telegram file_unique_id
+    transcription_cache_max_size: int = 5000
+    local_whisper_model: str = "small"  # faster-whisper model name or path
+    local_whisper_compute_type: str = "int8"
+    local_whisper_workers: int = 1
+    local_whisper_cpu_threads: int = 0
+    stub_transcription_delay: float = 0.0
+    # Long voice answers are split at pauses and transcribed in parallel
+    voice_chunking_min_duration: int = 120  # seconds; 0 disables chunking
+    voice_chunk_target_seconds: float = 60.0
+    voice_chunk_max_seconds: float = 90.0
+    
+    # Prompt templates
+    prompts_hot_reload: bool = False
+    prompts_reload_interval: float = 2.0
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
+        extra = "ignore"
 
 def get_config() -> Config:
-    return Config()
\ No newline at end of file
+    return Config()
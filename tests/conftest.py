@@ -0,0 +1,11 @@
+"""Shared test setup.
+
+Run from the project root:
+    pip install -r requirements.txt pytest
+    python -m pytest -q tests
+"""
+import sys
+from pathlib import Path
+
+# Add project root to path
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
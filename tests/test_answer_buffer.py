@@ -0,0 +1,119 @@
+import asyncio
+
+import pytest
+
+from src.services.answer_buffer import AnswerWriteBuffer
+
+
+class Recorder:
+    def __init__(self, fail=False):
+        self.batches = []
+        self.fail = fail
+
+    async def __call__(self, rows):
+        if self.fail:
+            raise RuntimeError("database unavailable")
+        self.batches.append(list(rows))
+
+
+def _row(turn, text="ответ"):
+    return {"session_id": "s1", "turn_index": turn, "answer_text": text}
+
+
+def test_answers_stay_buffered_below_thresholds():
+    async def scenario():
+        recorder = Recorder()
+        buffer = AnswerWriteBuffer(recorder, flush_interval=60, max_pending_answers=3)
+        await buffer.add("s1", _row(0))
+        await buffer.add("s1", _row(1))
+        await asyncio.sleep(0.01)
+        pending = buffer.pending_answers
+        await buffer.close()
+        return recorder.batches, pending
+
+    batches, pending = asyncio.run(scenario())
+    assert pending == 2
+    # close() writes whatever is left
+    assert [r["turn_index"] for r in batches[0]] == [0, 1]
+
+
+def test_answer_count_threshold_triggers_flush():
+    async def scenario():
+        recorder = Recorder()
+        buffer = AnswerWriteBuffer(recorder, flush_interval=60, max_pending_answers=3)
+        for turn in range(3):
+            await buffer.add("s1", _row(turn))
+        await asyncio.sleep(0.01)
+        result = (list(recorder.batches), buffer.pending_answers)
+        await buffer.close()
+        return result
+
+    batches, pending = asyncio.run(scenario())
+    assert len(batches) == 1 and len(batches[0]) == 3
+    assert pending == 0
+
+
+def test_byte_threshold_triggers_flush():
+    async def scenario():
+        recorder = Recorder()
+        buffer = AnswerWriteBuffer(recorder, flush_interval=60, max_pending_answers=100,
+                                   max_pending_bytes=200)
+        await buffer.add("s1", _row(0, "x" * 300))
+        await asyncio.sleep(0.01)
+        result = len(recorder.batches)
+        await buffer.close()
+        return result
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_close_waits_for_threshold_flush():
+    async def scenario():
+        started = asyncio.Event()
+        finished = []
+
+        async def slow_flush(rows):
+            started.set()
+            await asyncio.sleep(0.05)
+            finished.extend(rows)
+
+        buffer = AnswerWriteBuffer(slow_flush, flush_interval=60, max_pending_answers=1)
+        await buffer.add("s1", _row(0))
+        await started.wait()
+        await buffer.close()
+        return finished
+
+    assert len(asyncio.run(scenario())) == 1
+
+
+def test_rows_are_split_into_batches():
+    async def scenario():
+        recorder = Recorder()
+        buffer = AnswerWriteBuffer(recorder, flush_interval=60, max_pending_answers=100,
+                                   max_batch_rows=2)
+        for turn in range(5):
+            await buffer.add("s1", _row(turn))
+        await buffer.flush()
+        await buffer.close()
+        return [len(batch) for batch in recorder.batches]
+
+    assert asyncio.run(scenario()) == [2, 2, 1]
+
+
+def test_failed_flush_keeps_rows_for_retry():
+    async def scenario():
+        recorder = Recorder(fail=True)
+        buffer = AnswerWriteBuffer(recorder, flush_interval=60, max_pending_answers=100)
+        await buffer.add("s1", _row(0))
+        with pytest.raises(RuntimeError):
+            await buffer.flush()
+        failed_pending = buffer.pending_answers
+        recorder.fail = False
+        await buffer.flush()
+        await buffer.close()
+        return failed_pending, buffer.flush_errors, recorder.batches
+
+    failed_pending, errors, batches = asyncio.run(scenario())
+    assert failed_pending == 1
+    assert errors == 1
+    assert [r["turn_index"] for r in batches[0]] == [0]
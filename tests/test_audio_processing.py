@@ -0,0 +1,34 @@
+from src.services.audio_processing import detect_audio_format, plan_chunks
+
+
+def test_short_audio_is_one_chunk():
+    assert plan_chunks(75.0, [(30.0, 31.0)], target_seconds=60, max_seconds=90) == [(0.0, 75.0)]
+
+
+def test_cuts_at_silence_closest_to_target():
+    silences = [(20.0, 21.0), (58.0, 60.0), (80.0, 81.0), (120.0, 122.0)]
+    chunks = plan_chunks(150.0, silences, target_seconds=60, max_seconds=90)
+    assert chunks == [(0.0, 59.0), (59.0, 121.0), (121.0, 150.0)]
+
+
+def test_hard_cut_without_silence():
+    assert plan_chunks(200.0, [], target_seconds=60, max_seconds=90) == [
+        (0.0, 90.0), (90.0, 180.0), (180.0, 200.0)
+    ]
+
+
+def test_chunks_cover_whole_duration_within_max():
+    silences = [(float(s), float(s) + 0.6) for s in range(7, 600, 13)]
+    chunks = plan_chunks(600.0, silences, target_seconds=60, max_seconds=90)
+    assert chunks[0][0] == 0.0 and chunks[-1][1] == 600.0
+    for (_, end), (start, _) in zip(chunks, chunks[1:]):
+        assert end == start
+    assert all(end - start <= 90 for start, end in chunks)
+
+
+def test_detect_audio_format():
+    assert detect_audio_format(b"OggS\x00\x02") == "ogg"
+    assert detect_audio_format(b"ID3\x03\x00") == "mp3"
+    assert detect_audio_format(b"RIFF\x00\x00\x00\x00WAVEfmt ") == "wav"
+    assert detect_audio_format(b"\x00\x00\x00\x20ftypM4A ") == "m4a"
+    assert detect_audio_format(b"unknown") is None
@@ -0,0 +1,89 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.bot.middlewares import ChatSerializationMiddleware
+
+ANSWERING = "RespondentStates:answering"
+
+
+class FakeState:
+    def __init__(self, state=ANSWERING):
+        self.state = state
+
+    async def get_state(self):
+        return self.state
+
+
+def _message(text, chat_id=1):
+    return SimpleNamespace(chat=SimpleNamespace(id=chat_id), text=text)
+
+
+async def _feed(middleware, handler, messages, fsm):
+    """Deliver (delay, text) messages as separate concurrent updates"""
+    async def deliver(delay, text):
+        await asyncio.sleep(delay)
+        # raw_state is filled by the update-level FSM middleware before the handler queue
+        await middleware(handler, _message(text), {"state": fsm, "raw_state": fsm.state})
+
+    await asyncio.gather(*[deliver(delay, text) for delay, text in messages])
+
+
+def _recording_handler(handled, duration=0.02):
+    async def handler(event, data):
+        handled.append((event.text, data.get("merged_text"), data.get("raw_state")))
+        await asyncio.sleep(duration)
+    return handler
+
+
+def test_messages_of_one_chat_are_handled_in_order():
+    handled = []
+    middleware = ChatSerializationMiddleware()
+    messages = [(i * 0.001, f"m{i}") for i in range(5)]
+    asyncio.run(_feed(middleware, _recording_handler(handled), messages, FakeState()))
+    assert [text for text, _, _ in handled] == ["m0", "m1", "m2", "m3", "m4"]
+
+
+def test_burst_is_merged():
+    handled = []
+    middleware = ChatSerializationMiddleware(debounce_window=0.1, debounce_states=[ANSWERING])
+    messages = [(0, "first"), (0.03, "second"), (0.06, "third")]
+    asyncio.run(_feed(middleware, _recording_handler(handled), messages, FakeState()))
+    assert handled == [("first", "first\nsecond\nthird", ANSWERING)]
+    assert middleware.merged_messages == 2
+
+
+def test_command_and_voice_are_not_overtaken_by_merged_text():
+    handled = []
+    middleware = ChatSerializationMiddleware(debounce_window=0.1)
+    messages = [(0, "text"), (0.02, "/cancel"), (0.04, "after"), (0.05, None)]
+    asyncio.run(_feed(middleware, _recording_handler(handled), messages, FakeState()))
+    assert [text for text, _, _ in handled] == ["text", "/cancel", "after", None]
+    assert all(merged is None for _, merged, _ in handled)
+
+
+def test_no_merging_outside_debounce_states():
+    handled = []
+    middleware = ChatSerializationMiddleware(debounce_window=0.1, debounce_states=[ANSWERING])
+    messages = [(0, "a"), (0.01, "b")]
+    asyncio.run(_feed(middleware, _recording_handler(handled), messages, FakeState("Other:state")))
+    assert [(text, merged) for text, merged, _ in handled] == [("a", None), ("b", None)]
+
+
+def test_routing_sees_state_left_by_previous_handler():
+    handled = []
+    fsm = FakeState(None)
+    middleware = ChatSerializationMiddleware()
+
+    async def handler(event, data):
+        handled.append((event.text, data["raw_state"]))
+        await asyncio.sleep(0.02)
+        fsm.state = ANSWERING
+
+    asyncio.run(_feed(middleware, handler, [(0, "/start"), (0.005, "answer")], fsm))
+    assert handled == [("/start", None), ("answer", ANSWERING)]
+
+
+def test_locks_are_released_after_handling():
+    middleware = ChatSerializationMiddleware()
+    asyncio.run(_feed(middleware, _recording_handler([]), [(0, "a"), (0, "b")], FakeState()))
+    assert middleware._locks == {} and middleware._lock_users == {}
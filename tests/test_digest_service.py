@@ -0,0 +1,96 @@
+import asyncio
+
+from src.services.digest_service import DigestService, top_themes
+
+
+def test_top_themes_counts_each_summary_once():
+    summaries = [
+        "Клиенты жалуются на доставку, доставка долгая, доставка дорогая",
+        "Главная боль - доставка и поддержка",
+        "Поддержка отвечает медленно",
+        "Цена устраивает",
+    ]
+    assert top_themes(summaries) == ["доставка", "поддержка"]
+
+
+def test_top_themes_skips_stopwords_and_single_mentions():
+    summaries = [
+        "Респондент считает, что интерфейс очень удобный",
+        "Респондент считает интерфейс понятным",
+    ]
+    assert top_themes(summaries) == ["интерфейс"]
+
+
+def test_top_themes_respects_limit():
+    summaries = ["alpha bravo charlie delta echos"] * 2
+    assert len(top_themes(summaries, limit=3)) == 3
+
+
+def test_digest_escapes_user_text():
+    service = DigestService(window=60)
+    service.add_completion(1, "i1", "Рынок <B2B> & SMB", "s1", "user", "Итог: цена < 100 & быстро")
+    digest = service._pending[(1, "i1")]
+    assert "Рынок &lt;B2B&gt; &amp; SMB" in service._format(digest)
+
+
+def test_details_are_escaped_and_limited_to_recipient():
+    service = DigestService(window=60)
+    service.add_completion(1, "i1", "t", "s1", "a<b", "цена < 100 & быстро")
+    completions = service._pending[(1, "i1")].completions
+    service._details.set("d1", (1, completions))
+
+    assert service.get_details("d1", researcher_id=2) is None
+    assert service.get_details("d1", researcher_id=1) == ["<b>@a&lt;b</b>\nцена &lt; 100 &amp; быстро"]
+
+
+class FlakyBot:
+    def __init__(self, failures):
+        self.failures = failures
+        self.sent = []
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("network error")
+        self.sent.append((chat_id, text))
+
+
+def test_failed_digest_is_requeued_and_merged():
+    async def scenario():
+        service = DigestService(window=60, retry_delay=0)
+        service._bot = FlakyBot(failures=1)
+        service.add_progress(1, "i1", "t", "s1", 3)
+        service.add_completion(1, "i1", "t", "s2", "user", "summary")
+        await service.flush()
+        requeued = service._pending[(1, "i1")]
+        opened_at, attempts = requeued.opened_at, requeued.attempts
+
+        service.add_completion(1, "i1", "t", "s1", "other", "summary")
+        merged = service._pending[(1, "i1")]
+        return opened_at, attempts, merged, service
+
+    opened_at, attempts, merged, service = asyncio.run(scenario())
+    assert attempts == 1
+    assert merged.opened_at == opened_at
+    assert [c.username for c in merged.completions] == ["user", "other"]
+    assert merged.in_progress == {}
+
+    asyncio.run(service.flush())
+    assert len(service._bot.sent) == 1
+    assert "Завершили интервью: <b>2</b>" in service._bot.sent[0][1]
+    assert service._pending == {}
+
+
+def test_digest_is_dropped_after_max_attempts():
+    async def scenario():
+        service = DigestService(window=60, max_attempts=2, retry_delay=0)
+        service._bot = FlakyBot(failures=10)
+        service.add_completion(1, "i1", "t", "s1", "user", "summary")
+        await service.flush()
+        after_first = dict(service._pending)
+        await service.flush()
+        return after_first, service._pending
+
+    after_first, after_second = asyncio.run(scenario())
+    assert len(after_first) == 1
+    assert after_second == {}
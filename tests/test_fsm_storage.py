@@ -0,0 +1,69 @@
+import asyncio
+import time
+
+from aiogram.fsm.storage.base import StorageKey
+
+from src.bot.storage import SQLiteStorage
+
+KEY = StorageKey(bot_id=1, chat_id=42, user_id=42)
+
+
+def _run(tmp_path, ttl, scenario):
+    async def wrapper():
+        storage = SQLiteStorage(path=str(tmp_path / "fsm.sqlite3"), ttl=ttl)
+        try:
+            return await scenario(storage)
+        finally:
+            await storage.close()
+
+    return asyncio.run(wrapper())
+
+
+def test_state_and_data_roundtrip(tmp_path):
+    async def scenario(storage):
+        await storage.set_state(KEY, "RespondentStates:answering")
+        await storage.set_data(KEY, {"answers": {"Вопрос": "Ответ"}, "turn_index": 1})
+        return await storage.get_state(KEY), await storage.get_data(KEY)
+
+    state, data = _run(tmp_path, None, scenario)
+    assert state == "RespondentStates:answering"
+    assert data == {"answers": {"Вопрос": "Ответ"}, "turn_index": 1}
+
+
+def test_session_expires_after_ttl(tmp_path):
+    async def scenario(storage):
+        await storage.set_state(KEY, "RespondentStates:answering")
+        await storage.set_data(KEY, {"turn_index": 3})
+        time.sleep(0.15)
+        return await storage.get_state(KEY), await storage.get_data(KEY)
+
+    assert _run(tmp_path, 0.1, scenario) == (None, {})
+
+
+def test_write_does_not_revive_expired_data(tmp_path):
+    async def scenario(storage):
+        await storage.set_data(KEY, {"turn_index": 3})
+        await storage.set_state(KEY, "RespondentStates:answering")
+        time.sleep(0.15)
+        await storage.set_state(KEY, "ResearcherStates:collecting_info")
+        state, data = await storage.get_state(KEY), await storage.get_data(KEY)
+        await storage.set_data(KEY, {"fresh": True})
+        return state, data, await storage.get_data(KEY)
+
+    state, data, fresh = _run(tmp_path, 0.1, scenario)
+    assert state == "ResearcherStates:collecting_info"
+    assert data == {}
+    assert fresh == {"fresh": True}
+
+
+def test_clearing_both_columns_removes_row(tmp_path):
+    async def scenario(storage):
+        await storage.set_state(KEY, "RespondentStates:answering")
+        await storage.set_data(KEY, {"turn_index": 1})
+        await storage.set_state(KEY, None)
+        await storage.set_data(KEY, {})
+        return await storage._run(
+            lambda: storage._connect().execute("SELECT COUNT(*) FROM fsm").fetchone()[0]
+        )
+
+    assert _run(tmp_path, None, scenario) == 0
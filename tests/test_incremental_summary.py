@@ -0,0 +1,120 @@
+import asyncio
+
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.storage.base import StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+
+from src.agents.base import base_respondent
+from src.agents.base.base_respondent import BaseRespondentAgent
+
+
+class SummaryAgent(BaseRespondentAgent):
+    """Agent without I/O: summaries are built from the answers they receive"""
+
+    def __init__(self, fail_updates=False):
+        # Skips the base initializer: no bot token, voice handler or scheduler needed
+        self.fail_updates = fail_updates
+        self.updates = []
+        self.full_summaries = 0
+
+    async def generate_first_question(self, instruction):
+        return "?"
+
+    async def generate_next_question(self, instruction, answers, history):
+        return "?"
+
+    async def generate_summary(self, answers):
+        self.full_summaries += 1
+        return "full:" + ",".join(answers.values())
+
+    async def update_summary(self, running_summary, new_answers, answers_count):
+        if self.fail_updates:
+            raise RuntimeError("llm unavailable")
+        self.updates.append(list(new_answers))
+        return running_summary + "+" + ",".join(answer for _, answer in new_answers)
+
+
+class NoIncrementalAgent(SummaryAgent):
+    update_summary = BaseRespondentAgent.update_summary
+
+
+def _state():
+    return FSMContext(storage=MemoryStorage(), key=StorageKey(bot_id=1, chat_id=1, user_id=1))
+
+
+async def _answer(agent, state, question, answer):
+    """Stores an answer the way _process_message does"""
+    data = await state.get_data()
+    answers = data.get("answers", {})
+    turn_index = data.get("turn_index", 0)
+    answers[question] = answer
+    await state.update_data(
+        answers=answers,
+        turn_index=turn_index + 1,
+        **agent._summary_pending_update(data, turn_index, question, answer)
+    )
+
+
+def test_repeated_question_is_folded_in():
+    async def scenario():
+        agent, state = SummaryAgent(), _state()
+        await state.update_data(session_id="s1")
+        for question, answer in [("q1", "a1"), ("q2", "a2"), ("q3", "a3")]:
+            await _answer(agent, state, question, answer)
+        first = await agent._get_summary(state)
+        await _answer(agent, state, "q1", "a4")
+        second = await agent._get_summary(state)
+        return first, second, agent.updates, (await state.get_data())["summary_pending"]
+
+    first, second, updates, pending = asyncio.run(scenario())
+    assert first == "+a1,a2,a3"
+    assert second == "+a1,a2,a3+a4"
+    assert updates[-1] == [("q1", "a4")]
+    assert pending == []
+
+
+def test_nothing_is_queued_without_incremental_support():
+    async def scenario():
+        agent, state = NoIncrementalAgent(), _state()
+        await state.update_data(session_id="s1")
+        for i in range(5):
+            await _answer(agent, state, f"q{i}", f"a{i}")
+        summary = await agent._get_summary(state)
+        return summary, await state.get_data()
+
+    summary, data = asyncio.run(scenario())
+    assert summary == "full:a0,a1,a2,a3,a4"
+    assert "summary_pending" not in data
+
+
+def test_failed_update_falls_back_and_clears_pending():
+    async def scenario():
+        agent, state = SummaryAgent(fail_updates=True), _state()
+        await state.update_data(session_id="s1")
+        for i in range(4):
+            await _answer(agent, state, f"q{i}", f"a{i}")
+        summary = await agent._get_summary(state)
+        return summary, await state.get_data()
+
+    summary, data = asyncio.run(scenario())
+    assert summary == "full:a0,a1,a2,a3"
+    assert data["summary_pending"] == []
+    assert data["running_summary"] == summary
+
+
+def test_pending_list_is_capped(monkeypatch):
+    monkeypatch.setattr(base_respondent, "SUMMARY_PENDING_MAX_ANSWERS", 3)
+
+    async def scenario():
+        agent, state = SummaryAgent(), _state()
+        await state.update_data(session_id="s1")
+        for i in range(5):
+            await _answer(agent, state, f"q{i}", f"a{i}")
+        overflowed = (await state.get_data())["summary_pending"]
+        summary = await agent._get_summary(state)
+        return overflowed, summary, await state.get_data()
+
+    overflowed, summary, data = asyncio.run(scenario())
+    assert overflowed is None
+    assert summary == "full:a0,a1,a2,a3,a4"
+    assert data["summary_pending"] == []
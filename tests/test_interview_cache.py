@@ -0,0 +1,132 @@
+import asyncio
+import threading
+import time
+
+from src.services.cache import TTLCache
+from src.services.supabase_service import AsyncSupabaseService
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(maxsize=10, ttl=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_ttl_cache_invalidate():
+    cache = TTLCache(maxsize=10, ttl=60)
+    cache.set("a", 1)
+    cache.invalidate("a")
+    cache.invalidate("missing")
+    assert cache.get("a") is None
+
+
+class FakeSupabase:
+    """Synchronous service stub; get_interview blocks until released"""
+
+    def __init__(self):
+        self.rows = {"i1": {"id": "i1", "status": "draft"}}
+        self.reads = 0
+        self.read_started = threading.Event()
+        self.release_read = threading.Event()
+        self.release_read.set()
+
+    def get_interview(self, interview_id):
+        self.reads += 1
+        snapshot = dict(self.rows[interview_id])
+        self.read_started.set()
+        self.release_read.wait(5)
+        return snapshot
+
+    def update_interview(self, interview_id, data):
+        self.rows[interview_id].update(data)
+        return self.rows[interview_id]
+
+
+def _service(fake):
+    return AsyncSupabaseService(service=fake, max_workers=4)
+
+
+def test_get_interview_is_cached():
+    async def scenario():
+        fake = FakeSupabase()
+        service = _service(fake)
+        await service.get_interview("i1")
+        await service.get_interview("i1")
+        return fake.reads
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_concurrent_misses_share_one_read():
+    async def scenario():
+        fake = FakeSupabase()
+        service = _service(fake)
+        results = await asyncio.gather(*[service.get_interview("i1") for _ in range(5)])
+        return fake.reads, results
+
+    reads, results = asyncio.run(scenario())
+    assert reads == 1
+    assert all(r["status"] == "draft" for r in results)
+
+
+def test_load_racing_with_update_is_not_cached():
+    async def scenario():
+        fake = FakeSupabase()
+        fake.release_read.clear()
+        service = _service(fake)
+
+        # A read of the old row is in flight while the interview is updated
+        stale_load = asyncio.create_task(service.get_interview("i1"))
+        await asyncio.get_running_loop().run_in_executor(None, fake.read_started.wait, 5)
+        update = asyncio.create_task(service.update_interview("i1", {"status": "in_progress"}))
+        await asyncio.sleep(0.05)
+        # A reader arriving during the update must not join the stale load
+        fresh_load = asyncio.create_task(service.get_interview("i1"))
+        await asyncio.sleep(0)
+        fake.release_read.set()
+        await asyncio.gather(stale_load, update)
+        fresh = await fresh_load
+        after = await service.get_interview("i1")
+        return fresh, after
+
+    fresh, after = asyncio.run(scenario())
+    assert fresh["status"] == "in_progress"
+    assert after["status"] == "in_progress"
+
+
+def test_waiters_are_released_when_loader_is_cancelled():
+    async def scenario():
+        fake = FakeSupabase()
+        fake.release_read.clear()
+        service = _service(fake)
+
+        loader = asyncio.create_task(service.get_interview("i1"))
+        await asyncio.get_running_loop().run_in_executor(None, fake.read_started.wait, 5)
+        waiter = asyncio.create_task(service.get_interview("i1"))
+        await asyncio.sleep(0)
+        loader.cancel()
+        try:
+            result = await asyncio.wait_for(waiter, timeout=1)
+        finally:
+            fake.release_read.set()
+        return result, loader.cancelled(), service._interview_loads
+
+    result, cancelled, loads = asyncio.run(scenario())
+    assert result is None
+    assert cancelled
+    assert loads == {}
@@ -0,0 +1,27 @@
+import os
+
+from src.services.prompt_registry import PROMPTS_DIR, PromptRegistry
+
+
+def test_all_prompts_compile():
+    registry = PromptRegistry()
+    assert registry.load_all() == len(list(PROMPTS_DIR.glob("*.txt")))
+
+
+def test_field_analyzer_keeps_literal_json_braces():
+    prompt = PromptRegistry().get("field_analyzer")
+    text = prompt.format(field_name="name", field_description="Имя", question="Как вас зовут?", answer="Артем")
+    assert '"is_complete": true' in text
+    assert "открывающей фигурной скобки {." in text
+
+
+def test_changed_prompt_is_reloaded(tmp_path):
+    path = tmp_path / "greeting.txt"
+    path.write_text("Привет, {name}!", encoding="utf-8")
+    registry = PromptRegistry(prompts_dir=tmp_path, hot_reload=True, reload_interval=0)
+    assert registry.get("greeting").format(name="Артем") == "Привет, Артем!"
+
+    path.write_text("Здравствуйте, {name}!", encoding="utf-8")
+    stat = path.stat()
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    assert registry.get("greeting").format(name="Артем") == "Здравствуйте, Артем!"
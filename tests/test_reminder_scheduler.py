@@ -0,0 +1,102 @@
+import asyncio
+
+from src.services.reminder_scheduler import (
+    MemoryReminderStore,
+    ReminderScheduler,
+    SQLiteReminderStore,
+    create_reminder_store,
+)
+from src.utils.config import Config
+
+
+def test_pop_due_returns_due_reminders_in_time_order():
+    async def scenario():
+        store = MemoryReminderStore()
+        await store.upsert("late", 30.0, {"n": 3})
+        await store.upsert("early", 10.0, {"n": 1})
+        await store.upsert("middle", 20.0, {"n": 2})
+        due = await store.pop_due(now=25.0, limit=10)
+        return due, await store.count()
+
+    due, remaining = asyncio.run(scenario())
+    assert due == [("early", {"n": 1}), ("middle", {"n": 2})]
+    assert remaining == 1
+
+
+def test_pop_due_respects_limit():
+    async def scenario():
+        store = MemoryReminderStore()
+        for i in range(5):
+            await store.upsert(f"r{i}", float(i), {})
+        first = await store.pop_due(now=10.0, limit=2)
+        rest = await store.pop_due(now=10.0, limit=10)
+        return [key for key, _ in first], [key for key, _ in rest]
+
+    assert asyncio.run(scenario()) == (["r0", "r1"], ["r2", "r3", "r4"])
+
+
+def test_reschedule_replaces_previous_entry():
+    async def scenario():
+        store = MemoryReminderStore()
+        await store.upsert("user:1", 10.0, {"n": 1})
+        await store.upsert("user:1", 50.0, {"n": 2})
+        early = await store.pop_due(now=20.0, limit=10)
+        late = await store.pop_due(now=60.0, limit=10)
+        return early, late
+
+    early, late = asyncio.run(scenario())
+    assert early == []
+    assert late == [("user:1", {"n": 2})]
+
+
+def test_removed_reminder_is_not_delivered():
+    async def scenario():
+        store = MemoryReminderStore()
+        await store.upsert("user:1", 10.0, {})
+        await store.remove("user:1")
+        await store.remove("missing")
+        return await store.pop_due(now=20.0, limit=10), await store.count()
+
+    assert asyncio.run(scenario()) == ([], 0)
+
+
+def test_stale_heap_entries_are_compacted():
+    async def scenario():
+        store = MemoryReminderStore()
+        for i in range(3000):
+            await store.upsert("user:1", float(i), {"n": i})
+        return len(store._heap), await store.pop_due(now=1e9, limit=10)
+
+    heap_size, due = asyncio.run(scenario())
+    assert heap_size <= 2 * 1 + 1024 + 1
+    assert due == [("user:1", {"n": 2999})]
+
+
+def test_scheduler_delivers_due_reminders():
+    async def scenario():
+        scheduler = ReminderScheduler(MemoryReminderStore(), poll_interval=0.01)
+        delivered = []
+
+        async def handler(key, payload):
+            delivered.append((key, payload))
+
+        scheduler.start(handler)
+        await scheduler.schedule("user:1", 0.02, {"n": 1})
+        await scheduler.schedule("user:2", 0.02, {"n": 2})
+        await scheduler.cancel("user:2")
+        await asyncio.sleep(0.1)
+        await scheduler.close()
+        return delivered, scheduler.delivered
+
+    assert asyncio.run(scenario()) == ([("user:1", {"n": 1})], 1)
+
+
+def test_auto_store_follows_fsm_storage(tmp_path):
+    path = str(tmp_path / "reminders.sqlite3")
+    memory = create_reminder_store(Config(reminder_store="auto", fsm_storage="memory"))
+    sqlite = create_reminder_store(Config(reminder_store="auto", fsm_storage="sqlite", reminder_sqlite_path=path))
+    explicit = create_reminder_store(Config(reminder_store="memory", fsm_storage="sqlite"))
+    assert isinstance(memory, MemoryReminderStore)
+    assert isinstance(sqlite, SQLiteReminderStore)
+    assert isinstance(explicit, MemoryReminderStore)
+    asyncio.run(sqlite.close())
@@ -0,0 +1,153 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.exceptions import TelegramRetryAfter
+
+from src.bot.send_scheduler import SendPriority, SendScheduler, TokenBucket, send_priority
+
+
+def _method(chat_id, api_method="sendMessage"):
+    return SimpleNamespace(chat_id=chat_id, __api_method__=api_method)
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = TokenBucket(rate=2.0, capacity=2)
+    now = bucket.updated
+    assert bucket.delay(now) == 0
+    bucket.take()
+    bucket.take()
+    assert bucket.delay(now) == pytest.approx(0.5)
+    assert bucket.delay(now + 0.5) == 0
+    assert not bucket.is_full(now + 0.5)
+    assert bucket.is_full(now + 1.0)
+
+
+def test_token_bucket_never_exceeds_capacity():
+    bucket = TokenBucket(rate=10.0, capacity=3)
+    bucket.delay(bucket.updated + 100)
+    assert bucket.tokens == 3
+
+
+def test_waiting_requests_are_granted_by_priority():
+    async def scenario():
+        scheduler = SendScheduler(global_rate=20)
+        # No global tokens left: every request has to queue
+        scheduler.global_bucket.tokens = 0
+        sent = []
+
+        async def make_request(bot, method):
+            sent.append(method.chat_id)
+
+        async def send(chat_id, priority):
+            with send_priority(priority):
+                await scheduler(make_request, None, _method(chat_id))
+
+        await asyncio.gather(
+            send(3, SendPriority.DIGEST),
+            send(2, SendPriority.NOTIFICATION),
+            send(1, SendPriority.INTERACTIVE),
+        )
+        await scheduler.close()
+        return sent
+
+    assert asyncio.run(scenario()) == [1, 2, 3]
+
+
+def test_same_priority_keeps_arrival_order():
+    async def scenario():
+        scheduler = SendScheduler(global_rate=20)
+        scheduler.global_bucket.tokens = 0
+        sent = []
+
+        async def make_request(bot, method):
+            sent.append(method.chat_id)
+
+        await asyncio.gather(*[scheduler(make_request, None, _method(chat_id)) for chat_id in (5, 6, 7)])
+        await scheduler.close()
+        return sent
+
+    assert asyncio.run(scenario()) == [5, 6, 7]
+
+
+def test_chat_burst_is_limited():
+    async def scenario():
+        scheduler = SendScheduler(global_rate=100, chat_rate=10, chat_burst=2)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        times = []
+
+        async def make_request(bot, method):
+            times.append(loop.time() - started)
+
+        for _ in range(3):
+            await scheduler(make_request, None, _method(1))
+        await scheduler.close()
+        return times
+
+    times = asyncio.run(scenario())
+    assert times[1] < 0.05
+    # The third message waits for the chat bucket to refill (1 / chat_rate)
+    assert times[2] >= 0.08
+
+
+def test_unlimited_methods_bypass_the_queue():
+    async def scenario():
+        scheduler = SendScheduler(global_rate=20)
+        scheduler.global_bucket.tokens = 0
+
+        async def make_request(bot, method):
+            return "ok"
+
+        result = await scheduler(make_request, None, _method(1, "getChat"))
+        return result, scheduler.sent
+
+    assert asyncio.run(scenario()) == ("ok", 0)
+
+
+def test_retry_after_is_retried():
+    async def scenario():
+        scheduler = SendScheduler(max_retries=2)
+        attempts = []
+
+        async def make_request(bot, method):
+            attempts.append(method.chat_id)
+            if len(attempts) == 1:
+                raise TelegramRetryAfter(method=method, message="Flood control exceeded", retry_after=0)
+            return "ok"
+
+        result = await scheduler(make_request, None, _method(1))
+        await scheduler.close()
+        return result, len(attempts), scheduler.retries
+
+    assert asyncio.run(scenario()) == ("ok", 2, 1)
+
+
+def _starvation_order(priority_aging):
+    async def scenario():
+        scheduler = SendScheduler(global_rate=20, priority_aging=priority_aging)
+        scheduler.global_bucket.tokens = 0
+        sent = []
+
+        async def make_request(bot, method):
+            sent.append(method.chat_id)
+
+        async def send(chat_id, priority, delay=0.0):
+            await asyncio.sleep(delay)
+            with send_priority(priority):
+                await scheduler(make_request, None, _method(chat_id))
+
+        # Interactive replies keep arriving faster than the global rate allows
+        await asyncio.gather(
+            send(0, SendPriority.DIGEST),
+            *(send(chat_id, SendPriority.INTERACTIVE, chat_id * 0.02) for chat_id in range(1, 21)),
+        )
+        await scheduler.close()
+        return sent
+
+    return asyncio.run(scenario())
+
+
+def test_aging_prevents_starvation_of_low_priority():
+    assert _starvation_order(priority_aging=0)[-1] == 0
+    assert _starvation_order(priority_aging=0.05).index(0) < 10
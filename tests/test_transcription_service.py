@@ -0,0 +1,42 @@
+import asyncio
+
+from src.services.whisper_service import TranscriptionService
+
+
+class SlowBackend:
+    name = "fake"
+
+    def __init__(self):
+        self.calls = 0
+
+    async def transcribe(self, audio_data, audio_format, language):
+        self.calls += 1
+        await asyncio.sleep(0.02)
+        return "текст"
+
+
+def test_concurrent_requests_share_one_call():
+    async def scenario():
+        backend = SlowBackend()
+        service = TranscriptionService(backend=backend)
+        results = await asyncio.gather(*[service.transcribe(b"a", cache_key="f1") for _ in range(3)])
+        cached = await service.transcribe(b"a", cache_key="f1")
+        return results, cached, backend.calls, service.stats()
+
+    results, cached, calls, stats = asyncio.run(scenario())
+    assert results == ["текст"] * 3 and cached == "текст"
+    assert calls == 1
+    assert stats["inflight_hits"] == 2
+    assert stats["cache"]["misses"] == 1
+    assert stats["cache"]["hits"] == 1
+
+
+def test_requests_without_key_are_not_cached():
+    async def scenario():
+        backend = SlowBackend()
+        service = TranscriptionService(backend=backend)
+        await service.transcribe(b"a")
+        await service.transcribe(b"a")
+        return backend.calls
+
+    assert asyncio.run(scenario()) == 2
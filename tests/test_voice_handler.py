@@ -0,0 +1,53 @@
+import asyncio
+
+from src.services import voice_handler
+from src.services.audio_processing import detect_silences
+from src.services.voice_handler import VoiceMessageHandler
+
+
+async def _fake_pool(func, *args):
+    if func is detect_silences:
+        return [(55.0, 56.0), (115.0, 116.0)]
+    # extract_chunk(data, start, end, bitrate): tag the chunk with its start
+    return f"chunk@{int(args[1])}".encode()
+
+
+def _handler(monkeypatch, responses):
+    """responses: chunk start -> list of results for consecutive attempts"""
+    monkeypatch.setattr(voice_handler, "run_in_audio_pool", _fake_pool)
+    handler = VoiceMessageHandler(bot_token="test")
+    handler.chunk_target_seconds = 60
+    handler.chunk_max_seconds = 90
+    attempts = {}
+
+    async def transcribe_audio(chunk, language="ru", audio_format="ogg", duration=0, cache_key=None):
+        start = int(chunk.decode().split("@")[1])
+        attempts[start] = attempts.get(start, 0) + 1
+        result = responses[start][attempts[start] - 1]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    handler.transcribe_audio = transcribe_audio
+    return handler, attempts
+
+
+def test_chunks_are_joined_in_order(monkeypatch):
+    handler, _ = _handler(monkeypatch, {0: ["один"], 55: ["два"], 115: ["три"]})
+    assert asyncio.run(handler.transcribe_chunked(b"audio", 170.0)) == "один два три"
+
+
+def test_failed_chunk_is_retried_once(monkeypatch):
+    handler, attempts = _handler(monkeypatch, {0: ["один"], 55: [None, "два"], 115: [RuntimeError("x"), "три"]})
+    assert asyncio.run(handler.transcribe_chunked(b"audio", 170.0)) == "один два три"
+    assert attempts == {0: 1, 55: 2, 115: 2}
+
+
+def test_missing_chunk_fails_whole_transcription(monkeypatch):
+    handler, _ = _handler(monkeypatch, {0: ["один"], 55: [None, None], 115: ["три"]})
+    assert asyncio.run(handler.transcribe_chunked(b"audio", 170.0)) is None
+
+
+def test_silent_chunk_is_not_a_failure(monkeypatch):
+    handler, _ = _handler(monkeypatch, {0: ["один"], 55: [""], 115: ["три"]})
+    assert asyncio.run(handler.transcribe_chunked(b"audio", 170.0)) == "один три"
@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+
+from src.services.zep_service import ZepService
+
+
+class FakeMemory:
+    def __init__(self, delay=0.0):
+        self.delay = delay
+        self.sent = []
+
+    async def add(self, session_id, messages):
+        await asyncio.sleep(self.delay)
+        self.sent.extend((session_id, m.content) for m in messages)
+
+
+def _service(monkeypatch, delay=0.0, **kwargs):
+    monkeypatch.setenv("ZEP_API_KEY", "test")
+    service = ZepService(**kwargs)
+    memory = FakeMemory(delay)
+    service.client = SimpleNamespace(memory=memory)
+    return service, memory
+
+
+def test_messages_are_sent_in_batches(monkeypatch):
+    async def scenario():
+        service, memory = _service(monkeypatch, flush_interval=60, max_batch_size=2)
+        for i in range(5):
+            await service.add_message("s1", "user", f"m{i}")
+        await service.flush("s1")
+        stats = service.stats()
+        await service.close()
+        return memory.sent, stats
+
+    sent, stats = asyncio.run(scenario())
+    assert [content for _, content in sent] == ["m0", "m1", "m2", "m3", "m4"]
+    assert stats["batches_sent"] == 3
+    assert stats["queued"] == 0
+
+
+def test_close_does_not_lose_batch_in_flight(monkeypatch):
+    async def scenario():
+        service, memory = _service(monkeypatch, delay=0.1, flush_interval=0.01)
+        await service.add_message("s1", "user", "first")
+        await service.add_message("s1", "assistant", "second")
+        # Let the background loop take the batch and start sending it
+        await asyncio.sleep(0.05)
+        await service.close()
+        return memory.sent, service.stats()["queued"]
+
+    sent, queued = asyncio.run(scenario())
+    assert [content for _, content in sent] == ["first", "second"]
+    assert queued == 0
+
+
+def test_window_serves_recent_history(monkeypatch):
+    async def scenario():
+        service, _ = _service(monkeypatch, flush_interval=60, window_size=3)
+        await service.create_session("s1")
+        for i in range(5):
+            await service.add_message("s1", "user", f"m{i}")
+        history = await service.get_memory("s1", last_n=3)
+        await service.close()
+        return [m.content for m in history], service.window_hits
+
+    assert asyncio.run(scenario()) == (["m2", "m3", "m4"], 1)